@@ -1,18 +1,33 @@
 from flask import Flask
 from log import logger, setup_logger
 from flask_cors import CORS
-# from healthcheck import HealthCheck
 from flask_restx import Api
 from controller import register_routes
-
-
-application = Flask(__name__)
-
-def create_app():    
+from services.profiling_service import request_profiler
+from services.compression_service import response_compressor
+from services.warmup_service import worker_warmup
+from services.admission_service import admission_control
+from mongodb.query_monitor import query_monitor
+from mongodb import tenant_scope
+
+
+def create_app():
+    """
+        Application factory. Building the app does no network I/O: the Mongo and LLM clients are
+        created on first use in each worker (see MongoTemplate.get_mongo_client and gunicorn.conf.py), and
+        warmed up by services.warmup_service once the worker has loaded the app.
+    """
     setup_logger()
+    application = Flask(__name__)
     CORS(application, supports_credentials=True)
-    # health = HealthCheck()
-    # application.add_url_rule("/resollect_application/healthCheck", view_func=health.run_check)
+    # Registered first so its after_request hook runs last, on the final body
+    response_compressor.init_app(application)
+    # First before_request hook: a shed request costs no other hook's work
+    admission_control.init_app(application)
+    tenant_scope.init_app(application)
+    request_profiler.init_app(application)
+    query_monitor.init_app(application)
+    configure_api(application)
     return application
 
 
@@ -27,10 +42,10 @@ def configure_api(application):
 
 
 application = create_app()
-configure_api(application)
 
 if __name__ == "__main__":
     logger.info("Starting the app in dev env")
+    worker_warmup.start()
     application.run(
         host="0.0.0.0",
         port=5001,
@@ -1,3 +1,4 @@
+import os
 from dataclasses import dataclass
 
 @dataclass(frozen=True)
@@ -8,3 +9,214 @@ class LogConfig:
     LOG_BACKUP_COUNT: str = 1
     LOG_INFO_FILE_PATH: str = "resollect_application_info.log"
     LOG_ERROR_FILE_PATH: str = "resollect_application_error.log"
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    # "shared" keeps entries and generations in a sqlite file, so an invalidation by any gunicorn worker or
+    # CLI job on the host reaches every worker. "lru" keeps them in the process and is only correct when a
+    # single process both serves and writes (the dev server with no CLI jobs running)
+    TASK_LIST_CACHE_BACKEND: str = os.getenv("TASK_LIST_CACHE_BACKEND", "shared")
+    TASK_LIST_CACHE_MAX_ENTRIES: int = int(os.getenv("TASK_LIST_CACHE_MAX_ENTRIES", 256))
+    TASK_LIST_CACHE_SHARED_PATH: str = os.getenv("TASK_LIST_CACHE_SHARED_PATH", "/tmp/resollect_task_list_cache.sqlite3")
+
+
+@dataclass(frozen=True)
+class ImportConfig:
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+    IMPORT_MAX_REPORTED_ERRORS: int = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", 1000))
+    ENRICHMENT_BATCH_SIZE: int = int(os.getenv("ENRICHMENT_BATCH_SIZE", 100))
+    ENRICHMENT_CONCURRENCY: int = int(os.getenv("ENRICHMENT_CONCURRENCY", 4))
+    # A failed task is retried after this delay, and marked "failed" after this many attempts
+    ENRICHMENT_RETRY_DELAY_SECONDS: int = int(os.getenv("ENRICHMENT_RETRY_DELAY_SECONDS", 300))
+    ENRICHMENT_MAX_ATTEMPTS: int = int(os.getenv("ENRICHMENT_MAX_ATTEMPTS", 3))
+    # A claimed task not finished within this time (its run died) can be claimed again
+    ENRICHMENT_CLAIM_TIMEOUT_SECONDS: int = int(os.getenv("ENRICHMENT_CLAIM_TIMEOUT_SECONDS", 900))
+
+
+@dataclass(frozen=True)
+class ArchiveConfig:
+    # Completed top-level tasks untouched for this many days are moved, with their sub-tasks and
+    # task_tags rows, from the hot collections to the archive collections
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+    # Top-level tasks moved per batch (their subtrees come along), one round of bulk writes each
+    ARCHIVE_BATCH_SIZE: int = int(os.getenv("ARCHIVE_BATCH_SIZE", 200))
+
+
+@dataclass(frozen=True)
+class EventConfig:
+    # "change_stream" needs a replica set and sees writes from every worker, "local" only sees the
+    # writes handled by this process (dev server / single worker), "auto" picks change streams when available
+    TASK_EVENTS_MODE: str = os.getenv("TASK_EVENTS_MODE", "auto")
+    TASK_EVENTS_CLIENT_BUFFER: int = int(os.getenv("TASK_EVENTS_CLIENT_BUFFER", 256))
+    TASK_EVENTS_REPLAY_BUFFER: int = int(os.getenv("TASK_EVENTS_REPLAY_BUFFER", 1024))
+    TASK_EVENTS_HEARTBEAT_SECONDS: int = int(os.getenv("TASK_EVENTS_HEARTBEAT_SECONDS", 15))
+
+
+@dataclass(frozen=True)
+class PromptConfig:
+    # Token budgets for the interpolated task text (title + description) of each prompt template
+    PRIORITY_PROMPT_BUDGET: int = int(os.getenv("PRIORITY_PROMPT_BUDGET", 1024))
+    TAG_PROMPT_BUDGET: int = int(os.getenv("TAG_PROMPT_BUDGET", 768))
+    SUBTASK_PROMPT_BUDGET: int = int(os.getenv("SUBTASK_PROMPT_BUDGET", 1536))
+    # Share of a truncated text kept from its beginning, the rest comes from its end
+    TRUNCATION_HEAD_RATIO: float = float(os.getenv("TRUNCATION_HEAD_RATIO", 0.6))
+    TOKEN_USAGE_SAMPLE_SIZE: int = int(os.getenv("TOKEN_USAGE_SAMPLE_SIZE", 2048))
+    # "constrained": the Hugging Face priority call runs without thinking, with a completion cap and a JSON
+    # schema limited to the four labels, parsed strictly. "verbose": free-form answer scanned for the label
+    PRIORITY_CLASSIFICATION_MODE: str = os.getenv("PRIORITY_CLASSIFICATION_MODE", "constrained")
+    PRIORITY_MAX_TOKENS: int = int(os.getenv("PRIORITY_MAX_TOKENS", 16))
+
+
+@dataclass(frozen=True)
+class SimilarityConfig:
+    # Reuse the priority and tags of an already classified task when a new task's estimated
+    # Jaccard similarity (character shingles of title + description) reaches the threshold
+    SIMILARITY_REUSE_ENABLED: bool = os.getenv("SIMILARITY_REUSE_ENABLED", "1") == "1"
+    SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", 0.6))
+    SIMILARITY_SHINGLE_SIZE: int = int(os.getenv("SIMILARITY_SHINGLE_SIZE", 3))
+    # MINHASH_PERMUTATIONS must equal LSH_BANDS * rows per band
+    MINHASH_PERMUTATIONS: int = int(os.getenv("MINHASH_PERMUTATIONS", 128))
+    LSH_BANDS: int = int(os.getenv("LSH_BANDS", 32))
+    # Size bound of the index: the most recently updated classified tasks are kept
+    SIMILARITY_INDEX_MAX_TASKS: int = int(os.getenv("SIMILARITY_INDEX_MAX_TASKS", 50000))
+    # How often a worker picks up tasks classified by other workers
+    SIMILARITY_REFRESH_SECONDS: int = int(os.getenv("SIMILARITY_REFRESH_SECONDS", 60))
+    # How often a worker drops indexed tasks deleted or archived elsewhere
+    SIMILARITY_RECONCILE_SECONDS: int = int(os.getenv("SIMILARITY_RECONCILE_SECONDS", 900))
+    # Only this much of title + description is shingled, bounding the signature cost of very long tasks
+    SIMILARITY_MAX_TEXT_CHARS: int = int(os.getenv("SIMILARITY_MAX_TEXT_CHARS", 2000))
+
+
+@dataclass(frozen=True)
+class SubtaskConfig:
+    # A generation claim on the parent task expires unless renewed, so a crashed worker never blocks it for good.
+    # A live generation renews it every third of this, also while blocked on the provider (up to 300s for GPT)
+    SUBTASK_GENERATION_LEASE_SECONDS: int = int(os.getenv("SUBTASK_GENERATION_LEASE_SECONDS", 120))
+    # How long a concurrent request waits for the running generation before answering 409
+    SUBTASK_GENERATION_WAIT_SECONDS: int = int(os.getenv("SUBTASK_GENERATION_WAIT_SECONDS", 60))
+    SUBTASK_GENERATION_POLL_SECONDS: float = float(os.getenv("SUBTASK_GENERATION_POLL_SECONDS", 0.5))
+    # Deepest level sub-tasks can be generated at (a top-level task is depth 0), also the largest tree depth served
+    SUBTASK_MAX_DEPTH: int = int(os.getenv("SUBTASK_MAX_DEPTH", 5))
+
+
+@dataclass(frozen=True)
+class IdempotencyConfig:
+    # How long a finished create is remembered; a retry with the same requestId within it gets the stored outcome
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+    # An in-flight claim expires unless renewed, so a crashed worker never blocks its requestId for good. The
+    # running create renews it every third of this, however long the LLM calls take.
+    IDEMPOTENCY_LEASE_SECONDS: int = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", 120))
+
+
+@dataclass(frozen=True)
+class ProfilingConfig:
+    # Profiling is off unless a signing key (X-Profile-Token header) or a sample rate is configured
+    PROFILE_SIGNING_KEY: str = os.getenv("PROFILE_SIGNING_KEY", "")
+    # Share of requests profiled without a header, e.g. 0.001
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    # "sampler" writes folded stacks (flamegraph.pl, speedscope), "cprofile" writes pstats files (snakeviz, flameprof)
+    PROFILE_MODE: str = os.getenv("PROFILE_MODE", "sampler")
+    PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))
+    # Stops the sampler for long running (streaming) requests
+    PROFILE_MAX_SECONDS: int = int(os.getenv("PROFILE_MAX_SECONDS", 30))
+    PROFILE_OUTPUT_DIR: str = os.getenv("PROFILE_OUTPUT_DIR", "/tmp/resollect_profiles")
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", 200))
+    PROFILE_MAX_AGE_HOURS: int = int(os.getenv("PROFILE_MAX_AGE_HOURS", 72))
+
+
+@dataclass(frozen=True)
+class CompressionConfig:
+    RESPONSE_COMPRESSION_ENABLED: bool = os.getenv("RESPONSE_COMPRESSION_ENABLED", "1") == "1"
+    # Bodies smaller than this are sent as they are, the encoding headers would eat most of the saving
+    RESPONSE_COMPRESSION_MIN_BYTES: int = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", 1024))
+    GZIP_LEVEL: int = int(os.getenv("GZIP_LEVEL", 6))
+    # brotli and zstd are used when their packages (brotli, zstandard) are installed and the client accepts them
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", 5))
+    ZSTD_LEVEL: int = int(os.getenv("ZSTD_LEVEL", 3))
+
+
+@dataclass(frozen=True)
+class MongoProfileConfig:
+    # Server-side time limits (maxTimeMS) of the named operation profiles in MongoTemplate, 0 disables one
+    MONGO_INTERACTIVE_MAX_TIME_MS: int = int(os.getenv("MONGO_INTERACTIVE_MAX_TIME_MS", 2000))
+    MONGO_LIST_MAX_TIME_MS: int = int(os.getenv("MONGO_LIST_MAX_TIME_MS", 5000))
+    MONGO_BULK_MAX_TIME_MS: int = int(os.getenv("MONGO_BULK_MAX_TIME_MS", 120000))
+    # Read preference of search/due-soon reads and of background scans. Secondaries may lag: a task written
+    # a moment ago can be missing from a search until the secondary catches up. The task list, whose
+    # responses are cached and ETagged, always reads the primary (CACHED_LIST_READ)
+    MONGO_LIST_READ_PREFERENCE: str = os.getenv("MONGO_LIST_READ_PREFERENCE", "secondaryPreferred")
+    MONGO_BULK_READ_PREFERENCE: str = os.getenv("MONGO_BULK_READ_PREFERENCE", "secondaryPreferred")
+    # How long critical writes wait for a majority of the replica set to acknowledge them
+    MONGO_CRITICAL_WTIMEOUT_MS: int = int(os.getenv("MONGO_CRITICAL_WTIMEOUT_MS", 5000))
+    # Retryable reads/writes retry a single time after a network error or failover (client-wide driver settings)
+    MONGO_RETRY_READS: bool = os.getenv("MONGO_RETRY_READS", "1") == "1"
+    MONGO_RETRY_WRITES: bool = os.getenv("MONGO_RETRY_WRITES", "1") == "1"
+
+
+@dataclass(frozen=True)
+class WarmupConfig:
+    # Each worker primes its connections after it has loaded the app; /resollect/health/ready answers 503 until then
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "1") == "1"
+    # Pause between attempts of a required warm-up step (Mongo ping, indexes, tag preload) that failed
+    WARMUP_RETRY_SECONDS: float = float(os.getenv("WARMUP_RETRY_SECONDS", 2))
+    # How long post_worker_init blocks on the required steps before the worker starts accepting requests (not
+    # ready, retrying them in the background). Keep it well under GUNICORN_TIMEOUT: a worker that has not
+    # started serving within that timeout is killed by the arbiter.
+    WARMUP_REQUIRED_TIMEOUT_SECONDS: float = float(os.getenv("WARMUP_REQUIRED_TIMEOUT_SECONDS", 30))
+    # Connections the Mongo client keeps open per server, opened by the driver in the background after the first ping
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", 4))
+    # Open the TCP/TLS connections to the LLM providers during warm-up (a HEAD request each, no completion)
+    WARMUP_LLM_CONNECTIONS: bool = os.getenv("WARMUP_LLM_CONNECTIONS", "1") == "1"
+    HUGGING_FACE_WARMUP_URL: str = os.getenv("HUGGING_FACE_WARMUP_URL", "https://router.huggingface.co")
+    WARMUP_HTTP_TIMEOUT_SECONDS: float = float(os.getenv("WARMUP_HTTP_TIMEOUT_SECONDS", 5))
+    # Readiness pings Mongo on every probe; a ping slower than this fails the probe
+    READINESS_MONGO_TIMEOUT_MS: int = int(os.getenv("READINESS_MONGO_TIMEOUT_MS", 1000))
+
+
+def worker_capacity() -> int:
+    """
+    Concurrent requests one gunicorn worker serves, from the same settings (and defaults) as gunicorn.conf.py
+    """
+    if os.getenv("GUNICORN_WORKER_CLASS", "gthread") == "gevent":
+        return int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 500))
+    return int(os.getenv("GUNICORN_THREADS", 32))
+
+
+@dataclass(frozen=True)
+class AdmissionConfig:
+    # Per worker process: concurrent requests admitted per endpoint class (0 = no limit), how many more may wait
+    # for a slot, and for how long, before getting a 503. Waiting requests hold a worker thread too, so the llm and
+    # write defaults are shares of the worker's capacity: llm 1/2 + 1/8 queued, write 1/8 + 1/8 queued, leaving
+    # at least 1/8 for reads (32 threads: llm 16 + 4, write 4 + 4, 4 for reads). Keep that headroom when overriding.
+    ADMISSION_CONTROL_ENABLED: bool = os.getenv("ADMISSION_CONTROL_ENABLED", "1") == "1"
+    ADMISSION_LLM_CONCURRENCY: int = int(os.getenv("ADMISSION_LLM_CONCURRENCY", max(1, worker_capacity() // 2)))
+    ADMISSION_LLM_QUEUE: int = int(os.getenv("ADMISSION_LLM_QUEUE", worker_capacity() // 8))
+    ADMISSION_WRITE_CONCURRENCY: int = int(os.getenv("ADMISSION_WRITE_CONCURRENCY", max(1, worker_capacity() // 8)))
+    ADMISSION_WRITE_QUEUE: int = int(os.getenv("ADMISSION_WRITE_QUEUE", worker_capacity() // 8))
+    ADMISSION_READ_CONCURRENCY: int = int(os.getenv("ADMISSION_READ_CONCURRENCY", 0))
+    ADMISSION_READ_QUEUE: int = int(os.getenv("ADMISSION_READ_QUEUE", 0))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 5))
+    # Bounds of the Retry-After sent with a 503, estimated from the class's recent request durations
+    ADMISSION_MIN_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_MIN_RETRY_AFTER_SECONDS", 1))
+    ADMISSION_MAX_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_MAX_RETRY_AFTER_SECONDS", 60))
+
+
+@dataclass(frozen=True)
+class QueryMonitorConfig:
+    # Attributes every Mongo command to the request that issued it (pymongo CommandListener)
+    QUERY_MONITOR_ENABLED: bool = os.getenv("QUERY_MONITOR_ENABLED", "1") == "1"
+    # A request issuing more commands than this is logged as a warning with its per-collection breakdown
+    QUERY_BUDGET: int = int(os.getenv("QUERY_BUDGET", 25))
+    # Log a warning when a request repeats an identical command (same name, collection and filter/pipeline)
+    QUERY_WARN_ON_DUPLICATES: bool = os.getenv("QUERY_WARN_ON_DUPLICATES", "1") == "1"
+
+
+@dataclass(frozen=True)
+class TenantConfig:
+    # Every task, tag and task-tag document carries the tenant it belongs to, taken from this request header
+    TENANT_HEADER: str = os.getenv("TENANT_HEADER", "X-Tenant-Id")
+    # Tenant of requests without the header, CLI tools and documents written before tenants existed
+    DEFAULT_TENANT_ID: str = os.getenv("DEFAULT_TENANT_ID", "default")
+    # Reject requests without the header instead of falling back to DEFAULT_TENANT_ID
+    TENANT_REQUIRED: bool = os.getenv("TENANT_REQUIRED", "0") == "1"
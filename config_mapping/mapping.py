@@ -3,13 +3,15 @@ from dataclasses import dataclass
 from typing import Optional, List
 from dataclasses import field, asdict
 from datetime import datetime
+from mongodb.tenant_scope import get_tenant_id
 
 @dataclass
 class TaskPostCall:
     title: str
     inputStr: str
     deadline: datetime
-    requestId: Optional[str] = str(uuid.uuid4())
+    # Generated per request when omitted; a client retrying a create sends the same id to get the original outcome
+    requestId: Optional[str] = field(default_factory=lambda: str(uuid.uuid4()))
 
     def to_dict(self):
         """Converts the dataclass to a dictonary for easy serialization"""
@@ -27,6 +29,7 @@ class TaskUpdateCall:
     title: Optional[str] = None
     inputStr: Optional[str] = None
     deadline: Optional[datetime] = None
+    tags: Optional[List[str]] = None
     
     def to_dict(self):
         return asdict(self)
@@ -63,11 +66,13 @@ class ErrorResponse:
 class TagSchema:
     _id: str
     name: str
-    created_at: Optional[datetime] = datetime.now()
+    created_at: Optional[datetime] = field(default_factory=datetime.now)
+    tenant_id: Optional[str] = field(default_factory=get_tenant_id)
 
     def to_dict(self):
         return {
             "_id": self._id,
+            "tenant_id": self.tenant_id,
             "name": self.name,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
@@ -77,11 +82,13 @@ class TaskTagSchema:
     _id: str
     task_id: str
     tag_id: str
-    created_at: Optional[datetime] = datetime.now()
+    created_at: Optional[datetime] = field(default_factory=datetime.now)
+    tenant_id: Optional[str] = field(default_factory=get_tenant_id)
 
     def to_dict(self):
         return {
             "_id": self._id,
+            "tenant_id": self.tenant_id,
             "task_id": self.task_id,
             "tag_id": self.tag_id,
             "created_at": self.created_at.isoformat() if self.created_at else None
@@ -92,19 +99,32 @@ class TaskSchema:
     _id: str
     title:  str
     description: str
-    deadline: str
+    deadline: Optional[datetime]
     priority: Optional[str] = 'Medium'
     completed: Optional[bool] = False
-    created_at: Optional[datetime] = datetime.now()
-    updated_at: Optional[datetime] = datetime.now()
+    created_at: Optional[datetime] = field(default_factory=datetime.now)
+    updated_at: Optional[datetime] = field(default_factory=datetime.now)
     status: Optional[str] = 'Pending'
     tags: Optional[List[str]] = field(default_factory=list)
     parent_task_id: Optional[str] = None
     is_subtask: Optional[bool] = False
+    # Materialized path: IDs from the root task down to the parent, so a subtree is one indexed query
+    ancestors: Optional[List[str]] = field(default_factory=list)
+    depth: Optional[int] = 0
+    # Incremented on every write, used for ETags and If-Match
+    version: Optional[int] = 1
+    # Set by the overdue sweeper once an open task is past its deadline
+    overdue: Optional[bool] = False
+    # "pending" for bulk imported tasks whose priority and tags have not been generated yet, "running" while an
+    # enrichment run holds the task, then "done", or "failed" once it ran out of attempts
+    enrichment_status: Optional[str] = None
+    # Owner of the task, from the request's tenant header; leads every compound index and the shard key
+    tenant_id: Optional[str] = field(default_factory=get_tenant_id)
 
     def to_dict(self):
         return {
             "_id": self._id,
+            "tenant_id": self.tenant_id,
             "title": self.title,
             "description": self.description,
             "deadline": self.deadline,
@@ -115,7 +135,12 @@ class TaskSchema:
             "status": self.status,
             "tags": self.tags,
             "parent_task_id": self.parent_task_id,
-            "is_subtask": self.is_subtask
+            "is_subtask": self.is_subtask,
+            "ancestors": self.ancestors,
+            "depth": self.depth,
+            "version": self.version,
+            "overdue": self.overdue,
+            "enrichment_status": self.enrichment_status
         }
 
 @dataclass
@@ -125,9 +150,17 @@ class TaskListQuery:
     status: Optional[str] = None
     completed: Optional[bool] = None
     tag: Optional[str] = None
+    tag_mode: Optional[str] = None
+    include_archived: bool = False
 
     def to_dict(self):
         return asdict(self)
+
+    def tag_names(self) -> List[str]:
+        """Normalized tag names from a comma separated ?tag= value"""
+        if not self.tag:
+            return []
+        return sorted({name.strip().lower() for name in self.tag.split(",") if name.strip()})
     
     def has_any_filter(self) -> bool:
         """Check if at least one filter parameter is provided"""
@@ -139,6 +172,24 @@ class TaskListQuery:
             self.tag is not None
         ])
 
+    def normalized(self) -> dict:
+        """Canonical form of the query, so equivalent requests share a cache key"""
+        return {
+            "ordering": self.ordering or "-created_at",
+            "priority": self.priority,
+            "status": self.status,
+            "completed": self.completed,
+            "tags": self.tag_names(),
+            "tag_mode": self.tag_mode or "any",
+            "include_archived": bool(self.include_archived)
+        }
+
+@dataclass
+class TaskSearchQuery(TaskListQuery):
+    q: Optional[str] = None
+    page: int = 1
+    per_page: int = 10
+
 @dataclass
 class TaskListResponse:
     tasks: list
@@ -153,4 +204,13 @@ class TaskListResponse:
             "page": self.page,
             "per_page": self.per_page
         }
-    
\ No newline at end of file
+
+@dataclass
+class TaskImportReport:
+    total_rows: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
@@ -3,6 +3,9 @@ MONGO_DB_NAME = "brs-db"
 TASK_HANDLER_COLLECTION = "task_handler"
 TAG_COLLECTION = "tags"
 TASK_TAG_COLLECTION = "task_tags"
+ARCHIVED_TASK_COLLECTION = "task_handler_archive"
+ARCHIVED_TASK_TAG_COLLECTION = "task_tags_archive"
+IDEMPOTENCY_COLLECTION = "task_idempotency"
 
 
 INPUT_TASK_PRIORITY_FINALIZER = "Analyze the following task and classify its priority as 'Low', 'Medium', 'High', or 'Critical'. Task Title: {title}, Description: {description}. Return only the priority level, for the above mentioned task."
@@ -4,6 +4,12 @@ from controller import task_detail_controller as tdc
 from controller import task_complete_controller as tcc
 from controller import tag_controller as tc
 from controller import subtask_controller as sc
+from controller import task_import_controller as tic
+from controller import task_search_controller as tsc
+from controller import task_due_controller as tduc
+from controller import task_events_controller as tec
+from controller import metrics_controller as mtc
+from controller import health_controller as hc
 from controller import main_controller as mc
 
 def register_routes(api: Api):
@@ -11,3 +17,9 @@ def register_routes(api: Api):
     api.add_namespace(tlc.api)
     api.add_namespace(tcc.api)
     api.add_namespace(tc.api)
+    api.add_namespace(tic.api)
+    api.add_namespace(tsc.api)
+    api.add_namespace(tduc.api)
+    api.add_namespace(tec.api)
+    api.add_namespace(mtc.api)
+    api.add_namespace(hc.api)
@@ -1,7 +1,20 @@
+import json
+import hashlib
+from datetime import datetime
+from typing import Optional
 from config_mapping.mapping import TaskSchema
-from flask import make_response, jsonify
+from flask import make_response, jsonify, request
 from dataclasses import asdict
 from services.tag_service import TagService
+from services.deadline_service import DeadlineService
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
 
 
 def create_task_object(request_dict, llm_response, tags=None):
@@ -12,9 +25,124 @@ def create_task_object(request_dict, llm_response, tags=None):
         _id=request_dict.requestId,
         title=request_dict.title,
         description=request_dict.inputStr,
-        deadline=request_dict.deadline,
+        deadline=DeadlineService.parse_deadline(request_dict.deadline),
         priority=llm_response,
-        tags=tags or []
+        tags=TagService.normalize_tag_names(tags or [])
     )
 
     return asdict(task_object)
+
+
+def parse_flag(value: Optional[str]) -> bool:
+    """
+        Boolean query parameter: true/1/yes (any case) is True, anything else (or absent) is False
+    """
+    return (value or "").strip().lower() in ("true", "1", "yes")
+
+
+def build_task_filters(query_params) -> dict:
+    """
+        Translates the priority/status/completed/tag query parameters into the filters understood by
+        mongo_operations.build_task_query. Shared by the list and search endpoints.
+    """
+    filters = {}
+    if query_params.priority:
+        filters['priority'] = query_params.priority
+    if query_params.status:
+        filters['status'] = query_params.status
+    if query_params.completed is not None:
+        filters['completed'] = query_params.completed
+    if query_params.tag:
+        # Answered from the tags stored on the task documents, by one indexed query
+        filters['tags'] = query_params.tag_names()
+        filters['tag_mode'] = query_params.tag_mode
+    return filters
+
+
+def build_task_etag(task: dict) -> str:
+    """
+        ETag of a single task document, derived from its version counter. Documents written before
+        the version field existed are treated as version 0.
+    """
+    return f"v{task.get('version') or 0}"
+
+
+def build_task_list_etag(normalized_query: dict, summary: dict) -> str:
+    """
+        ETag of a task list response, derived from the query and the count, max updated_at and
+        version sum of the tasks it matches.
+    """
+    max_updated_at = summary.get("max_updated_at")
+    if isinstance(max_updated_at, datetime):
+        max_updated_at = max_updated_at.isoformat()
+    payload = json.dumps({
+        "query": normalized_query,
+        "count": summary.get("count", 0),
+        "max_updated_at": max_updated_at,
+        "version_sum": summary.get("version_sum", 0),
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def summarise_tasks(tasks: list) -> dict:
+    """
+        Same summary as mongo_operations.getTasksVersion, computed from already fetched documents.
+    """
+    updated_values = [task["updated_at"] for task in tasks if isinstance(task.get("updated_at"), datetime)]
+    return {
+        "count": len(tasks),
+        "max_updated_at": max(updated_values) if updated_values else None,
+        "version_sum": sum(task.get("version") or 0 for task in tasks),
+    }
+
+
+def parse_if_match_version(if_match) -> Optional[int]:
+    """
+        Extracts the expected document version from an If-Match header parsed by werkzeug.
+        Returns None when the header is absent or is "*".
+    """
+    if not if_match or if_match.star_tag:
+        return None
+    # Weak tags count too: compression weakens the ETag of a response, the version it names is exact
+    for etag in if_match.as_set(include_weak=True):
+        # Detail responses with nested sub-tasks carry a "-d<depth>" suffix, the version is the same
+        version = etag.split("-", 1)[0]
+        if version.startswith("v") and version[1:].isdigit():
+            return int(version[1:])
+    raise ValueError(f"Unrecognised If-Match value: {if_match.to_header()}")
+
+
+def not_modified_response(etag: str):
+    response = make_response("", 304)
+    response.set_etag(etag)
+    return response
+
+
+def negotiate_representation() -> str:
+    """
+        "msgpack" when the Accept header prefers application/msgpack (and msgpack is installed), else "json"
+    """
+    if msgpack is None:
+        return "json"
+    best = request.accept_mimetypes.best_match([JSON_MIMETYPE, MSGPACK_MIMETYPE, "application/x-msgpack"], default=JSON_MIMETYPE)
+    return "json" if best == JSON_MIMETYPE else "msgpack"
+
+
+def representation_etag(etag: str, representation: str) -> str:
+    """
+        The two representations of a resource have different bytes, so they get different ETags
+    """
+    return etag if representation == "json" else f"{etag}-{representation}"
+
+
+def render_representation(payload, representation: str, status: int = 200):
+    """
+        Response with the payload in the negotiated representation. Dates are expected to be ISO strings
+        already, as in the JSON responses; anything else msgpack cannot encode is sent as its str().
+    """
+    if representation == "msgpack":
+        body = msgpack.packb(payload, use_bin_type=True, default=str)
+        return make_response(body, status, {"Content-Type": MSGPACK_MIMETYPE, "Vary": "Accept"})
+    response = make_response(jsonify(payload), status)
+    response.vary.add("Accept")
+    return response
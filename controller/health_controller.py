@@ -0,0 +1,43 @@
+from log import logger
+from flask import make_response, jsonify
+from config_mapping.mapping import ErrorResponse
+from flask_restx import Namespace, Resource
+from services.warmup_service import worker_warmup
+from services.admission_service import admission_class, UNLIMITED
+
+api = Namespace("resollect/health")
+
+# Endpoint names of this namespace start with "health_": the tenant hook lets them through without a tenant header
+HEALTH_ENDPOINT_PREFIX = "health_"
+
+
+@api.route('/live', endpoint=f"{HEALTH_ENDPOINT_PREFIX}liveness")
+class LivenessResource(Resource):
+    @admission_class(UNLIMITED)
+    def get(self):
+        """
+            Liveness probe: 200 as long as the worker process serves requests. Does not touch any dependency,
+            so a Mongo or LLM outage never gets healthy workers restarted.
+        """
+        return make_response(jsonify(worker_warmup.liveness()), 200)
+
+
+@api.route('/ready', endpoint=f"{HEALTH_ENDPOINT_PREFIX}readiness")
+class ReadinessResource(Resource):
+    @admission_class(UNLIMITED)
+    def get(self):
+        """
+            Readiness probe: 200 once this worker has warmed up (Mongo pool, tag dictionary, LLM connections) and
+            Mongo answers a ping, 503 otherwise. Reports every warm-up step and the Mongo ping latency.
+        """
+        try:
+            readiness = worker_warmup.readiness()
+            return make_response(jsonify(readiness), 200 if readiness["ready"] else 503)
+
+        except Exception as e:
+            logger.error(f"Error while checking readiness: {e}")
+            error_response = ErrorResponse(
+                errorCode=503,
+                errorResponse=f"Failed to check readiness: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 503)
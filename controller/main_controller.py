@@ -4,6 +4,12 @@ from .task_detail_controller import api as task_detail_api
 from .task_complete_controller import api as task_complete_api
 from .tag_controller import api as tag_api
 from .subtask_controller import api as subtask_api
+from .task_import_controller import api as task_import_api
+from .task_search_controller import api as task_search_api
+from .task_due_controller import api as task_due_api
+from .task_events_controller import api as task_events_api
+from .metrics_controller import api as metrics_api
+from .health_controller import api as health_api
 
 
 def register_controllers(app):
@@ -18,5 +24,11 @@ def register_controllers(app):
     api.add_namespace(task_complete_api)
     api.add_namespace(tag_api)
     api.add_namespace(subtask_api)
+    api.add_namespace(task_import_api)
+    api.add_namespace(task_search_api)
+    api.add_namespace(task_due_api)
+    api.add_namespace(task_events_api)
+    api.add_namespace(metrics_api)
+    api.add_namespace(health_api)
     
     return api 
\ No newline at end of file
@@ -0,0 +1,89 @@
+from log import logger
+from flask import make_response, jsonify
+from config_mapping.mapping import ErrorResponse
+from flask_restx import Namespace, Resource
+from llms.prompt_builder import token_usage
+from services.similarity_service import similar_tasks
+from mongodb.query_monitor import query_monitor
+from services.admission_service import admission_control, admission_class, UNLIMITED
+
+api = Namespace("resollect/metrics")
+
+
+@api.route('/llm-usage')
+class LlmUsageResource(Resource):
+    @admission_class(UNLIMITED)
+    def get(self):
+        """
+            Prompt and completion token counts per provider and prompt template, for this worker process.
+            Returns call counts, totals and p50/p90/p99 over a bounded sample of recent calls.
+        """
+        try:
+            return make_response(jsonify({"llm_usage": token_usage.snapshot()}), 200)
+
+        except Exception as e:
+            logger.error(f"Error while reading LLM usage metrics: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to read LLM usage metrics: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
+
+
+@api.route('/similarity')
+class SimilarityIndexResource(Resource):
+    @admission_class(UNLIMITED)
+    def get(self):
+        """
+            Near-duplicate classification reuse of this worker process: indexed tasks, lookups, hits and hit rate.
+        """
+        try:
+            return make_response(jsonify({"similarity_index": similar_tasks.stats()}), 200)
+
+        except Exception as e:
+            logger.error(f"Error while reading similarity index metrics: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to read similarity index metrics: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
+
+
+@api.route('/queries')
+class QueryMetricsResource(Resource):
+    @admission_class(UNLIMITED)
+    def get(self):
+        """
+            Mongo commands per request for each endpoint of this worker process: mean count, mean time and a query count histogram.
+            Endpoints whose histogram shifts right after a change have picked up an N+1 query pattern.
+        """
+        try:
+            return make_response(jsonify({"queries": query_monitor.snapshot()}), 200)
+
+        except Exception as e:
+            logger.error(f"Error while reading query metrics: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to read query metrics: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
+
+
+@api.route('/admission')
+class AdmissionMetricsResource(Resource):
+    @admission_class(UNLIMITED)
+    def get(self):
+        """
+            Admission control of this worker process, per endpoint class (llm, write, read): limit, active requests,
+            queue depth, and admitted, queued and shed (queue full or timed out) request counts.
+        """
+        try:
+            return make_response(jsonify({"admission": admission_control.snapshot()}), 200)
+
+        except Exception as e:
+            logger.error(f"Error while reading admission metrics: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to read admission metrics: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
@@ -1,14 +1,79 @@
 from log import logger
-from flask import make_response, jsonify
+from flask import make_response, jsonify, Response, stream_with_context
 from config_mapping.mapping import SuccessResponse, ErrorResponse
 from flask_restx import Namespace, Resource
-from services.subtask_service import SubTaskService
+from services.subtask_service import (
+    SubTaskService, subtask_config, GENERATION_MISSING, GENERATION_SHARED, GENERATION_DONE
+)
+from mongodb.tenant_scope import tenant_filter
+from services.cache_service import task_list_cache, TASK_GENERATION, TAG_GENERATION
+from services.event_service import task_events
+from services.admission_service import admission_class, LLM_BOUND
 
 
 api = Namespace("resollect/tasks")
 
+
+def acquire_generation_for_parent(subtask_service: SubTaskService, id: str):
+    """
+        Claims sub-task generation for the task, or waits for the generation another request is running.
+        Returns (parent_task, owner, shared_subtasks, error_response): owner is set when this request must
+        generate (and release), shared_subtasks when it waited for and shares another request's result.
+    """
+    # Check if task exists and get its details
+    parent_task = subtask_service.task_collection.find_one(tenant_filter({"_id": id}))
+    if parent_task and len(SubTaskService.task_ancestors(parent_task)) >= subtask_config.SUBTASK_MAX_DEPTH:
+        error_response = ErrorResponse(
+            errorCode=400,
+            errorResponse=f"Task {id} is already at the maximum sub-task depth of {subtask_config.SUBTASK_MAX_DEPTH}"
+        )
+        return None, None, None, make_response(jsonify(error_response.to_dict()), 400)
+    owner, outcome = subtask_service.acquire_generation(id) if parent_task else (None, GENERATION_MISSING)
+    if outcome == GENERATION_MISSING:
+        error_response = ErrorResponse(
+            errorCode=404,
+            errorResponse=f"Task with id {id} not found"
+        )
+        return None, None, None, make_response(jsonify(error_response.to_dict()), 404)
+
+    if outcome == GENERATION_SHARED:
+        logger.info(f"Sharing the sub-tasks generated for task {id} by a concurrent request")
+        return parent_task, None, subtask_service.get_subtasks_for_task(id), None
+
+    if outcome == GENERATION_DONE:
+        existing_subtasks = subtask_service.get_subtasks_for_task(id)
+        if existing_subtasks:
+            error_response = ErrorResponse(
+                errorCode=400,
+                errorResponse=f"Task {id} already has {len(existing_subtasks)} sub-tasks. Cannot generate new ones."
+            )
+            return None, None, None, make_response(jsonify(error_response.to_dict()), 400)
+        # Generated earlier but the sub-tasks have been deleted since, generating again is allowed
+        owner = subtask_service.claim_generation(id, reclaim_done=True)
+
+    if not owner:
+        error_response = ErrorResponse(
+            errorCode=409,
+            errorResponse=f"Sub-task generation for task {id} is already in progress, retry later"
+        )
+        return None, None, None, make_response(jsonify(error_response.to_dict()), 409)
+    
+    # Check if task already has sub-tasks
+    existing_subtasks = subtask_service.get_subtasks_for_task(id)
+    if existing_subtasks:
+        subtask_service.release_generation(id, owner, succeeded=True)
+        error_response = ErrorResponse(
+            errorCode=400,
+            errorResponse=f"Task {id} already has {len(existing_subtasks)} sub-tasks. Cannot generate new ones."
+        )
+        return None, None, None, make_response(jsonify(error_response.to_dict()), 400)
+    
+    return parent_task, owner, None, None
+
+
 @api.route('/<string:id>/generate-subtasks')
 class SubTaskGenerationResource(Resource):
+    @admission_class(LLM_BOUND)
     def post(self, id):
         """
             Generate sub-tasks for a parent task using AI
@@ -19,29 +84,32 @@ class SubTaskGenerationResource(Resource):
         try:
             subtask_service = SubTaskService()
             
-            # Check if task exists and get its details
-            parent_task = subtask_service.task_collection.find_one({"_id": id})
-            if not parent_task:
-                error_response = ErrorResponse(
-                    errorCode=404,
-                    errorResponse=f"Task with id {id} not found"
-                )
-                return make_response(jsonify(error_response.to_dict()), 404)
-            
-            # Check if task already has sub-tasks
-            existing_subtasks = subtask_service.get_subtasks_for_task(id)
-            if existing_subtasks:
-                error_response = ErrorResponse(
-                    errorCode=400,
-                    errorResponse=f"Task {id} already has {len(existing_subtasks)} sub-tasks. Cannot generate new ones."
+            parent_task, owner, shared_subtasks, error_response = acquire_generation_for_parent(subtask_service, id)
+            if error_response:
+                return error_response
+
+            if shared_subtasks is not None:
+                success_response = SuccessResponse(
+                    successCode=200,
+                    successResponse=f"Sub-tasks for task {id} were generated by a concurrent request, returning its {len(shared_subtasks)} sub-tasks"
                 )
-                return make_response(jsonify(error_response.to_dict()), 400)
+                return make_response(jsonify({
+                    "success": success_response.to_dict(),
+                    "subtasks": shared_subtasks
+                }), 200)
             
             # Generate sub-tasks using AI
             title = parent_task.get('title', '')
             description = parent_task.get('description', '')
             
-            created_subtasks = subtask_service.generate_subtasks_for_task(id, title, description)
+            created_subtasks = []
+            try:
+                created_subtasks = subtask_service.generate_subtasks_for_task(id, title, description, lease_owner=owner)
+            finally:
+                subtask_service.release_generation(id, owner, succeeded=bool(created_subtasks))
+            task_list_cache.invalidate(TASK_GENERATION, TAG_GENERATION)
+            for subtask in created_subtasks:
+                task_events.publish("insert", subtask['_id'], id)
             
             if not created_subtasks:
                 error_response = ErrorResponse(
@@ -69,6 +137,68 @@ class SubTaskGenerationResource(Resource):
             return make_response(jsonify(error_response.to_dict()), 500)
 
 
+@api.route('/<string:id>/generate-subtasks/stream')
+class SubTaskGenerationStreamResource(Resource):
+    @admission_class(LLM_BOUND)
+    def post(self, id):
+        """
+            Generate sub-tasks for a parent task using AI, streamed as Server-Sent Events.
+            Each sub-task is stored and sent (event "subtask") as soon as the model has finished writing it,
+            followed by a "done" event with the total count, or an "error" event if generation stopped early.
+            Sub-tasks sent before an error are kept. Use a streaming client (fetch, curl -N); Swagger UI does not render streams.
+        """
+        try:
+            subtask_service = SubTaskService()
+            
+            parent_task, owner, shared_subtasks, error_response = acquire_generation_for_parent(subtask_service, id)
+            if error_response:
+                return error_response
+            
+            title = parent_task.get('title', '')
+            description = parent_task.get('description', '')
+
+            def generate():
+                created = 0
+                yield task_events.format_event({"type": "started", "task_id": id, "shared": shared_subtasks is not None})
+                if shared_subtasks is not None:
+                    # Another request generated them while this one waited
+                    for created, subtask in enumerate(shared_subtasks, start=1):
+                        yield task_events.format_event({"id": str(created), "type": "subtask", "subtask": subtask})
+                    yield task_events.format_event({"type": "done", "task_id": id, "total_count": created})
+                    return
+                try:
+                    for subtask in subtask_service.stream_subtasks_for_task(id, title, description, lease_owner=owner):
+                        created += 1
+                        task_list_cache.invalidate(TASK_GENERATION, TAG_GENERATION)
+                        task_events.publish("insert", subtask['_id'], id)
+                        yield task_events.format_event({"id": str(created), "type": "subtask", "subtask": subtask})
+                except Exception as e:
+                    logger.error(f"Sub-task stream for task {id} stopped after {created} sub-tasks: {e}")
+                finally:
+                    subtask_service.release_generation(id, owner, succeeded=created > 0)
+                if created:
+                    yield task_events.format_event({"type": "done", "task_id": id, "total_count": created})
+                else:
+                    yield task_events.format_event({"type": "error", "task_id": id, "errorResponse": f"Failed to generate sub-tasks for task {id}"})
+
+            return Response(
+                stream_with_context(generate()),
+                mimetype="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "X-Accel-Buffering": "no",
+                }
+            )
+            
+        except Exception as e:
+            logger.error(f"Error streaming sub-tasks for task {id}: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to generate sub-tasks: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
+
+
 @api.route('/<string:id>/subtasks')
 class SubTaskListResource(Resource):
     def get(self, id):
@@ -90,7 +220,7 @@ class SubTaskListResource(Resource):
             subtask_service = SubTaskService()
             
             # Check if task exists
-            parent_task = subtask_service.task_collection.find_one({"_id": id})
+            parent_task = subtask_service.task_collection.find_one(tenant_filter({"_id": id}))
             if not parent_task:
                 error_response = ErrorResponse(
                     errorCode=404,
@@ -133,7 +263,7 @@ class SubTaskParentResource(Resource):
             subtask_service = SubTaskService()
             
             # Check if sub-task exists
-            subtask = subtask_service.task_collection.find_one({"_id": id})
+            subtask = subtask_service.task_collection.find_one(tenant_filter({"_id": id}))
             if not subtask:
                 error_response = ErrorResponse(
                     errorCode=404,
@@ -3,14 +3,16 @@ from datetime import datetime
 from flask import make_response, jsonify
 from constants import TASK_HANDLER_COLLECTION
 from flask_restx import Namespace, Resource
-from mongodb.mongo_template import MongoTemplate
+from mongodb.mongo_template import MongoTemplate, CRITICAL_WRITE
+from mongodb.tenant_scope import tenant_filter
 from services.subtask_service import SubTaskService
+from services.cache_service import task_list_cache
+from services.event_service import task_events
 from config_mapping.mapping import SuccessResponse, ErrorResponse
 
 
 api = Namespace("resollect/tasks")
 
-mongo_client = MongoTemplate.create_moongo_client()
 @api.route('/<string:id>/complete')
 class TaskCompleteResource(Resource):
     def post(self, id):
@@ -23,11 +25,11 @@ class TaskCompleteResource(Resource):
             ID is a valid task ID.
         """
         try:
-            task_collection = mongo_client['brs-db'][TASK_HANDLER_COLLECTION]
+            task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, CRITICAL_WRITE)
             subtask_service = SubTaskService()
             
             # Check if task exists
-            existing_task = task_collection.find_one({"_id": id})
+            existing_task = task_collection.find_one(tenant_filter({"_id": id}))
             if not existing_task:
                 error_response = ErrorResponse(
                     errorCode=404,
@@ -37,20 +39,22 @@ class TaskCompleteResource(Resource):
             
             # Update task to completed status
             result = task_collection.update_one(
-                {"_id": id},
+                tenant_filter({"_id": id}),
                 {
                     "$set": {
                         "completed": True,
                         "status": "Completed",
                         "updated_at": datetime.now()
-                    }
+                    },
+                    "$inc": {"version": 1}
                 }
             )
             
             if result.modified_count > 0:
-                # If this is a sub-task, update parent task progress
+                # If this is a sub-task, roll its progress up through the parent and every ancestor
+                updated_ancestors = []
                 if existing_task.get('is_subtask') and existing_task.get('parent_task_id'):
-                    subtask_service.update_parent_task_progress(existing_task['parent_task_id'])
+                    updated_ancestors = subtask_service.roll_up_progress(existing_task)
                     success_response = SuccessResponse(
                         successCode=200,
                         successResponse=f"Sub-task {id} marked as completed and parent task progress updated"
@@ -60,6 +64,10 @@ class TaskCompleteResource(Resource):
                         successCode=200,
                         successResponse=f"Task {id} marked as completed successfully"
                     )
+                task_list_cache.invalidate()
+                task_events.publish("complete", id, existing_task.get('parent_task_id'))
+                for ancestor_id in updated_ancestors:
+                    task_events.publish("update", ancestor_id, fields=["status"])
                 
                 return make_response(jsonify(success_response.to_dict()), 200)
             else:
@@ -5,10 +5,20 @@
 # - task_complete_controller.py
 # - tag_controller.py
 # - subtask_controller.py
+# - task_import_controller.py
+# - task_search_controller.py
+# - task_due_controller.py
+# - task_events_controller.py
+# - metrics_controller.py
 # - main_controller.py
 
 from .task_list_controller import *
 from .task_detail_controller import *
 from .task_complete_controller import *
 from .tag_controller import *
-from .subtask_controller import * 
\ No newline at end of file
+from .subtask_controller import *
+from .task_import_controller import *
+from .task_search_controller import *
+from .task_due_controller import *
+from .task_events_controller import *
+from .metrics_controller import * 
\ No newline at end of file
@@ -3,17 +3,73 @@ from datetime import datetime
 from flask import request, make_response, jsonify
 from flask_accepts import accepts
 from config_mapping.mapping import SuccessResponse, ErrorResponse, TaskUpdateCall
-from constants import TASK_HANDLER_COLLECTION
+from constants import TASK_HANDLER_COLLECTION, ARCHIVED_TASK_COLLECTION
 from flask_restx import Namespace, Resource
-from mongodb.mongo_template import MongoTemplate
+from mongodb.mongo_template import MongoTemplate, INTERACTIVE_READ, CRITICAL_WRITE
+from mongodb.tenant_scope import tenant_filter
+from services.subtask_service import SubTaskService, subtask_config
+from services.deadline_service import DeadlineService
+from services.cache_service import task_list_cache, TASK_GENERATION, TAG_GENERATION
+from services.event_service import task_events
+from services.similarity_service import similar_tasks
 from services.tag_service import TagService
-from services.subtask_service import SubTaskService
 from config_mapping import get_schema
+from pymongo import ReturnDocument
+from .controller_helper import (
+    build_task_etag, parse_if_match_version, not_modified_response, parse_flag,
+    negotiate_representation, representation_etag, render_representation
+)
 
 
 api = Namespace("resollect/tasks")
 
-mongo_client = MongoTemplate.create_moongo_client()
+# Fields a PUT may change. Everything else (identity, tenant, version, the materialized path, generation and
+# enrichment state, archive markers) is owned by the server and rejected.
+UPDATABLE_TASK_FIELDS = {"title", "description", "deadline", "priority", "status", "completed", "tags"}
+# The create and update calls name the description inputStr
+UPDATE_FIELD_ALIASES = {"inputStr": "description"}
+
+
+
+def version_filter(id, expected_version):
+    """
+    Filter matching the task of the current tenant, and only at the expected version when one is given.
+    Documents written before the version field existed match version 0.
+    """
+    if expected_version is None:
+        return tenant_filter({"_id": id})
+    if expected_version == 0:
+        return tenant_filter({"_id": id, "version": {"$in": [None, 0]}})
+    return tenant_filter({"_id": id, "version": expected_version})
+
+
+def missing_or_conflict_response(task_collection, id, expected_version):
+    """
+    A conditional write matched nothing; only then look the task up to tell 404 from 412.
+    """
+    if expected_version is not None:
+        current_task = task_collection.find_one(tenant_filter({"_id": id}), {"version": 1})
+        if current_task:
+            error_response = ErrorResponse(
+                errorCode=412,
+                errorResponse=f"Task {id} has been modified since version {expected_version}"
+            )
+            http_response = make_response(jsonify(error_response.to_dict()), 412)
+            http_response.set_etag(build_task_etag(current_task))
+            return http_response
+    error_response = ErrorResponse(
+        errorCode=404,
+        errorResponse=f"Task with id {id} not found"
+    )
+    return make_response(jsonify(error_response.to_dict()), 404)
+
+def touch_ancestors(task_collection, task):
+    """
+    Bumps the version of every ancestor of a changed sub-task, whose detail view (and ETag) embeds it
+    """
+    ancestors = SubTaskService.task_ancestors(task)
+    if ancestors:
+        task_collection.update_many(tenant_filter({"_id": {"$in": ancestors}}), {"$inc": {"version": 1}})
 
 @api.route('/<string:id>')
 class TaskDetailResource(Resource):
@@ -25,14 +81,30 @@ class TaskDetailResource(Resource):
             ID exists in the database.
             ID is a valid task ID.
             ID is a valid task ID.
+        Query parameters:
+            depth (int): Levels of nested sub-tasks to include (default 1, direct sub-tasks only).
+            include_archived (bool): Also look the task up in the archive (read-only) when it is not an open task.
+        Send "Accept: application/msgpack" for a MessagePack body instead of JSON.
         """
         try:
-            task_collection = mongo_client['brs-db'][TASK_HANDLER_COLLECTION]
+            task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, INTERACTIVE_READ)
+
+            depth = request.args.get('depth', default=1, type=int)
+            if depth is None or not 1 <= depth <= subtask_config.SUBTASK_MAX_DEPTH:
+                error_response = ErrorResponse(
+                    errorCode=400,
+                    errorResponse=f"depth must be an integer between 1 and {subtask_config.SUBTASK_MAX_DEPTH}"
+                )
+                return make_response(jsonify(error_response.to_dict()), 400)
             
             logger.info(f"Searching for task with ID: {id}")
             
-            # Find task by ID
-            task = task_collection.find_one({"_id": id})
+            # Find task by ID, then in the archive when asked to
+            task = task_collection.find_one(tenant_filter({"_id": id}))
+            task_collection_name = TASK_HANDLER_COLLECTION
+            if not task and parse_flag(request.args.get('include_archived')):
+                task_collection_name = ARCHIVED_TASK_COLLECTION
+                task = MongoTemplate.get_collection(task_collection_name, INTERACTIVE_READ).find_one(tenant_filter({"_id": id}))
             
             logger.info(f"Task found: {task}")
             
@@ -42,10 +114,17 @@ class TaskDetailResource(Resource):
                     errorResponse=f"Task with id {id} not found"
                 )
                 return make_response(jsonify(error_response.to_dict()), 404)
+
+            # Conditional GET: skip serialization and tag/sub-task hydration when the client is up to date.
+            # Sub-task writes bump the versions of all ancestors, so the ETag covers the embedded subtree too.
+            etag = build_task_etag(task) if depth == 1 else f"{build_task_etag(task)}-d{depth}"
+            representation = negotiate_representation()
+            etag = representation_etag(etag, representation)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified_response(etag)
             
-            # Initialize services
-            tag_service = TagService()
-            subtask_service = SubTaskService()
+            # Initialize services, an archived task's subtree was archived with it
+            subtask_service = SubTaskService(task_collection_name)
             
             # Convert ObjectId to string for JSON serialization
             if '_id' in task:
@@ -54,17 +133,24 @@ class TaskDetailResource(Resource):
                 task['created_at'] = task['created_at'].isoformat()
             if 'updated_at' in task and task['updated_at']:
                 task['updated_at'] = task['updated_at'].isoformat()
+            if isinstance(task.get('deadline'), datetime):
+                task['deadline'] = task['deadline'].isoformat()
+            if isinstance(task.get('archived_at'), datetime):
+                task['archived_at'] = task['archived_at'].isoformat()
             
-            # Add tags to task
-            task_tags = tag_service.get_task_tags(task['_id'])
-            task['tags'] = task_tags
+            # Tags are denormalized onto the task document
+            task['tags'] = task.get('tags') or []
             
-            # Add sub-tasks if this is a parent task
-            if not task.get('is_subtask', False):
+            # Add sub-tasks, nested `depth` levels deep; sub-tasks can have sub-tasks of their own
+            if depth == 1:
                 subtasks = subtask_service.get_subtasks_for_task(task['_id'])
-                task['subtasks'] = subtasks
-                task['subtask_count'] = len(subtasks)
             else:
+                subtasks = subtask_service.get_subtask_tree(task['_id'], task.get('depth') or 0, depth)
+                task.update(subtask_service.get_subtree_progress(task['_id']))
+            task['subtasks'] = subtasks
+            task['subtask_count'] = len(subtasks)
+
+            if task.get('is_subtask', False):
                 # If this is a sub-task, add parent task info
                 parent_task = subtask_service.get_parent_task(task['_id'])
                 if parent_task:
@@ -73,7 +159,9 @@ class TaskDetailResource(Resource):
                         'title': parent_task['title']
                     }
             
-            return make_response(jsonify(task), 200)
+            http_response = render_representation(task, representation)
+            http_response.set_etag(etag)
+            return http_response
             
         except Exception as e:
             logger.error(f"Error while retrieving task {id}: {e}")
@@ -90,21 +178,13 @@ class TaskDetailResource(Resource):
         Args:
             id (str): The unique identifier of the task.
         Request Body:
-            JSON object with fields to update (e.g., title, description, status, etc.).
+            JSON object with the fields to update: title, description (or inputStr), deadline, priority, status, completed, tags.
+            tags replaces the task's tags.
         Returns:
             JSON response indicating success or failure of the update operation.
         """
         try:
-            task_collection = mongo_client['brs-db'][TASK_HANDLER_COLLECTION]
-            
-            # Check if task exists
-            existing_task = task_collection.find_one({"_id": id})
-            if not existing_task:
-                error_response = ErrorResponse(
-                    errorCode=404,
-                    errorResponse=f"Task with id {id} not found"
-                )
-                return make_response(jsonify(error_response.to_dict()), 404)
+            task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, CRITICAL_WRITE)
             
             # Get update data from request body
             update_data = request.get_json()
@@ -114,28 +194,77 @@ class TaskDetailResource(Resource):
                     errorResponse="No update data provided"
                 )
                 return make_response(jsonify(error_response.to_dict()), 400)
+
+            try:
+                expected_version = parse_if_match_version(request.if_match)
+            except ValueError as e:
+                error_response = ErrorResponse(
+                    errorCode=400,
+                    errorResponse=str(e)
+                )
+                return make_response(jsonify(error_response.to_dict()), 400)
             
+            update_data = {UPDATE_FIELD_ALIASES.get(key, key): value for key, value in update_data.items()}
+            rejected_fields = sorted(set(update_data) - UPDATABLE_TASK_FIELDS)
+            if rejected_fields:
+                error_response = ErrorResponse(
+                    errorCode=400,
+                    errorResponse=f"These fields cannot be updated: {', '.join(rejected_fields)}",
+                    errorResolution=f"Send only {', '.join(sorted(UPDATABLE_TASK_FIELDS))}"
+                )
+                return make_response(jsonify(error_response.to_dict()), 400)
+
+            # Deadlines are stored as dates so that the due/overdue queries can use the index
+            if 'deadline' in update_data:
+                try:
+                    update_data['deadline'] = DeadlineService.parse_deadline(update_data['deadline'])
+                except (TypeError, ValueError) as e:
+                    error_response = ErrorResponse(
+                        errorCode=400,
+                        errorResponse=f"Invalid deadline: {e}"
+                    )
+                    return make_response(jsonify(error_response.to_dict()), 400)
+                update_data['overdue'] = bool(update_data['deadline'] and update_data['deadline'] < datetime.utcnow())
+
+            # Tags are normalized like on create and written to the task document by the same update; the
+            # task_tags rows follow once it succeeded
+            if 'tags' in update_data:
+                tags = update_data['tags']
+                if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+                    error_response = ErrorResponse(
+                        errorCode=400,
+                        errorResponse="Invalid tags: expected a list of tag names"
+                    )
+                    return make_response(jsonify(error_response.to_dict()), 400)
+                update_data['tags'] = TagService.normalize_tag_names(tags)
+
             # Add updated_at timestamp
             update_data['updated_at'] = datetime.now()
             
-            # Update the task
-            result = task_collection.update_one(
-                {"_id": id},
-                {"$set": update_data}
+            # Update the task in a single round trip, conditional on the version when If-Match is sent
+            updated_task = task_collection.find_one_and_update(
+                version_filter(id, expected_version),
+                {"$set": update_data, "$inc": {"version": 1}},
+                return_document=ReturnDocument.AFTER
             )
             
-            if result.modified_count > 0:
+            if updated_task:
+                touch_ancestors(task_collection, updated_task)
+                if 'tags' in update_data:
+                    TagService().replace_task_tag_rows(id, update_data['tags'])
+                    task_list_cache.invalidate(TASK_GENERATION, TAG_GENERATION)
+                else:
+                    task_list_cache.invalidate()
+                task_events.publish("update", id, updated_task.get('parent_task_id'), fields=sorted(update_data))
                 success_response = SuccessResponse(
                     successCode=200,
                     successResponse=f"Task {id} updated successfully"
                 )
-                return make_response(jsonify(success_response.to_dict()), 200)
-            else:
-                error_response = ErrorResponse(
-                    errorCode=400,
-                    errorResponse=f"Failed to update task {id}"
-                )
-                return make_response(jsonify(error_response.to_dict()), 400)
+                http_response = make_response(jsonify(success_response.to_dict()), 200)
+                http_response.set_etag(build_task_etag(updated_task))
+                return http_response
+
+            return missing_or_conflict_response(task_collection, id, expected_version)
                 
         except Exception as e:
             logger.error(f"Error while updating task {id}: {e}")
@@ -156,32 +285,35 @@ class TaskDetailResource(Resource):
             ID is a valid task ID.
         """
         try:
-            task_collection = mongo_client['brs-db'][TASK_HANDLER_COLLECTION]
+            task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, CRITICAL_WRITE)
             
-            # Check if task exists
-            existing_task = task_collection.find_one({"_id": id})
-            if not existing_task:
+            try:
+                expected_version = parse_if_match_version(request.if_match)
+            except ValueError as e:
                 error_response = ErrorResponse(
-                    errorCode=404,
-                    errorResponse=f"Task with id {id} not found"
+                    errorCode=400,
+                    errorResponse=str(e)
                 )
-                return make_response(jsonify(error_response.to_dict()), 404)
+                return make_response(jsonify(error_response.to_dict()), 400)
             
-            # Delete the task
-            result = task_collection.delete_one({"_id": id})
+            # Delete the task in a single round trip, conditional on the version when If-Match is sent
+            deleted_task = task_collection.find_one_and_delete(
+                version_filter(id, expected_version),
+                projection={"ancestors": 1, "parent_task_id": 1}
+            )
             
-            if result.deleted_count > 0:
+            if deleted_task:
+                touch_ancestors(task_collection, deleted_task)
+                task_list_cache.invalidate()
+                similar_tasks.remove(id)
+                task_events.publish("delete", id)
                 success_response = SuccessResponse(
                     successCode=200,
                     successResponse=f"Task {id} deleted successfully"
                 )
                 return make_response(jsonify(success_response.to_dict()), 200)
-            else:
-                error_response = ErrorResponse(
-                    errorCode=400,
-                    errorResponse=f"Failed to delete task {id}"
-                )
-                return make_response(jsonify(error_response.to_dict()), 400)
+
+            return missing_or_conflict_response(task_collection, id, expected_version)
                 
         except Exception as e:
             logger.error(f"Error while deleting task {id}: {e}")
@@ -0,0 +1,56 @@
+from log import logger
+from datetime import datetime
+from flask import request, make_response, jsonify
+from config_mapping.mapping import TaskListResponse, ErrorResponse
+from flask_restx import Namespace, Resource
+from services.deadline_service import DeadlineService
+
+api = Namespace("resollect/tasks")
+
+
+@api.route('/due')
+class TaskDueResource(Resource):
+    def get(self):
+        """
+            List open tasks due within a time window, soonest deadline first.
+            Query parameters: within (e.g. 90m, 24h, 3d, 1w, default 24h), include_overdue (true/false, default false).
+            Example: /resollect/tasks/due?within=3d
+        """
+        try:
+            deadline_service = DeadlineService()
+            try:
+                within = deadline_service.parse_within(request.args.get('within', '24h'))
+            except ValueError as e:
+                error_response = ErrorResponse(
+                    errorCode=400,
+                    errorResponse=str(e)
+                )
+                return make_response(jsonify(error_response.to_dict()), 400)
+            include_overdue = request.args.get('include_overdue', 'false').lower() == 'true'
+
+            tasks = deadline_service.get_tasks_due_within(within, include_overdue)
+
+            for task in tasks:
+                if '_id' in task:
+                    task['_id'] = str(task['_id'])
+                if 'created_at' in task and task['created_at']:
+                    task['created_at'] = task['created_at'].isoformat()
+                if 'updated_at' in task and task['updated_at']:
+                    task['updated_at'] = task['updated_at'].isoformat()
+                if isinstance(task.get('deadline'), datetime):
+                    task['deadline'] = task['deadline'].isoformat()
+                task['tags'] = task.get('tags') or []
+
+            response = TaskListResponse(
+                tasks=tasks,
+                total_count=len(tasks)
+            )
+            return make_response(jsonify(response.to_dict()), 200)
+
+        except Exception as e:
+            logger.error(f"Error while retrieving due tasks: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to retrieve due tasks: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
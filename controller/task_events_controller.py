@@ -0,0 +1,45 @@
+from log import logger
+from flask import request, make_response, jsonify, Response, stream_with_context
+from config_mapping.mapping import ErrorResponse
+from flask_restx import Namespace, Resource
+from services.event_service import task_events, TaskEventSubscriber
+from services.admission_service import admission_class, UNLIMITED
+
+api = Namespace("resollect/tasks")
+
+
+@api.route('/events')
+class TaskEventsResource(Resource):
+    # Streams stay open for minutes, they would hold read slots for as long
+    @admission_class(UNLIMITED)
+    def get(self):
+        """
+            Server-Sent Events stream of task changes (creates, updates, completions, deletes, tags, generated sub-tasks).
+            Query parameters: task_id (only that task), parent_id (that task and its sub-tasks).
+            Reconnects resume from the Last-Event-ID header (or ?last_event_id=); a "resync" event means the client should refetch.
+            Use a streaming client (EventSource, curl -N); Swagger UI does not render streams.
+        """
+        try:
+            subscriber = TaskEventSubscriber(
+                task_id=request.args.get('task_id'),
+                parent_id=request.args.get('parent_id')
+            )
+            last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+            logger.info(f"Opening task event stream in {task_events.mode} mode, filters: task_id={subscriber.task_id}, parent_id={subscriber.parent_id}")
+
+            return Response(
+                stream_with_context(task_events.stream(subscriber, last_event_id)),
+                mimetype="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "X-Accel-Buffering": "no",
+                }
+            )
+
+        except Exception as e:
+            logger.error(f"Error while opening the task event stream: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to open task event stream: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
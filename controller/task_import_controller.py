@@ -0,0 +1,64 @@
+from log import logger
+from flask import request, make_response, jsonify
+from config_mapping.mapping import ErrorResponse
+from flask_restx import Namespace, Resource
+from services.import_service import TaskImportService, SUPPORTED_FORMATS
+
+
+api = Namespace("resollect/tasks")
+
+
+def detect_import_format(filename: str, content_type: str):
+    """
+    Picks the import format from the explicit ?format= value, the file extension or the content type
+    """
+    explicit_format = request.args.get('format')
+    if explicit_format:
+        return explicit_format.lower()
+    filename = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if filename.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return None
+
+
+@api.route('/import')
+class TaskImportResource(Resource):
+    def post(self):
+        """
+            Bulk import tasks from a CSV or NDJSON file.
+            Send the file as multipart form field "file", or as the raw request body with a text/csv or application/x-ndjson content type.
+            Every row needs title, inputStr and deadline (requestId is optional), the same fields as POST /resollect/tasks/task.
+            Priority and tags are generated later by the enrichment job, not during the import.
+            Returns a per-row error report, invalid rows do not abort the import.
+        """
+        try:
+            upload = request.files.get('file')
+            if upload:
+                stream = upload.stream
+                file_format = detect_import_format(upload.filename, upload.mimetype)
+            else:
+                stream = request.stream
+                file_format = detect_import_format(None, request.content_type)
+
+            if file_format not in SUPPORTED_FORMATS:
+                error_response = ErrorResponse(
+                    errorCode=400,
+                    errorResponse=f"Could not determine import format, expected one of {SUPPORTED_FORMATS}",
+                    errorResolution="Pass ?format=csv or ?format=ndjson, or upload a .csv/.ndjson file"
+                )
+                return make_response(jsonify(error_response.to_dict()), 400)
+
+            report = TaskImportService().import_tasks(stream, file_format)
+            status_code = 200 if report.failed == 0 else 207
+            return make_response(jsonify(report.to_dict()), status_code)
+
+        except Exception as e:
+            logger.error(f"Error while importing tasks: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to import tasks: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
@@ -1,3 +1,4 @@
+import json
 from log import logger
 from copy import deepcopy
 import uuid
@@ -6,16 +7,26 @@ from flask import request, make_response, jsonify
 from config_mapping import get_schema
 from config_mapping.mapping import TaskPostCall, TaskListQuery, TaskListResponse, SuccessResponse, ErrorResponse
 from constants import (
-    INPUT_TASK_PRIORITY_FINALIZER, INPUT_TASK_SYSTEM_TEMPLATE, TASK_HANDLER_COLLECTION
+    INPUT_TASK_PRIORITY_FINALIZER, INPUT_TASK_SYSTEM_TEMPLATE, TASK_HANDLER_COLLECTION, ARCHIVED_TASK_COLLECTION
 )
 from llms.GPT import GPT4O1InferEngine
 from flask_restx import Namespace, Resource
 from flask_accepts import accepts, responds
-from mongodb.mongo_template import mongo_client, MongoTemplate
-from mongodb.mongo_operations import addnewTask, getTasks
+from mongodb.mongo_template import MongoTemplate, CACHED_LIST_READ, CRITICAL_WRITE
+from mongodb.mongo_operations import addnewTask, getTasks, getTasksVersion
+from mongodb.tenant_scope import tenant_filter
 from .controller_helper import *
 from services.tag_service import TagService
+from services.cache_service import task_list_cache, TASK_GENERATION, TAG_GENERATION
+from services.event_service import task_events
+from services.similarity_service import similar_tasks
+from services.admission_service import admission_class, LLM_BOUND
+from services.lease_service import LeaseHeartbeat
+from services.idempotency_service import (
+    IdempotencyService, idempotency_config, IDEMPOTENCY_REPLAYED, IDEMPOTENCY_MISMATCH, IDEMPOTENCY_IN_PROGRESS
+)
 from llms import hugging_face
+from llms.prompt_builder import build_prompt, PRIORITY_TEMPLATE
 
 api = Namespace("resollect/tasks")
 
@@ -27,6 +38,8 @@ class TaskListResource(Resource):
             List all tasks, whatever are there in the database and created so far.
             Click on the "Try it out" button to see the response.
             Click on the "Execute" button to see the response.
+            Archived tasks (completed long ago) are only listed with include_archived=true.
+            Send "Accept: application/msgpack" for a MessagePack body instead of JSON.
         """
         try:
             # Get query parameters - try flask-accepts first, fallback to manual parsing
@@ -38,10 +51,37 @@ class TaskListResource(Resource):
                     ordering=request.args.get('ordering'),
                     priority=request.args.get('priority'),
                     status=request.args.get('status'),
-                    completed=request.args.get('completed', type=bool)
+                    completed=request.args.get('completed', type=bool),
+                    tag=",".join(request.args.getlist('tag')) or None,
+                    tag_mode=request.args.get('tag_mode'),
+                    include_archived=parse_flag(request.args.get('include_archived'))
                 )
             
             logger.info(f"Query parameters: {query_params.to_dict()}")
+
+            if query_params.tag_mode not in (None, 'all', 'any'):
+                error_response = ErrorResponse(
+                    errorCode=400,
+                    errorResponse=f"Invalid tag_mode '{query_params.tag_mode}', expected 'all' or 'any'"
+                )
+                return make_response(jsonify(error_response.to_dict()), 400)
+
+            representation = negotiate_representation()
+            # The cache holds the JSON body, the msgpack representation is encoded from it on a hit
+            cache_key = task_list_cache.build_key(query_params)
+            cached = task_list_cache.get(cache_key)
+            if cached is not None:
+                etag, cached_body = cached
+                etag = representation_etag(etag, representation)
+                if request.if_none_match.contains_weak(etag):
+                    return not_modified_response(etag)
+                logger.info("Serving task list from cache")
+                if representation == "json":
+                    http_response = make_response(cached_body, 200, {"Content-Type": "application/json", "Vary": "Accept"})
+                else:
+                    http_response = render_representation(json.loads(cached_body), representation)
+                http_response.set_etag(etag)
+                return http_response
             
             # Validate that at least one filter parameter is provided
             # if not query_params.has_any_filter():
@@ -51,36 +91,25 @@ class TaskListResource(Resource):
             #     )
             #     return make_response(jsonify(error_response.to_dict()), 400)
             
-            task_collection = mongo_client['brs-db'][TASK_HANDLER_COLLECTION]
-            
-            # Initialize tag service
-            tag_service = TagService()
-            
-            # Handle tag filtering
-            task_ids = None
-            if query_params.tag:
-                task_ids = tag_service.get_tasks_by_tag(query_params.tag)
-                if not task_ids:
-                    # No tasks found with this tag, return empty result
-                    response = TaskListResponse(
-                        tasks=[],
-                        total_count=0
-                    )
-                    return make_response(jsonify(response.to_dict()), 200)
+            # Primary: the result is cached and ETagged, it must include the caller's own writes
+            task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, CACHED_LIST_READ)
             
             # Build filters
-            filters = {}
-            if query_params.priority:
-                filters['priority'] = query_params.priority
-            if query_params.status:
-                filters['status'] = query_params.status
-            if query_params.completed is not None:
-                filters['completed'] = query_params.completed
+            filters = build_task_filters(query_params)
+            archive_collection = ARCHIVED_TASK_COLLECTION if query_params.include_archived else None
             
+            # Conditional GET: answer from the aggregate summary without fetching or hydrating the tasks
+            if request.if_none_match:
+                etag = build_task_list_etag(query_params.normalized(), getTasksVersion(task_collection, filters, archive_collection=archive_collection))
+                etag = representation_etag(etag, representation)
+                if request.if_none_match.contains_weak(etag):
+                    return not_modified_response(etag)
+
             # Get tasks from database
-            tasks = getTasks(task_collection, filters, query_params.ordering, task_ids)
+            tasks = getTasks(task_collection, filters, query_params.ordering, archive_collection=archive_collection)
+            etag = build_task_list_etag(query_params.normalized(), summarise_tasks(tasks))
             
-            # Convert ObjectId to string for JSON serialization and add tags
+            # Convert ObjectId to string for JSON serialization, tags are already on the document
             for task in tasks:
                 if '_id' in task:
                     task['_id'] = str(task['_id'])
@@ -88,10 +117,11 @@ class TaskListResource(Resource):
                     task['created_at'] = task['created_at'].isoformat()
                 if 'updated_at' in task and task['updated_at']:
                     task['updated_at'] = task['updated_at'].isoformat()
-                
-                # Add tags to task
-                task_tags = tag_service.get_task_tags(task['_id'])
-                task['tags'] = task_tags
+                if isinstance(task.get('deadline'), datetime):
+                    task['deadline'] = task['deadline'].isoformat()
+                if isinstance(task.get('archived_at'), datetime):
+                    task['archived_at'] = task['archived_at'].isoformat()
+                task['tags'] = task.get('tags') or []
             
             # Create response
             response = TaskListResponse(
@@ -99,7 +129,14 @@ class TaskListResource(Resource):
                 total_count=len(tasks)
             )
             
-            return make_response(jsonify(response.to_dict()), 200)
+            json_response = render_representation(response.to_dict(), "json")
+            task_list_cache.set(cache_key, etag, json_response.get_data(as_text=True))
+            if representation == "json":
+                http_response = json_response
+            else:
+                http_response = render_representation(response.to_dict(), representation)
+            http_response.set_etag(representation_etag(etag, representation))
+            return http_response
             
         except Exception as e:
             logger.error(f"Error while retrieving tasks: {e}")
@@ -109,6 +146,7 @@ class TaskListResource(Resource):
             )
             return make_response(jsonify(error_response.to_dict()), 500)
 
+    @admission_class(LLM_BOUND)
     @accepts(schema=get_schema(TaskPostCall), api=api, use_swagger=True)
     def post(self):
         """
@@ -118,38 +156,102 @@ class TaskListResource(Resource):
         """
         mapping_request: TaskPostCall = request.parsed_obj
         request_id = mapping_request.requestId if mapping_request.requestId and len(mapping_request.requestId) > 0 else str(uuid.uuid4())
+        mapping_request.requestId = request_id
         logger.info(f"Received a request for task creation with ID: {request_id}")
 
         task = mapping_request.inputStr
         title = mapping_request.title
 
         try: 
-            tag_service = TagService()
-            formatted_prompt = INPUT_TASK_PRIORITY_FINALIZER.format(title=title, description=task)
-            response = hugging_face.call_hugging_face(formatted_prompt)
-            
-            generated_tags = tag_service.generate_tags_for_task(title, task)
-            inserted_request = create_task_object(mapping_request, response, generated_tags)
-            
-            # Getting the collection in which data needs to be inserted
-            task_collection = mongo_client['brs-db'][TASK_HANDLER_COLLECTION]
-            
-            insertion_response = addnewTask(task_collection, inserted_request)
-            if insertion_response:
-                # Associate tags with the task
-                tag_service.associate_tags_with_task(request_id, generated_tags)
-                
-                success_response = SuccessResponse(
-                    successCode=200,
-                    successResponse=f"Task is successfully submitted with id: {request_id} and tags: {generated_tags}",
+            # A retry with the same requestId gets the first attempt's outcome, or a 409 while that attempt runs
+            idempotency_service = IdempotencyService()
+            owner, outcome, stored_response = idempotency_service.acquire(request_id, IdempotencyService.fingerprint(mapping_request))
+            if outcome == IDEMPOTENCY_REPLAYED:
+                logger.info(f"Replaying the stored outcome of task creation {request_id}")
+                http_response = make_response(jsonify(stored_response["body"]), stored_response["status_code"])
+                http_response.headers["Idempotent-Replayed"] = "true"
+                return http_response
+            if outcome == IDEMPOTENCY_MISMATCH:
+                error_response = ErrorResponse(
+                    errorCode=422,
+                    errorResponse=f"requestId {request_id} was already used for a different task",
+                    errorResolution="Send a new requestId for a new task"
                 )
-                return make_response(jsonify(success_response.to_dict()), 200)
-            else:
+                return make_response(jsonify(error_response.to_dict()), 422)
+            if outcome == IDEMPOTENCY_IN_PROGRESS:
                 error_response = ErrorResponse(
-                    errorCode=400,
-                    errorResponse=f"This with id: {request_id} failed to submit"
+                    errorCode=409,
+                    errorResponse=f"Task creation with id: {request_id} is still in progress",
+                    errorResolution="Retry with the same requestId in a few seconds to get its outcome"
                 )
-                return make_response(jsonify(error_response.to_dict()), 400)
+                return make_response(jsonify(error_response.to_dict()), 409)
+
+            succeeded = False
+            # The LLM calls can outlast the lease, renewing it keeps a retry from running the create a second time
+            heartbeat = LeaseHeartbeat(
+                lambda: idempotency_service.renew(request_id, owner),
+                idempotency_config.IDEMPOTENCY_LEASE_SECONDS / 3,
+                name="idempotency-lease"
+            ).start()
+            try:
+                task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, CRITICAL_WRITE)
+                # Stored by an attempt that died before finishing its record, or whose record has expired
+                existing_task = task_collection.find_one(tenant_filter({"_id": request_id}), {"tags": 1})
+                if existing_task:
+                    success_response = SuccessResponse(
+                        successCode=200,
+                        successResponse=f"Task is successfully submitted with id: {request_id} and tags: {existing_task.get('tags', [])}",
+                    )
+                else:
+                    tag_service = TagService()
+                    # A reworded duplicate of an already classified task reuses its priority and tags
+                    similar_task = similar_tasks.find_similar(title, task)
+                    if similar_task:
+                        response = similar_task["priority"]
+                        generated_tags = similar_task["tags"]
+                    else:
+                        formatted_prompt = build_prompt(INPUT_TASK_PRIORITY_FINALIZER, PRIORITY_TEMPLATE, title, task)
+                        response = hugging_face.call_hugging_face(formatted_prompt)
+                        generated_tags = tag_service.generate_tags_for_task(title, task)
+                    inserted_request = create_task_object(mapping_request, response, generated_tags)
+                    if heartbeat.lost:
+                        # A retry took the claim over while the model answered and runs the create itself
+                        logger.error(f"Lost the idempotency lease of task creation {request_id}, not inserting")
+                        error_response = ErrorResponse(
+                            errorCode=409,
+                            errorResponse=f"Task creation with id: {request_id} was taken over by a retry",
+                            errorResolution="Retry with the same requestId in a few seconds to get its outcome"
+                        )
+                        return make_response(jsonify(error_response.to_dict()), 409)
+                    
+                    insertion_response = addnewTask(task_collection, inserted_request)
+                    if not insertion_response:
+                        error_response = ErrorResponse(
+                            errorCode=400,
+                            errorResponse=f"This with id: {request_id} failed to submit"
+                        )
+                        return make_response(jsonify(error_response.to_dict()), 400)
+
+                    # Associate tags with the task
+                    tag_service.associate_tags_with_task(request_id, generated_tags)
+                    similar_tasks.add(request_id, title, task, response, inserted_request['tags'])
+                    task_list_cache.invalidate(TASK_GENERATION, TAG_GENERATION)
+                    task_events.publish("insert", request_id)
+                    
+                    success_response = SuccessResponse(
+                        successCode=200,
+                        successResponse=f"Task is successfully submitted with id: {request_id} and tags: {generated_tags}",
+                    )
+                if heartbeat.lost:
+                    logger.error(f"Lost the idempotency lease of task creation {request_id} after inserting it")
+                idempotency_service.complete(request_id, owner, 200, success_response.to_dict())
+                succeeded = True
+                return make_response(jsonify(success_response.to_dict()), 200)
+            finally:
+                heartbeat.stop()
+                # A lost claim belongs to the retry that took it over
+                if not succeeded and not heartbeat.lost:
+                    idempotency_service.release(request_id, owner)
 
         except Exception as e:
             logger.error(f"Getting exception while storing the task as : {e}")
@@ -167,7 +269,7 @@ class TaskListResource(Resource):
             Debug endpoint to list all task IDs
         """
         try:
-            task_collection = mongo_client['brs-db'][TASK_HANDLER_COLLECTION]
+            task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION)
             
             # Get all tasks and return only their IDs
             tasks = list(task_collection.find({}, {"_id": 1, "title": 1}))
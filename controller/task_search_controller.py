@@ -0,0 +1,104 @@
+from log import logger
+from datetime import datetime
+from flask import request, make_response, jsonify
+from config_mapping.mapping import TaskSearchQuery, TaskListResponse, ErrorResponse
+from constants import TASK_HANDLER_COLLECTION
+from flask_restx import Namespace, Resource
+from pymongo.errors import OperationFailure
+from mongodb.mongo_template import MongoTemplate, LIST_READ
+from mongodb.mongo_operations import searchTasks
+from .controller_helper import build_task_filters
+
+api = Namespace("resollect/tasks")
+
+MAX_PER_PAGE = 100
+# Server error code of a $text query on a collection without a text index
+INDEX_NOT_FOUND = 27
+
+
+@api.route('/search')
+class TaskSearchResource(Resource):
+    def get(self):
+        """
+            Full-text search over task title and description, ranked by relevance.
+            Query parameters: q (required), page, per_page, and the same priority, status, completed, tag and tag_mode filters as the task list.
+            Example: /resollect/tasks/search?q=insurance renewal&status=Pending&page=1&per_page=20
+        """
+        try:
+            query_params = TaskSearchQuery(
+                q=request.args.get('q'),
+                priority=request.args.get('priority'),
+                status=request.args.get('status'),
+                completed=request.args.get('completed', type=bool),
+                tag=",".join(request.args.getlist('tag')) or None,
+                tag_mode=request.args.get('tag_mode'),
+                page=request.args.get('page', 1, type=int),
+                per_page=request.args.get('per_page', 10, type=int)
+            )
+
+            if not query_params.q or not query_params.q.strip():
+                error_response = ErrorResponse(
+                    errorCode=400,
+                    errorResponse="Query parameter 'q' is required"
+                )
+                return make_response(jsonify(error_response.to_dict()), 400)
+
+            if query_params.page < 1 or not 1 <= query_params.per_page <= MAX_PER_PAGE:
+                error_response = ErrorResponse(
+                    errorCode=400,
+                    errorResponse=f"page must be >= 1 and per_page between 1 and {MAX_PER_PAGE}"
+                )
+                return make_response(jsonify(error_response.to_dict()), 400)
+
+            task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, LIST_READ)
+            tasks, total_count = searchTasks(
+                task_collection,
+                query_params.q.strip(),
+                build_task_filters(query_params),
+                query_params.page,
+                query_params.per_page
+            )
+
+            for task in tasks:
+                if '_id' in task:
+                    task['_id'] = str(task['_id'])
+                if 'created_at' in task and task['created_at']:
+                    task['created_at'] = task['created_at'].isoformat()
+                if 'updated_at' in task and task['updated_at']:
+                    task['updated_at'] = task['updated_at'].isoformat()
+                if isinstance(task.get('deadline'), datetime):
+                    task['deadline'] = task['deadline'].isoformat()
+                task['tags'] = task.get('tags') or []
+
+            response = TaskListResponse(
+                tasks=tasks,
+                total_count=total_count,
+                page=query_params.page,
+                per_page=query_params.per_page
+            )
+            return make_response(jsonify(response.to_dict()), 200)
+
+        except OperationFailure as e:
+            if e.code != INDEX_NOT_FOUND:
+                logger.error(f"Error while searching tasks: {e}")
+                error_response = ErrorResponse(
+                    errorCode=500,
+                    errorResponse=f"Failed to search tasks: {str(e)}"
+                )
+                return make_response(jsonify(error_response.to_dict()), 500)
+            # The worker warm-up creates it; until then (or if creating it failed) search is unavailable
+            logger.error(f"Task search is unavailable, the text index is missing: {e}")
+            error_response = ErrorResponse(
+                errorCode=503,
+                errorResponse="Task search is unavailable: the text index on task_handler does not exist yet",
+                errorResolution="Retry once the service has finished starting; if it persists, run python -m scripts.backfill_tenant to create the indexes"
+            )
+            return make_response(jsonify(error_response.to_dict()), 503)
+
+        except Exception as e:
+            logger.error(f"Error while searching tasks: {e}")
+            error_response = ErrorResponse(
+                errorCode=500,
+                errorResponse=f"Failed to search tasks: {str(e)}"
+            )
+            return make_response(jsonify(error_response.to_dict()), 500)
@@ -0,0 +1,74 @@
+"""
+    Gunicorn configuration, loaded automatically by `gunicorn app:application` from the repo root.
+
+    The task create and generate-subtasks endpoints spend seconds waiting on the LLM provider, so
+    sync workers (one request per process) are the wrong fit. Two high-concurrency modes are supported:
+
+    - gthread (default): every worker runs GUNICORN_THREADS requests concurrently on OS threads.
+    - gevent: every worker runs up to GUNICORN_WORKER_CONNECTIONS requests on greenlets. The worker
+      monkey-patches the standard library before the app is imported, so pymongo and the requests
+      based LLM clients (huggingface_hub, GPT.py) become cooperative without code changes.
+
+    Importing the app does no network I/O (clients are created on first use), so with gthread the app
+    can be preloaded in the master (GUNICORN_PRELOAD=1) to share its memory across workers; post_fork
+    drops any client the master may have created. gevent needs the app imported after patching, so
+    preloading is never enabled for it.
+
+    Every worker warms up in post_worker_init: the Mongo pool, indexes and tag dictionary before it accepts
+    a request (for up to WARMUP_REQUIRED_TIMEOUT_SECONDS), the LLM connections in the background. Point the
+    load balancer's health check at /resollect/health/ready so traffic only reaches warm workers.
+"""
+import os
+import sys
+import multiprocessing
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5001")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+# One worker per core: on one core a second worker cut CPU-bound throughput from 801 to 668 req/s and added
+# no more I/O concurrency than doubling the threads. Capped at 4, each worker holds its own Mongo pool and caches.
+workers = int(os.getenv("GUNICORN_WORKERS", min(4, multiprocessing.cpu_count())))
+
+# gthread: concurrent requests per worker. Measured at ~30 concurrent 1s upstream waits for 32 threads, using
+# ~1.2 ms of CPU per request. Admission control (config.AdmissionConfig) derives its default limits from this (or
+# from worker_connections with gevent): the LLM endpoints get half of it, 16 of 32 threads, so with admission on
+# they peak at ~16 req/s per worker for a 1s provider (measured 14.7), the rest is for their queue, writes and reads.
+# Raise GUNICORN_THREADS to admit more LLM calls per worker, not just ADMISSION_LLM_CONCURRENCY.
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+# gevent: concurrent requests per worker
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 500))
+
+# LLM calls can legitimately take tens of seconds; the GPT client itself times out at 300s
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+preload_app = worker_class != "gevent" and os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+
+
+def post_fork(server, worker):
+    # Only relevant when the app was preloaded; importing pymongo here would precede gevent's patching
+    mongo_template = sys.modules.get("mongodb.mongo_template")
+    if mongo_template is not None:
+        mongo_template.MongoTemplate.reset_mongo_client()
+    gpt = sys.modules.get("llms.GPT")
+    if gpt is not None:
+        gpt.GPT4O1InferEngine.reset_session()
+    hugging_face = sys.modules.get("llms.hugging_face")
+    if hugging_face is not None:
+        hugging_face.get_http_session.cache_clear()
+        hugging_face.get_client.cache_clear()
+    server.log.info(
+        f"Worker {worker.pid} started with worker_class={worker_class}, "
+        f"capacity={worker_connections if worker_class == 'gevent' else threads} concurrent requests"
+    )
+
+
+def post_worker_init(worker):
+    # The app is loaded (and gevent patching done) by now, and the worker accepts requests once this returns
+    warmup_service = sys.modules.get("services.warmup_service")
+    if warmup_service is not None:
+        warmup_service.worker_warmup.start(
+            required_timeout=warmup_service.warmup_config.WARMUP_REQUIRED_TIMEOUT_SECONDS
+        )
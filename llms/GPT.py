@@ -1,8 +1,11 @@
+import json
 import time
+import threading
 import requests
 
 from itertools import cycle
 from tenacity import RetryError
+from llms.prompt_builder import token_usage
 
 
 class GPT4O1InferEngine:
@@ -11,46 +14,121 @@ class GPT4O1InferEngine:
     _api_key_cycle = cycle([""])
     _current_url = next(_url_cycle)  # Store the current URL
     _current_api_key = next(_api_key_cycle)  # Store the current API key
+    # One session per process, so calls reuse the pooled TCP/TLS connections (opened early by the warm-up)
+    _session = None
+    _session_lock = threading.Lock()
 
     @classmethod
-    def _call_azure_gpt_api(cls, prompt: str) -> str:
+    def get_session(cls) -> requests.Session:
+        """
+        The process-wide HTTP session, created on first use (never inherited across a fork, see gunicorn.conf.py)
+        """
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    cls._session = requests.Session()
+        return cls._session
+
+    @classmethod
+    def reset_session(cls) -> None:
+        cls._session = None
+        cls._session_lock = threading.Lock()
+
+    @classmethod
+    def _call_azure_gpt_api(cls, prompt: str, template_name: str = "extraction") -> str:
         """
         Make an API call to the Azure GPT API with retries on 429 Too Many Requests errors.
         Rotates API key & URL only when hitting 429 errors.
         """
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "api-key": cls._current_api_key
-            }
-
-            data = {
-                "model": "gpt-4.1",
-                "messages": [{"role": "system", "content": prompt}],
-                "temperature": 0, "top_p": 0.95
-            }
-
-            print(f"Calling Azure GPT API using URL: {cls._current_url}")
+            return cls._request_azure_gpt_api(prompt, template_name)["text"]
 
-            response = requests.post(cls._current_url, json=data, headers=headers, timeout=int(300))
+        except Exception as e:
+            print(f"API call failed with error: {e}")
 
-            if response.status_code == 429:  # Handle Rate Limit
-                retry_after = int(response.headers.get("Retry-After", 10))  # Default to 10 seconds if header missing
-                print(f"Rate limit hit. Retrying after {retry_after} seconds with a new API key and URL...")
+    @classmethod
+    def _request_azure_gpt_api(cls, prompt: str, template_name: str = "extraction") -> dict:
+        """
+        One completion request: {"text", "prompt_tokens", "completion_tokens"}. Raises on errors.
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "api-key": cls._current_api_key
+        }
+
+        data = {
+            "model": "gpt-4.1",
+            "messages": [{"role": "system", "content": prompt}],
+            "temperature": 0, "top_p": 0.95
+        }
+
+        print(f"Calling Azure GPT API using URL: {cls._current_url}")
+
+        response = cls.get_session().post(cls._current_url, json=data, headers=headers, timeout=int(300))
+
+        if response.status_code == 429:  # Handle Rate Limit
+            retry_after = int(response.headers.get("Retry-After", 10))  # Default to 10 seconds if header missing
+            print(f"Rate limit hit. Retrying after {retry_after} seconds with a new API key and URL...")
+
+            # Rotate URL & API key **only on 429**
+            cls._current_url = next(cls._url_cycle)
+            cls._current_api_key = next(cls._api_key_cycle)
+
+            time.sleep(retry_after)  # Wait before retrying
+            raise requests.exceptions.HTTPError(response=response)  # Trigger retry
+
+        response.raise_for_status()
+        result = response.json()
+        usage = result.get("usage") or {}
+        token_usage.record(template_name, "azure_gpt", usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return {
+            "text": result["choices"][0]["message"]["content"].strip(),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+        }
 
-                # Rotate URL & API key **only on 429**
+    @classmethod
+    def _stream_azure_gpt_api(cls, prompt: str, template_name: str = "extraction"):
+        """
+        Streaming variant of _call_azure_gpt_api: yields the content deltas of the completion as they
+        arrive (server-sent "data:" lines). Usage is reported in the final chunk via include_usage.
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "api-key": cls._current_api_key
+        }
+
+        data = {
+            "model": "gpt-4.1",
+            "messages": [{"role": "system", "content": prompt}],
+            "temperature": 0, "top_p": 0.95,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+
+        print(f"Streaming from Azure GPT API using URL: {cls._current_url}")
+
+        with cls.get_session().post(cls._current_url, json=data, headers=headers, timeout=int(300), stream=True) as response:
+            if response.status_code == 429:
+                # Rotate URL & API key for the next call, a partially consumed stream cannot be retried transparently
                 cls._current_url = next(cls._url_cycle)
                 cls._current_api_key = next(cls._api_key_cycle)
-
-                time.sleep(retry_after)  # Wait before retrying
-                raise requests.exceptions.HTTPError(response=response)  # Trigger retry
-
             response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"].strip()
 
-        except Exception as e:
-            print(f"API call failed with error: {e}")
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                usage = chunk.get("usage")
+                if usage:
+                    token_usage.record(template_name, "azure_gpt", usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                for choice in chunk.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield content
 
     @classmethod
     def create_extraction_prompt(cls, search_query: str, system_prompt: str = '') -> str:
@@ -68,14 +146,14 @@ class GPT4O1InferEngine:
 
 
     @classmethod
-    def process_text_input(cls, prompt: str, system_template: str='', *args, **kwargs) -> str:
+    def process_text_input(cls, prompt: str, system_template: str='', template_name: str = "extraction", *args, **kwargs) -> str:
         """
         Process the raw text input using the GPT-4 API.
         """
         gpt_prompt = GPT4O1InferEngine.create_extraction_prompt(prompt, system_prompt=system_template)
         try:
             print("Generating prompt and calling API...")
-            result = cls._call_azure_gpt_api(gpt_prompt)
+            result = cls._call_azure_gpt_api(gpt_prompt, template_name)
             print(f"LLM Response: {result}")
             return result
         except RetryError as e:
@@ -85,5 +163,22 @@ class GPT4O1InferEngine:
             print(f"An error occurred: {e}")
             raise
 
+    @classmethod
+    def complete_text_input(cls, prompt: str, system_template: str='', template_name: str = "extraction") -> dict:
+        """
+        Same request as process_text_input, returning the token usage with the text and raising on errors
+        """
+        gpt_prompt = GPT4O1InferEngine.create_extraction_prompt(prompt, system_prompt=system_template)
+        return cls._request_azure_gpt_api(gpt_prompt, template_name)
+
+    @classmethod
+    def stream_text_input(cls, prompt: str, system_template: str='', template_name: str = "extraction", *args, **kwargs):
+        """
+        Process the raw text input using the GPT-4 API, yielding the response text as it is generated.
+        """
+        gpt_prompt = GPT4O1InferEngine.create_extraction_prompt(prompt, system_prompt=system_template)
+        print("Generating prompt and streaming API response...")
+        yield from cls._stream_azure_gpt_api(gpt_prompt, template_name)
+
 
 GPT4O1InferEngine()
@@ -1,32 +1,152 @@
 import re
 import os
+import json
+import time
+import functools
 
-from huggingface_hub import InferenceClient
+from log import logger
+from llms.prompt_builder import token_usage, prompt_config, PRIORITY_TEMPLATE
 
-client = InferenceClient(
-    provider="nebius",
-    api_key=os.getenv("HUGGING_FACE_API_KEY", ''),
-)
+HUGGING_FACE_MODEL = "Qwen/Qwen3-14B"
+PRIORITY_LABELS = ["Low", "Medium", "High", "Critical"]
+NO_PRIORITY_MATCH = "No matches found"
 
-def call_hugging_face(input):
-    completion = client.chat.completions.create(
-        model="Qwen/Qwen3-14B",
+# Constrained decoding: the provider may only produce {"priority": "<label>"}
+PRIORITY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "task_priority",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"priority": {"type": "string", "enum": PRIORITY_LABELS}},
+            "required": ["priority"],
+            "additionalProperties": False,
+        },
+    },
+}
+CONSTRAINED_INSTRUCTION = 'Answer with JSON only: {"priority": "Low" | "Medium" | "High" | "Critical"}. /no_think'
+THINK_BLOCK = re.compile(r"<think>.*?</think>", re.DOTALL)
+# 4xx answers that are not about the request's parameters: the verbose call would fail the same way
+NOT_A_REJECTION_STATUSES = {401, 403, 408, 429}
+
+
+@functools.lru_cache(maxsize=None)
+def get_http_session():
+    """
+    One requests session for every thread of the process. huggingface_hub otherwise keeps a session per
+    thread, so a connection opened by the warm-up (or by another request thread) would never be reused.
+    """
+    import requests
+
+    return requests.Session()
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """Created on first use, so importing the app neither imports huggingface_hub nor builds the client"""
+    from huggingface_hub import InferenceClient, configure_http_backend
+
+    configure_http_backend(backend_factory=get_http_session)
+
+    return InferenceClient(
+        provider="nebius",
+        api_key=os.getenv("HUGGING_FACE_API_KEY", ''),
+    )
+
+def complete_hugging_face(input, template_name=PRIORITY_TEMPLATE, constrained=False) -> dict:
+    """
+    Raw completion of the prompt: {"text", "prompt_tokens", "completion_tokens"}. constrained turns Qwen3's
+    thinking off (chat template switch and /no_think), caps the completion and restricts it to the label schema.
+    Usage and latency are recorded per mode (hugging_face / hugging_face_constrained), so
+    /resollect/metrics/llm-usage measures the saving on production traffic.
+    """
+    options = {}
+    if constrained:
+        input = f"{input}\n{CONSTRAINED_INSTRUCTION}"
+        options = {
+            "max_tokens": prompt_config.PRIORITY_MAX_TOKENS,
+            "temperature": 0,
+            "response_format": PRIORITY_RESPONSE_FORMAT,
+            "extra_body": {"chat_template_kwargs": {"enable_thinking": False}},
+        }
+    started = time.perf_counter()
+    completion = get_client().chat.completions.create(
+        model=HUGGING_FACE_MODEL,
         messages=[
             {
                 "role": "user",
                 "content": input
             }
         ],
+        **options
     )
 
-    final_response = completion.choices[0].message.content
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
 
-    text = final_response
-    print(text)
-    matches = re.findall(r"\*\*(.*?)\*\*", text)
+    usage = getattr(completion, "usage", None)
+    token_usage.record(
+        template_name, "hugging_face_constrained" if constrained else "hugging_face",
+        usage.prompt_tokens if usage else None, usage.completion_tokens if usage else None, latency_ms
+    )
+
+    return {
+        "text": completion.choices[0].message.content,
+        "prompt_tokens": usage.prompt_tokens if usage else None,
+        "completion_tokens": usage.completion_tokens if usage else None,
+    }
+
+
+def parse_priority(text: str) -> str:
+    """
+    Priority named by a completion: the first **bold** span, else a label as the last word
+    """
+    matches = re.findall(r"\*\*(.*?)\*\*", text or "")
     if matches:
         return matches[0]
-    elif text.split()[-1] in ["Low", "Medium", "High", "Critical"]:
+    elif text and text.split()[-1] in PRIORITY_LABELS:
         return text.split()[-1]
     else:
-        return "No matches found"
+        return NO_PRIORITY_MATCH
+
+
+def parse_priority_strict(text: str) -> str:
+    """
+    Priority of a constrained completion: {"priority": label} or the bare label, nothing else is accepted
+    """
+    text = THINK_BLOCK.sub("", text or "").strip()
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            value = value.get("priority")
+    except ValueError:
+        value = text.strip("\"'`*. \n")
+    return value if value in PRIORITY_LABELS else NO_PRIORITY_MATCH
+
+
+def is_rejected_request(error: Exception) -> bool:
+    """
+    Whether the provider refused the request itself (4xx, e.g. response_format or chat_template_kwargs not
+    supported), as opposed to a timeout, a connection error, a 5xx, auth or rate limiting
+    """
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code is not None and 400 <= status_code < 500 and status_code not in NOT_A_REJECTION_STATUSES
+
+
+def call_hugging_face(input, template_name=PRIORITY_TEMPLATE):
+    if prompt_config.PRIORITY_CLASSIFICATION_MODE == "constrained":
+        try:
+            text = complete_hugging_face(input, template_name, constrained=True)["text"]
+        except Exception as e:
+            if not is_rejected_request(e):
+                raise
+            logger.error(f"Constrained priority request rejected, falling back to the verbose call: {e}")
+        else:
+            priority = parse_priority_strict(text)
+            if priority != NO_PRIORITY_MATCH:
+                return priority
+            # Never store a failed parse as the task's priority while the verbose call may still answer
+            logger.error(f"Constrained priority answer {text!r} is not a label, falling back to the verbose call")
+    text = complete_hugging_face(input, template_name)["text"]
+    print(text)
+    return parse_priority(text)
@@ -0,0 +1,121 @@
+import json
+from typing import Iterable, Iterator, List
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for a JSON array arriving in arbitrary chunks (e.g. streamed LLM tokens).
+    feed() returns every top-level element completed by the chunk, so callers can act on an element
+    as soon as it closes. Text before the opening bracket (prose, ```json fences) is ignored, and an
+    element that fails to parse is skipped, so a malformed tail never loses the elements before it.
+
+    A bracket only anchors the array once its first element parses (or it closes empty). If that element
+    fails, as in the prose "steps [1-3 below]:", the bracket was not the array: the parse restarts and
+    rescans the text after it for the next bracket.
+    """
+    def __init__(self):
+        self.skipped = 0
+        self._reset()
+
+    def _reset(self):
+        self._started = False
+        self._anchored = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._buffer: List[str] = []
+        # Text after the opening bracket while it is not anchored, rescanned if it turns out to be prose
+        self._since_start: List[str] = []
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, chunk: str) -> list:
+        elements = []
+        pending = chunk
+        while pending and not self._finished:
+            pending = self._scan(pending, elements)
+        return elements
+
+    def _scan(self, text: str, elements: list) -> str:
+        """
+        Consumes text. Returns the text to scan again when an unanchored bracket turned out to be prose, else "".
+        """
+        for index, char in enumerate(text):
+            if self._finished:
+                break
+            if not self._started:
+                self._started = char == "["
+                continue
+            if self._anchored:
+                self._consume(char, elements)
+                continue
+
+            self._since_start.append(char)
+            parsed, skipped = len(elements), self.skipped
+            self._consume(char, elements)
+            if len(elements) > parsed or (self._finished and self.skipped == skipped):
+                self._anchored = True
+                self._since_start = []
+            elif self.skipped > skipped:
+                self.skipped = skipped
+                rescan = "".join(self._since_start) + text[index + 1:]
+                self._reset()
+                return rescan
+        return ""
+
+    def _consume(self, char: str, elements: list):
+        if self._in_string:
+            self._buffer.append(char)
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    # A top-level string element is complete at its closing quote
+                    self._emit(elements)
+            return
+
+        if char == '"':
+            self._in_string = True
+            self._buffer.append(char)
+        elif char in "[{":
+            self._depth += 1
+            self._buffer.append(char)
+        elif char in "]}" and self._depth > 0:
+            self._depth -= 1
+            self._buffer.append(char)
+            if self._depth == 0:
+                self._emit(elements)
+        elif char == "]":
+            self._emit(elements)
+            self._finished = True
+        elif char == "," and self._depth == 0:
+            self._emit(elements)
+        else:
+            self._buffer.append(char)
+
+    def _emit(self, elements: list):
+        text = "".join(self._buffer).strip()
+        self._buffer = []
+        if not text:
+            return
+        try:
+            elements.append(json.loads(text))
+        except json.JSONDecodeError:
+            self.skipped += 1
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator:
+    """
+    Yields the elements of a streamed JSON array as they complete
+    """
+    parser = JsonArrayStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.finished:
+            return
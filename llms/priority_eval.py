@@ -0,0 +1,199 @@
+import os
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+from log import logger
+from constants import INPUT_TASK_PRIORITY_FINALIZER, INPUT_TASK_SYSTEM_TEMPLATE
+from llms.prompt_builder import build_prompt, PRIORITY_TEMPLATE
+from llms.hugging_face import (
+    complete_hugging_face, parse_priority, parse_priority_strict, HUGGING_FACE_MODEL, PRIORITY_LABELS
+)
+from llms.GPT import GPT4O1InferEngine
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+MODE_AUTO = "auto"
+UNPARSED = "unparsed"
+
+# The priority call as each provider is used (or would be used) in production, returning
+# {"text", "prompt_tokens", "completion_tokens"}
+PROVIDERS: Dict[str, Callable[[str], dict]] = {
+    "hugging_face": lambda prompt: complete_hugging_face(prompt, PRIORITY_TEMPLATE),
+    "hugging_face_constrained": lambda prompt: complete_hugging_face(prompt, PRIORITY_TEMPLATE, constrained=True),
+    "azure_gpt": lambda prompt: GPT4O1InferEngine.complete_text_input(prompt, INPUT_TASK_SYSTEM_TEMPLATE, PRIORITY_TEMPLATE),
+}
+PROVIDER_MODELS = {"hugging_face": HUGGING_FACE_MODEL, "hugging_face_constrained": HUGGING_FACE_MODEL, "azure_gpt": "gpt-4.1"}
+# How each provider's answer is read in production; the constrained mode accepts nothing but a label
+PROVIDER_PARSERS: Dict[str, Callable[[str], str]] = {"hugging_face_constrained": parse_priority_strict}
+
+
+class MissingRecording(KeyError):
+    pass
+
+
+class ResponseCassette:
+    """
+    Provider responses captured to a JSONL file, keyed by provider, model and exact prompt, together with
+    the latency and token counts measured when they were recorded. Replaying a cassette makes a run
+    offline and deterministic; a changed prompt or model misses the cassette instead of reusing a stale answer.
+    Failed calls are never recorded.
+    """
+    def __init__(self, path: str, mode: str = MODE_REPLAY):
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as cassette:
+                for line in cassette:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(provider: str, prompt: str) -> str:
+        model = PROVIDER_MODELS.get(provider, "")
+        return hashlib.sha256(f"{provider}\0{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def complete(self, provider: str, prompt: str) -> dict:
+        key = self.key(provider, prompt)
+        if self.mode != MODE_RECORD and key in self.entries:
+            return {**self.entries[key], "replayed": True}
+        if self.mode == MODE_REPLAY:
+            raise MissingRecording(f"No recorded {provider} response for prompt {key[:12]}")
+
+        started = time.perf_counter()
+        result = PROVIDERS[provider](prompt)
+        entry = {
+            "key": key,
+            "provider": provider,
+            "model": PROVIDER_MODELS.get(provider),
+            "prompt": prompt,
+            "text": result.get("text"),
+            "prompt_tokens": result.get("prompt_tokens"),
+            "completion_tokens": result.get("completion_tokens"),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        with self._lock:
+            self.entries[key] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as cassette:
+                cassette.write(json.dumps(entry) + "\n")
+        return {**entry, "replayed": False}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class ProviderReport:
+    """
+    Latency, token and accuracy figures of one provider over the fixture set. Predictions that are not
+    one of the labels (e.g. "No matches found", or a bold span that is not a priority) count as parse failures.
+    """
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.latencies: List[float] = []
+        self.prompt_tokens: List[int] = []
+        self.completion_tokens: List[int] = []
+        self.confusion: Dict[str, Counter] = {label: Counter() for label in PRIORITY_LABELS}
+        self.failures: List[dict] = []
+        self.errors = 0
+        self.missing = 0
+
+    def add(self, fixture: dict, result: dict):
+        predicted = PROVIDER_PARSERS.get(self.provider, parse_priority)(result.get("text"))
+        column = predicted if predicted in PRIORITY_LABELS else UNPARSED
+        self.confusion[fixture["label"]][column] += 1
+        if result.get("latency_ms") is not None:
+            self.latencies.append(result["latency_ms"])
+        if result.get("prompt_tokens") is not None:
+            self.prompt_tokens.append(result["prompt_tokens"])
+        if result.get("completion_tokens") is not None:
+            self.completion_tokens.append(result["completion_tokens"])
+        if column != fixture["label"]:
+            self.failures.append({"title": fixture["title"], "label": fixture["label"], "predicted": predicted,
+                                  "text": (result.get("text") or "")[-200:]})
+
+    def to_dict(self) -> dict:
+        answered = sum(sum(row.values()) for row in self.confusion.values())
+        correct = sum(self.confusion[label][label] for label in PRIORITY_LABELS)
+        unparsed = sum(row[UNPARSED] for row in self.confusion.values())
+        return {
+            "provider": self.provider,
+            "model": PROVIDER_MODELS.get(self.provider),
+            "answered": answered,
+            "errors": self.errors,
+            "missing_recordings": self.missing,
+            "accuracy": round(correct / answered, 4) if answered else None,
+            "parse_failure_rate": round(unparsed / answered, 4) if answered else None,
+            "latency_ms": {f"p{q}": percentile(self.latencies, q) for q in (50, 90, 95, 99)},
+            "prompt_tokens": {"total": sum(self.prompt_tokens), "mean": round(sum(self.prompt_tokens) / len(self.prompt_tokens), 1) if self.prompt_tokens else None},
+            "completion_tokens": {"total": sum(self.completion_tokens), "mean": round(sum(self.completion_tokens) / len(self.completion_tokens), 1) if self.completion_tokens else None},
+            "confusion_matrix": {label: {column: self.confusion[label][column] for column in PRIORITY_LABELS + [UNPARSED]}
+                                 for label in PRIORITY_LABELS},
+            "misclassified": self.failures,
+        }
+
+
+def load_fixtures(path: str) -> List[dict]:
+    """
+    Labeled tasks, one JSON object per line: {"title", "description", "label"}
+    """
+    fixtures = []
+    with open(path) as fixture_file:
+        for line_number, line in enumerate(fixture_file, start=1):
+            if not line.strip():
+                continue
+            fixture = json.loads(line)
+            if fixture.get("label") not in PRIORITY_LABELS:
+                raise ValueError(f"{path}:{line_number}: label must be one of {PRIORITY_LABELS}, got {fixture.get('label')!r}")
+            fixtures.append(fixture)
+    return fixtures
+
+
+def evaluate(fixtures: List[dict], providers: List[str], cassette: ResponseCassette) -> Dict[str, ProviderReport]:
+    """
+    Runs every fixture through every provider with the production priority prompt
+    """
+    reports = {}
+    for provider in providers:
+        report = reports[provider] = ProviderReport(provider)
+        for fixture in fixtures:
+            prompt = build_prompt(INPUT_TASK_PRIORITY_FINALIZER, PRIORITY_TEMPLATE, fixture["title"], fixture.get("description", ""))
+            try:
+                result = cassette.complete(provider, prompt)
+            except MissingRecording:
+                report.missing += 1
+                continue
+            except Exception as e:
+                logger.error(f"{provider} failed on fixture {fixture['title']!r}: {e}")
+                report.errors += 1
+                continue
+            report.add(fixture, result)
+    return reports
+
+
+def format_report(report: dict) -> str:
+    latency = report["latency_ms"]
+    lines = [
+        f"== {report['provider']} ({report['model']})",
+        f"answered {report['answered']}, errors {report['errors']}, missing recordings {report['missing_recordings']}",
+        f"accuracy {report['accuracy']}, parse failures {report['parse_failure_rate']}",
+        "latency ms  " + "  ".join(f"{name}={value}" for name, value in latency.items()),
+        f"tokens      prompt mean={report['prompt_tokens']['mean']} total={report['prompt_tokens']['total']}  "
+        f"completion mean={report['completion_tokens']['mean']} total={report['completion_tokens']['total']}",
+        "confusion (rows: label, columns: predicted)",
+        f"{'':<10}" + "".join(f"{column:>10}" for column in PRIORITY_LABELS + [UNPARSED]),
+    ]
+    for label, row in report["confusion_matrix"].items():
+        lines.append(f"{label:<10}" + "".join(f"{row[column]:>10}" for column in PRIORITY_LABELS + [UNPARSED]))
+    return "\n".join(lines)
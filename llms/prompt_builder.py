@@ -0,0 +1,148 @@
+import re
+import random
+import threading
+from typing import Dict, Optional
+from log import logger
+from config import PromptConfig
+
+prompt_config = PromptConfig()
+
+PRIORITY_TEMPLATE = "priority"
+TAG_TEMPLATE = "tags"
+SUBTASK_TEMPLATE = "subtasks"
+
+TEMPLATE_BUDGETS = {
+    PRIORITY_TEMPLATE: prompt_config.PRIORITY_PROMPT_BUDGET,
+    TAG_TEMPLATE: prompt_config.TAG_PROMPT_BUDGET,
+    SUBTASK_TEMPLATE: prompt_config.SUBTASK_PROMPT_BUDGET,
+}
+
+# Average characters per token for English text with BPE tokenizers (GPT-4.1, Qwen3)
+CHARS_PER_TOKEN = 4
+
+QUOTED_LINE = re.compile(r"^[ \t]*>.*$", re.MULTILINE)
+QUOTED_BLOCK = re.compile(r"(?:^\[quoted text\]\n?)+", re.MULTILINE)
+HORIZONTAL_SPACE = re.compile(r"[ \t\u00a0]+")
+BLANK_LINES = re.compile(r"\n\s*\n+")
+REPEATED_PUNCTUATION = re.compile(r"([-=_*#~.])\1{3,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate, no tokenizer dependency. Slightly over-counts for plain prose, which keeps budgets safe.
+    """
+    if not text:
+        return 0
+    return max(len(text) // CHARS_PER_TOKEN, len(text.split()))
+
+
+def collapse_text(text: str) -> str:
+    """
+    Removes the bulk that pasted emails and logs carry without losing content: quoted reply lines,
+    runs of spaces, blank lines and separator rules.
+    """
+    text = QUOTED_LINE.sub("[quoted text]", text)
+    text = QUOTED_BLOCK.sub("[quoted text]\n", text)
+    text = REPEATED_PUNCTUATION.sub(r"\1\1\1", text)
+    text = HORIZONTAL_SPACE.sub(" ", text)
+    text = BLANK_LINES.sub("\n", text)
+    return text.strip()
+
+
+def truncate_to_budget(text: str, budget_tokens: int) -> str:
+    """
+    Keeps the head and the tail of text within budget_tokens. The start of a task usually states it
+    and the end usually carries the ask or the latest reply, so the middle is what gets dropped.
+    """
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    head_chars = int(budget_chars * prompt_config.TRUNCATION_HEAD_RATIO)
+    tail_chars = budget_chars - head_chars
+    dropped_tokens = estimate_tokens(text[head_chars:len(text) - tail_chars])
+    head = text[:head_chars].rsplit(" ", 1)[0]
+    tail = text[len(text) - tail_chars:].split(" ", 1)[-1]
+    return f"{head} [... {dropped_tokens} tokens truncated ...] {tail}"
+
+
+def build_prompt(template: str, template_name: str, title: str, description: str) -> str:
+    """
+    Formats one of the {title}/{description} prompt templates from constants.py, collapsing and
+    truncating the task text so that it fits the template's token budget.
+    """
+    budget = TEMPLATE_BUDGETS[template_name]
+    title = collapse_text(title or "")
+    description = collapse_text(description or "")
+
+    # The title is short and the most informative part; it gets at most a quarter of the budget
+    title = truncate_to_budget(title, budget // 4)
+    description = truncate_to_budget(description, max(budget - estimate_tokens(title), 0))
+
+    prompt = template.format(title=title, description=description)
+    logger.info(f"Built {template_name} prompt with ~{estimate_tokens(prompt)} tokens (budget {budget} for task text)")
+    return prompt
+
+
+class TokenUsageRecorder:
+    """
+    Per-template prompt and completion token counts (and call latency where the caller times it), kept as
+    totals plus a fixed-size reservoir sample for percentiles, so the distribution can be watched without
+    unbounded memory.
+    """
+    def __init__(self, sample_size: int = prompt_config.TOKEN_USAGE_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, template_name: str, provider: str, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+               latency_ms: Optional[float] = None):
+        if prompt_tokens is None and completion_tokens is None and latency_ms is None:
+            return
+        key = f"{provider}:{template_name}"
+        with self._lock:
+            stats = self._stats.setdefault(key, {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "samples": []
+            })
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens or 0
+            stats["completion_tokens"] += completion_tokens or 0
+            sample = (prompt_tokens or 0, completion_tokens or 0, latency_ms)
+            if len(stats["samples"]) < self.sample_size:
+                stats["samples"].append(sample)
+            else:
+                slot = random.randrange(stats["calls"])
+                if slot < self.sample_size:
+                    stats["samples"][slot] = sample
+        logger.info(f"LLM usage {key}: prompt_tokens={prompt_tokens}, completion_tokens={completion_tokens}, "
+                    f"latency_ms={latency_ms}")
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Totals and p50/p90/p99 of prompt and completion tokens (and latency, when timed) per provider:template
+        """
+        with self._lock:
+            stats = {key: dict(value, samples=list(value["samples"])) for key, value in self._stats.items()}
+        result = {}
+        for key, value in stats.items():
+            prompt_samples = sorted(sample[0] for sample in value["samples"])
+            completion_samples = sorted(sample[1] for sample in value["samples"])
+            latency_samples = sorted(sample[2] for sample in value["samples"] if sample[2] is not None)
+            result[key] = {
+                "calls": value["calls"],
+                "prompt_tokens_total": value["prompt_tokens"],
+                "completion_tokens_total": value["completion_tokens"],
+                "prompt_tokens": _percentiles(prompt_samples),
+                "completion_tokens": _percentiles(completion_samples),
+                "latency_ms": _percentiles(latency_samples),
+            }
+        return result
+
+
+def _percentiles(sorted_values: list) -> dict:
+    if not sorted_values:
+        return {}
+    last = len(sorted_values) - 1
+    return {f"p{p}": sorted_values[min(last, int(len(sorted_values) * p / 100))] for p in (50, 90, 99)}
+
+
+token_usage = TokenUsageRecorder()
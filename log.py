@@ -23,6 +23,9 @@ def setup_logger():
         Configure the logger
     """
     logger = logging.getLogger(log_config.LOGGER_NAME)
+    if logger.handlers:
+        # already configured, e.g. create_app called again by a CLI tool or a test
+        return
     # the level should be the lowest level set in handlers
     logger.setLevel(logging.INFO)
 
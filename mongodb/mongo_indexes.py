@@ -0,0 +1,113 @@
+from log import logger
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.database import Database
+from constants import (
+    TASK_HANDLER_COLLECTION, TAG_COLLECTION, TASK_TAG_COLLECTION, ARCHIVED_TASK_COLLECTION, ARCHIVED_TASK_TAG_COLLECTION,
+    IDEMPOTENCY_COLLECTION
+)
+
+# Index definitions per collection as (keys, options). create_index is a no-op for an
+# index that already exists with the same definition, so ensure_indexes is safe to rerun.
+INDEXES = {
+    TASK_HANDLER_COLLECTION: [
+        # Every request-path query is scoped to a tenant, so tenant_id leads every compound index
+        # and the shard key ({tenant_id: 1, _id: 1}), keeping each query on one tenant's range / shard.
+        # Task lookups by _id
+        ([("tenant_id", ASCENDING), ("_id", ASCENDING)], {"name": "tenant_id_id"}),
+        # Multikey: one entry per tag, serves ?tag=a,b&tag_mode=all|any with the default ordering
+        ([("tenant_id", ASCENDING), ("tags", ASCENDING), ("created_at", DESCENDING)], {"name": "tenant_tags_created_at"}),
+        # Due-soon window queries and the overdue sweeper (which runs tenant by tenant)
+        ([("tenant_id", ASCENDING), ("completed", ASCENDING), ("deadline", ASCENDING)], {"name": "tenant_completed_deadline"}),
+        # Full-text search over title/description, a title match ranks higher; the equality prefix
+        # requires every $text query to name the tenant
+        ([("tenant_id", ASCENDING), ("title", TEXT), ("description", TEXT)], {
+            "name": "tenant_title_description_text",
+            "weights": {"title": 5, "description": 1},
+            "default_language": "english",
+        }),
+        # Direct sub-tasks of a task, in creation order
+        ([("tenant_id", ASCENDING), ("parent_task_id", ASCENDING), ("created_at", ASCENDING)], {"name": "tenant_parent_task_id_created_at"}),
+        # Multikey on the materialized path: a whole subtree (optionally depth-limited) in one query
+        ([("tenant_id", ASCENDING), ("ancestors", ASCENDING), ("depth", ASCENDING), ("created_at", ASCENDING)], {"name": "tenant_ancestors_depth_created_at"}),
+        # Cross-tenant background jobs: loading the near-duplicate similarity index, most recently written first
+        ([("updated_at", DESCENDING)], {"name": "updated_at"}),
+        # Cross-tenant background jobs: only bulk imported tasks waiting for enrichment are indexed
+        ([("enrichment_status", ASCENDING)], {
+            "name": "enrichment_pending",
+            "partialFilterExpression": {"enrichment_status": "pending"},
+        }),
+        # Cross-tenant background jobs: enrichment claims whose run died, oldest first
+        ([("enrichment_claimed_at", ASCENDING)], {
+            "name": "enrichment_running_claimed_at",
+            "partialFilterExpression": {"enrichment_status": "running"},
+        }),
+        # Cross-tenant background jobs: the archiver's scan for tasks completed the longest ago
+        ([("updated_at", ASCENDING)], {
+            "name": "completed_updated_at",
+            "partialFilterExpression": {"completed": True},
+        }),
+    ],
+    TAG_COLLECTION: [
+        ([("tenant_id", ASCENDING), ("name", ASCENDING)], {"name": "tenant_name"}),
+    ],
+    TASK_TAG_COLLECTION: [
+        ([("tenant_id", ASCENDING), ("task_id", ASCENDING)], {"name": "tenant_task_id"}),
+        ([("tenant_id", ASCENDING), ("tag_id", ASCENDING)], {"name": "tenant_tag_id"}),
+    ],
+    # Archive collections only serve include_archived=true reads: lookups by id, list pages and subtrees
+    ARCHIVED_TASK_COLLECTION: [
+        ([("tenant_id", ASCENDING), ("_id", ASCENDING)], {"name": "tenant_id_id"}),
+        ([("tenant_id", ASCENDING), ("tags", ASCENDING), ("created_at", DESCENDING)], {"name": "tenant_tags_created_at"}),
+        ([("tenant_id", ASCENDING), ("parent_task_id", ASCENDING), ("created_at", ASCENDING)], {"name": "tenant_parent_task_id_created_at"}),
+        ([("tenant_id", ASCENDING), ("ancestors", ASCENDING), ("depth", ASCENDING), ("created_at", ASCENDING)], {"name": "tenant_ancestors_depth_created_at"}),
+    ],
+    ARCHIVED_TASK_TAG_COLLECTION: [
+        ([("tenant_id", ASCENDING), ("task_id", ASCENDING)], {"name": "tenant_task_id"}),
+    ],
+    # Records are looked up by _id (the requestId) only; the TTL monitor deletes them once expires_at passes
+    IDEMPOTENCY_COLLECTION: [
+        ([("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    ],
+}
+
+# Indexes replaced by the tenant-prefixed ones above, dropped by scripts.backfill_tenant once
+# every document carries a tenant_id
+SUPERSEDED_INDEXES = {
+    TASK_HANDLER_COLLECTION: [
+        "tags_created_at", "completed_deadline", "title_description_text",
+        "parent_task_id_created_at", "ancestors_depth_created_at",
+    ],
+    TAG_COLLECTION: ["name"],
+    TASK_TAG_COLLECTION: ["task_id", "tag_id"],
+}
+
+
+def ensure_indexes(database: Database) -> None:
+    """
+        Creates every index the service's queries rely on
+        Args:
+            database (Database): Database holding the task collections
+    """
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                database[collection_name].create_index(keys, **options)
+            except Exception as e:
+                logger.error(f"Failed to create index {options.get('name')} on {collection_name}: {e}")
+
+
+def drop_superseded_indexes(database: Database) -> None:
+    """
+        Drops the indexes listed in SUPERSEDED_INDEXES that still exist
+        Args:
+            database (Database): Database holding the task collections
+    """
+    for collection_name, index_names in SUPERSEDED_INDEXES.items():
+        existing = set(database[collection_name].index_information())
+        for index_name in index_names:
+            if index_name in existing:
+                try:
+                    database[collection_name].drop_index(index_name)
+                    logger.info(f"Dropped superseded index {index_name} on {collection_name}")
+                except Exception as e:
+                    logger.error(f"Failed to drop index {index_name} on {collection_name}: {e}")
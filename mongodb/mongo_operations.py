@@ -1,7 +1,9 @@
 from log import logger
 from pymongo.collection import Collection
+from pymongo.errors import ExecutionTimeout
 from .mongo_template import MongoTemplate
-from typing import List, Dict, Any, Optional
+from .tenant_scope import tenant_filter
+from typing import List, Dict, Any, Optional, Tuple
 
 def addnewTask(collection: Collection, request_body) -> bool:
     """
@@ -28,7 +30,45 @@ def addnewTask(collection: Collection, request_body) -> bool:
         return False
 
 
-def getTasks(collection: Collection, filters: Optional[Dict[str, Any]] = None, ordering: Optional[str] = None, task_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+def build_task_query(filters: Optional[Dict[str, Any]] = None, task_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+        Builds the mongo filter document shared by the task list queries, scoped to the current tenant
+    """
+    query = tenant_filter()
+    if filters:
+        if filters.get('priority'):
+            query['priority'] = filters['priority']
+        if filters.get('status'):
+            query['status'] = filters['status']
+        if filters.get('completed') is not None:
+            query['completed'] = filters['completed']
+        # Tags are denormalized onto the task document and covered by a multikey index
+        if filters.get('tags'):
+            tags = filters['tags']
+            if len(tags) == 1:
+                query['tags'] = tags[0]
+            elif filters.get('tag_mode') == 'all':
+                query['tags'] = {'$all': tags}
+            else:
+                query['tags'] = {'$in': tags}
+
+    # Add task_ids filter if provided
+    if task_ids:
+        query['_id'] = {'$in': task_ids}
+
+    return query
+
+
+def archive_union(query: Dict[str, Any], archive_collection: Optional[str]) -> List[Dict[str, Any]]:
+    """
+        Pipeline stages appending the archived tasks matching the same query, when an archive collection is given
+    """
+    if not archive_collection:
+        return []
+    return [{"$unionWith": {"coll": archive_collection, "pipeline": [{"$match": query}]}}]
+
+
+def getTasks(collection: Collection, filters: Optional[Dict[str, Any]] = None, ordering: Optional[str] = None, task_ids: Optional[List[str]] = None, archive_collection: Optional[str] = None) -> List[Dict[str, Any]]:
     """
         It helps to retrieve tasks from the database collection with optional filtering and ordering
         Args:
@@ -36,25 +76,14 @@ def getTasks(collection: Collection, filters: Optional[Dict[str, Any]] = None, o
             filters (dict): Optional filters to apply
             ordering (str): Optional ordering parameter (e.g., "-priority", "created_at")
             task_ids (list): Optional list of specific task IDs to filter by
+            archive_collection (str): Optional archive collection whose matching tasks are merged in, in the same order
         Response:
             List[Dict]: List of task documents
     """
     try:
         logger.info(f"Retrieving tasks from collection with filters: {filters}, ordering: {ordering}, task_ids: {task_ids}")
         
-        # Build query
-        query = {}
-        if filters:
-            if filters.get('priority'):
-                query['priority'] = filters['priority']
-            if filters.get('status'):
-                query['status'] = filters['status']
-            if filters.get('completed') is not None:
-                query['completed'] = filters['completed']
-        
-        # Add task_ids filter if provided
-        if task_ids:
-            query['_id'] = {'$in': task_ids}
+        query = build_task_query(filters, task_ids)
         
         # Build sort
         sort = []
@@ -69,12 +98,83 @@ def getTasks(collection: Collection, filters: Optional[Dict[str, Any]] = None, o
             sort = [('created_at', -1)]
         
         # Execute query
-        cursor = collection.find(query).sort(sort)
-        tasks = list(cursor)
+        if archive_collection:
+            # One round trip, the server merges both collections and sorts the union
+            cursor = collection.aggregate(
+                [{"$match": query}, *archive_union(query, archive_collection), {"$sort": dict(sort)}],
+                allowDiskUse=True
+            )
+            # A task caught mid-move by the archiver is briefly in both collections, with the same content
+            seen = set()
+            tasks = [task for task in cursor if not (task['_id'] in seen or seen.add(task['_id']))]
+        else:
+            tasks = list(collection.find(query).sort(sort))
         
         logger.info(f"Retrieved {len(tasks)} tasks from collection")
         return tasks
         
+    except ExecutionTimeout:
+        # Exceeded the profile's maxTimeMS: fail the request rather than serve (and cache) an empty list
+        logger.error(f"Task list query exceeded its time limit, filters: {filters}, ordering: {ordering}")
+        raise
     except Exception as e:
         logger.error(f"Got an unexpected error while retrieving tasks: {e}")
         return []
+
+
+def getTasksVersion(collection: Collection, filters: Optional[Dict[str, Any]] = None, task_ids: Optional[List[str]] = None, archive_collection: Optional[str] = None) -> Dict[str, Any]:
+    """
+        It summarises the tasks matched by a list query without fetching them, used to answer conditional GETs
+        Args:
+            collection (Collection): Collection from which data needs to be summarised
+            filters (dict): Optional filters to apply
+            task_ids (list): Optional list of specific task IDs to filter by
+            archive_collection (str): Optional archive collection whose matching tasks are summarised too
+        Response:
+            Dict: count, max_updated_at and version_sum of the matching tasks
+    """
+    query = build_task_query(filters, task_ids)
+    pipeline = [
+        {"$match": query},
+        *archive_union(query, archive_collection),
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "max_updated_at": {"$max": "$updated_at"},
+            "version_sum": {"$sum": {"$ifNull": ["$version", 0]}},
+        }},
+    ]
+    summary = next(collection.aggregate(pipeline), None)
+    if not summary:
+        return {"count": 0, "max_updated_at": None, "version_sum": 0}
+    summary.pop("_id", None)
+    return summary
+
+
+def searchTasks(collection: Collection, search_text: str, filters: Optional[Dict[str, Any]] = None, page: int = 1, per_page: int = 10) -> Tuple[List[Dict[str, Any]], int]:
+    """
+        It runs a full-text search over task title and description using the text index, ranked by relevance
+        Args:
+            collection (Collection): Collection to search
+            search_text (str): Words or "quoted phrases" to search for
+            filters (dict): Optional priority/status/completed/tag filters, same as getTasks
+            page (int): 1-based page number
+            per_page (int): Page size
+        Response:
+            Tuple[List[Dict], int]: The requested page of tasks (with a "score" field) and the total match count
+    """
+    query = build_task_query(filters)
+    query['$text'] = {'$search': search_text}
+    projection = {'score': {'$meta': 'textScore'}}
+
+    logger.info(f"Searching tasks for '{search_text}' with filters: {filters}, page: {page}, per_page: {per_page}")
+
+    cursor = (
+        collection.find(query, projection)
+        .sort([('score', {'$meta': 'textScore'})])
+        .skip((page - 1) * per_page)
+        .limit(per_page)
+    )
+    tasks = list(cursor)
+    total_count = collection.count_documents(query)
+    return tasks, total_count
@@ -1,28 +1,184 @@
+import threading
 from constants import *
 from log import logger
-from typing import Any
-from pymongo import MongoClient
+from typing import Any, Optional
+from pymongo import MongoClient, WriteConcern
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 from dataclasses import dataclass
 from pymongo.database import Database
 from pymongo.collection import Collection
 from pymongo.errors import ConnectionFailure
+from config import MongoProfileConfig, WarmupConfig
 from constants import MONGO_CONNECT_URL, MONGO_DB_NAME
+from mongodb.query_monitor import query_monitor, query_monitor_config
+
+mongo_profile_config = MongoProfileConfig()
+warmup_config = WarmupConfig()
+
+
+READ_PREFERENCES = {
+    "primary": Primary(),
+    "primaryPreferred": PrimaryPreferred(),
+    "secondary": Secondary(),
+    "secondaryPreferred": SecondaryPreferred(),
+    "nearest": Nearest(),
+}
+
+
+def read_preference(name: str):
+    if name not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference {name!r}, expected one of {sorted(READ_PREFERENCES)}")
+    return READ_PREFERENCES[name]
+
+
+@dataclass(frozen=True)
+class OperationProfile:
+    """
+        How a class of operations runs: where reads go, how long the server may work on one
+        (maxTimeMS, None for no limit) and how writes are acknowledged
+    """
+    name: str
+    read_preference: Any
+    max_time_ms: Optional[int]
+    write_concern: WriteConcern
+
+
+# Request-path reads that must see the latest writes (detail views, lookups before a write) and the
+# small writes that go with them
+INTERACTIVE_READ = OperationProfile(
+    "interactive_read", Primary(), mongo_profile_config.MONGO_INTERACTIVE_MAX_TIME_MS or None, WriteConcern()
+)
+# Search and due-soon pages, served from a secondary when there is one. Their responses are neither
+# cached nor ETagged, so a lagging secondary only delays a new task until the next request
+LIST_READ = OperationProfile(
+    "list_read", read_preference(mongo_profile_config.MONGO_LIST_READ_PREFERENCE),
+    mongo_profile_config.MONGO_LIST_MAX_TIME_MS or None, WriteConcern()
+)
+# Task list pages: always the primary, with the list time limit. What they read fills the list cache under
+# the current generation and derives the list ETag, and a lagging secondary would pin a stale list there
+# (missing the task a client just created) until the next write
+CACHED_LIST_READ = OperationProfile(
+    "cached_list_read", Primary(), mongo_profile_config.MONGO_LIST_MAX_TIME_MS or None, WriteConcern()
+)
+# Background scans (similarity index load, archiver candidates), kept off the primary
+BULK_READ = OperationProfile(
+    "bulk_read", read_preference(mongo_profile_config.MONGO_BULK_READ_PREFERENCE),
+    mongo_profile_config.MONGO_BULK_MAX_TIME_MS or None, WriteConcern()
+)
+# User-visible writes (create, update, delete, complete) and the reads they depend on: acknowledged
+# by a majority, so a failover cannot roll back a write the client was told succeeded
+CRITICAL_WRITE = OperationProfile(
+    "critical_write", Primary(), mongo_profile_config.MONGO_INTERACTIVE_MAX_TIME_MS or None,
+    WriteConcern(w="majority", wtimeout=mongo_profile_config.MONGO_CRITICAL_WTIMEOUT_MS)
+)
+# Imports, migrations and sweeps: idempotent or re-runnable, so acknowledged by the primary alone
+BULK_WRITE = OperationProfile(
+    "bulk_write", Primary(), mongo_profile_config.MONGO_BULK_MAX_TIME_MS or None, WriteConcern(w=1)
+)
+OPERATION_PROFILES = (INTERACTIVE_READ, LIST_READ, CACHED_LIST_READ, BULK_READ, CRITICAL_WRITE, BULK_WRITE)
+
+
+class ProfiledCollection:
+    """
+        A collection bound to an OperationProfile. Read preference and write concern are applied through
+        with_options; maxTimeMS is added to every read and find-and-modify, which the driver does not
+        take as a collection option. Anything else is delegated to the underlying pymongo Collection.
+    """
+    def __init__(self, collection: Collection, profile: OperationProfile):
+        self.profile = profile
+        self.collection = collection.with_options(
+            read_preference=profile.read_preference, write_concern=profile.write_concern
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.collection, name)
+
+    def _with_max_time(self, kwargs: dict, key: str = "maxTimeMS") -> dict:
+        if self.profile.max_time_ms and "maxTimeMS" not in kwargs and "max_time_ms" not in kwargs:
+            kwargs[key] = self.profile.max_time_ms
+        return kwargs
+
+    def find(self, *args, **kwargs):
+        return self.collection.find(*args, **self._with_max_time(kwargs, "max_time_ms"))
+
+    def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **self._with_max_time(kwargs, "max_time_ms"))
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        return self.collection.aggregate(pipeline, *args, **self._with_max_time(kwargs))
+
+    def count_documents(self, *args, **kwargs):
+        return self.collection.count_documents(*args, **self._with_max_time(kwargs))
+
+    def distinct(self, *args, **kwargs):
+        return self.collection.distinct(*args, **self._with_max_time(kwargs))
+
+    def find_one_and_update(self, *args, **kwargs):
+        return self.collection.find_one_and_update(*args, **self._with_max_time(kwargs))
+
+    def find_one_and_delete(self, *args, **kwargs):
+        return self.collection.find_one_and_delete(*args, **self._with_max_time(kwargs))
+
+    def find_one_and_replace(self, *args, **kwargs):
+        return self.collection.find_one_and_replace(*args, **self._with_max_time(kwargs))
 
 
 @dataclass
 class MongoTemplate:
+    # One client per process, created on first use. Nothing touches the network at import time,
+    # and a client is never inherited across a gunicorn fork (see reset_mongo_client).
+    _mongo_client = None
+    _mongo_client_lock = threading.Lock()
+
     @staticmethod
     def create_moongo_client() -> MongoClient:
         try:
-            return MongoClient(MONGO_CONNECT_URL)
+            # connect=False defers server selection and the TLS handshake to the first operation
+            event_listeners = [query_monitor] if query_monitor_config.QUERY_MONITOR_ENABLED else []
+            return MongoClient(
+                MONGO_CONNECT_URL,
+                connect=False,
+                event_listeners=event_listeners,
+                retryReads=mongo_profile_config.MONGO_RETRY_READS,
+                retryWrites=mongo_profile_config.MONGO_RETRY_WRITES,
+                minPoolSize=warmup_config.MONGO_MIN_POOL_SIZE,
+            )
         except ConnectionFailure:
             logger.error("ERROR! Connecting to Mongo DB Failed !!")    
 
+    @classmethod
+    def get_mongo_client(cls) -> MongoClient:
+        """
+            Returns the process-wide client, creating it on first use
+        """
+        if cls._mongo_client is None:
+            with cls._mongo_client_lock:
+                if cls._mongo_client is None:
+                    cls._mongo_client = cls.create_moongo_client()
+        return cls._mongo_client
+
+    @classmethod
+    def get_collection(cls, collection_name: str, profile: OperationProfile = INTERACTIVE_READ,
+                       database_name: str = MONGO_DB_NAME) -> ProfiledCollection:
+        """
+            The collection with the read preference, time limit and write concern of the operation profile
+        """
+        return ProfiledCollection(cls.get_mongo_client()[database_name][collection_name], profile)
+
+    @classmethod
+    def reset_mongo_client(cls) -> None:
+        """
+            Forgets the current client without closing it, for use in a post-fork hook: the child must
+            not reuse sockets or monitor threads inherited from the parent.
+        """
+        cls._mongo_client = None
+        cls._mongo_client_lock = threading.Lock()
+
     @staticmethod
     def close_mongo_client(client: MongoClient):
         try:
             client.close()
-            logger.log("Closed the mongo_client")
+            logger.info("Closed the mongo_client")
         except Exception as e:
             logger.error(f"Got an exception while closing mongo_client {e}")
         return
@@ -51,6 +207,3 @@ class MongoTemplate:
             It will log the task into the specified collection
         """
         return collection.insert_one(query).inserted_id
-
-mongo_client = MongoTemplate.create_moongo_client()
-mongo_db = MongoTemplate.check_db_existence(mongo_client, MONGO_DB_NAME)
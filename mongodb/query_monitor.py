@@ -0,0 +1,192 @@
+import json
+import hashlib
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import Counter
+from typing import Dict, Iterator, Optional
+from pymongo import monitoring
+from log import logger
+from config import QueryMonitorConfig
+
+query_monitor_config = QueryMonitorConfig()
+
+# Handshake, auth and session housekeeping are not the application's queries
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "saslStart", "saslContinue",
+    "authenticate", "endSessions", "killCursors",
+}
+# Arguments that make up the shape of a command. Payloads (inserted documents, update documents) are left out,
+# so fingerprinting a command never serializes them.
+SHAPE_ARGUMENTS = ("collection", "filter", "query", "pipeline", "key", "sort", "projection", "skip", "limit")
+# Statements of an update/delete command whose filter ("q") is part of its shape
+SHAPE_STATEMENTS = 10
+# Longer fingerprints are kept as a prefix plus a digest of the whole, bounding memory and log lines
+FINGERPRINT_MAX_CHARS = 512
+# Upper bounds of the per-endpoint query count histogram buckets, the last bucket is open
+QUERY_COUNT_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+
+
+class RequestQueryStats:
+    """
+    Commands issued on behalf of one request (or one tracked block): count, duration and collection of
+    each, and how often each identical command was repeated.
+    """
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.duration_ms = 0.0
+        self.by_collection = Counter()
+        self.fingerprints = Counter()
+        self._pending: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, request_id: int, collection: Optional[str], fingerprint: str):
+        with self._lock:
+            self.count += 1
+            self.by_collection[collection or "<admin>"] += 1
+            self.fingerprints[fingerprint] += 1
+            self._pending[request_id] = fingerprint
+
+    def finished(self, request_id: int, duration_micros: int):
+        with self._lock:
+            if self._pending.pop(request_id, None) is not None:
+                self.duration_ms += duration_micros / 1000
+
+    def duplicates(self) -> Dict[str, int]:
+        return {fingerprint: count for fingerprint, count in self.fingerprints.items() if count > 1}
+
+
+current_query_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+class QueryMonitor(monitoring.CommandListener):
+    """
+    pymongo command listener, registered on the process-wide client. pymongo calls it in the thread
+    that runs the command, so the request's RequestQueryStats is found through a context variable.
+    Commands from background threads (change stream, similarity index) are not attributed.
+    """
+    def __init__(self):
+        self._histograms: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        stats = current_query_stats.get()
+        if stats is None or event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        stats.started(event.request_id, collection if isinstance(collection, str) else None,
+                      self.fingerprint(event.command_name, event.command))
+
+    @staticmethod
+    def fingerprint(command_name: str, command) -> str:
+        """
+        Command name, target (collection or cursor id) and filter/pipeline arguments. Two inserts into the same
+        collection share a fingerprint, which is how a per-document insert loop shows up as a duplicate.
+        """
+        shape = {"command": command_name, "target": command.get(command_name)}
+        shape.update((key, command[key]) for key in SHAPE_ARGUMENTS if key in command)
+        for statements in ("updates", "deletes"):
+            if statements in command:
+                shape[statements] = [statement.get("q") for statement in command[statements][:SHAPE_STATEMENTS]]
+        fingerprint = json.dumps(shape, sort_keys=True, default=str)
+        if len(fingerprint) > FINGERPRINT_MAX_CHARS:
+            digest = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:16]
+            fingerprint = f"{fingerprint[:FINGERPRINT_MAX_CHARS]}... #{digest}"
+        return fingerprint
+
+    def succeeded(self, event):
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.finished(event.request_id, event.duration_micros)
+
+    def failed(self, event):
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.finished(event.request_id, event.duration_micros)
+
+    @contextmanager
+    def track(self, label: str) -> Iterator[RequestQueryStats]:
+        """
+        Attributes the commands issued inside the block to a fresh RequestQueryStats, e.g. to assert
+        a query budget in a test or script: `with query_monitor.track("list") as stats: ...`
+        """
+        stats = RequestQueryStats(label)
+        token = current_query_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            current_query_stats.reset(token)
+
+    def report(self, stats: RequestQueryStats):
+        """
+        Logs budget and duplicate warnings for a finished request and adds it to its endpoint's histogram
+        """
+        if stats.count > query_monitor_config.QUERY_BUDGET:
+            logger.warning(
+                f"{stats.label} issued {stats.count} Mongo commands (budget {query_monitor_config.QUERY_BUDGET}) "
+                f"in {stats.duration_ms:.1f} ms: {dict(stats.by_collection)}"
+            )
+        if query_monitor_config.QUERY_WARN_ON_DUPLICATES:
+            for fingerprint, count in stats.duplicates().items():
+                logger.warning(f"{stats.label} repeated an identical Mongo command {count} times: {fingerprint[:300]}")
+
+        with self._lock:
+            histogram = self._histograms.setdefault(stats.label, {
+                "requests": 0, "queries": 0, "duration_ms": 0.0, "buckets": [0] * (len(QUERY_COUNT_BUCKETS) + 1)
+            })
+            histogram["requests"] += 1
+            histogram["queries"] += stats.count
+            histogram["duration_ms"] += stats.duration_ms
+            histogram["buckets"][bisect_left(QUERY_COUNT_BUCKETS, stats.count)] += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Per endpoint: requests, mean queries and query time per request, and the query count histogram
+        as {"<=N": requests} buckets
+        """
+        with self._lock:
+            histograms = {label: dict(value, buckets=list(value["buckets"])) for label, value in self._histograms.items()}
+        labels = [f"<={bound}" for bound in QUERY_COUNT_BUCKETS] + [f">{QUERY_COUNT_BUCKETS[-1]}"]
+        return {
+            label: {
+                "requests": value["requests"],
+                "mean_queries": round(value["queries"] / value["requests"], 2),
+                "mean_query_ms": round(value["duration_ms"] / value["requests"], 2),
+                "query_count_histogram": dict(zip(labels, value["buckets"])),
+            }
+            for label, value in histograms.items()
+        }
+
+    def init_app(self, application):
+        """
+        Opens a RequestQueryStats per request, labelled "<METHOD> <endpoint>", and reports it at teardown
+        """
+        if not query_monitor_config.QUERY_MONITOR_ENABLED:
+            return
+        from flask import g, request
+
+        def start_tracking():
+            g.query_stats_token = current_query_stats.set(RequestQueryStats(f"{request.method} {request.endpoint}"))
+
+        def add_query_count_header(response):
+            stats = current_query_stats.get()
+            if stats is not None:
+                response.headers["X-Query-Count"] = str(stats.count)
+            return response
+
+        def finish_tracking(exception=None):
+            stats = current_query_stats.get()
+            token = g.pop("query_stats_token", None)
+            if token is not None:
+                current_query_stats.reset(token)
+            if stats is not None:
+                self.report(stats)
+
+        application.before_request(start_tracking)
+        application.after_request(add_query_count_header)
+        application.teardown_request(finish_tracking)
+
+
+query_monitor = QueryMonitor()
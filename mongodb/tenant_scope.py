@@ -0,0 +1,72 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from log import logger
+from config import TenantConfig
+
+tenant_config = TenantConfig()
+
+TENANT_FIELD = "tenant_id"
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+current_tenant: ContextVar[Optional[str]] = ContextVar("current_tenant", default=None)
+
+
+def get_tenant_id() -> str:
+    """
+        Tenant of the current request (or tenant_context block), DEFAULT_TENANT_ID outside of one
+    """
+    return current_tenant.get() or tenant_config.DEFAULT_TENANT_ID
+
+
+def tenant_filter(query: Optional[Dict[str, Any]] = None, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+        Scopes a query to a tenant. tenant_id leads every compound index and is the first field of the
+        shard key, so the scoped query is answered by one tenant's index range (or routed to one shard).
+    """
+    return {TENANT_FIELD: tenant_id or get_tenant_id(), **(query or {})}
+
+
+@contextmanager
+def tenant_context(tenant_id: str) -> Iterator[str]:
+    """
+        Runs the block on behalf of a tenant, for work outside a request (worker threads, CLI tools)
+    """
+    token = current_tenant.set(tenant_id)
+    try:
+        yield tenant_id
+    finally:
+        current_tenant.reset(token)
+
+
+def init_app(application):
+    """
+        Sets the tenant of every request from the TENANT_HEADER header
+    """
+    from flask import g, request, make_response, jsonify
+    from config_mapping.mapping import ErrorResponse
+
+    def set_request_tenant():
+        if request.endpoint in ("root", "doc", "specs") or (request.endpoint or "").startswith(("restx_doc", "health_")):
+            # Swagger UI, the API spec and the health probes are not tenant data
+            return
+        tenant_id = request.headers.get(tenant_config.TENANT_HEADER)
+        if not tenant_id and not tenant_config.TENANT_REQUIRED:
+            tenant_id = tenant_config.DEFAULT_TENANT_ID
+        if not tenant_id or not TENANT_ID_PATTERN.match(tenant_id):
+            logger.error(f"Rejected request with missing or invalid {tenant_config.TENANT_HEADER}: {tenant_id!r}")
+            error_response = ErrorResponse(
+                errorCode=400,
+                errorResponse=f"A valid {tenant_config.TENANT_HEADER} header is required (letters, digits, '_', '-', '.')"
+            )
+            return make_response(jsonify(error_response.to_dict()), 400)
+        g.tenant_token = current_tenant.set(tenant_id)
+
+    def reset_request_tenant(exception=None):
+        token = g.pop("tenant_token", None)
+        if token is not None:
+            current_tenant.reset(token)
+
+    application.before_request(set_request_tenant)
+    application.teardown_request(reset_request_tenant)
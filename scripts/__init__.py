@@ -0,0 +1 @@
+# Maintenance scripts package 
\ No newline at end of file
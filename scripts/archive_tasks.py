@@ -0,0 +1,44 @@
+"""
+    Background archiver moving tasks completed (and untouched) for more than ARCHIVE_AFTER_DAYS, with
+    their sub-tasks and task_tags rows, into the archive collections, in batches.
+
+    Run a single instance per deployment, e.g. as a nightly job or a sidecar process:
+        python -m scripts.archive_tasks --once
+        python -m scripts.archive_tasks --interval 3600 --older-than-days 90 --batch-size 500
+"""
+import time
+import argparse
+from log import logger, setup_logger
+from constants import MONGO_DB_NAME
+from mongodb.mongo_indexes import ensure_indexes
+from mongodb.mongo_template import MongoTemplate
+from services.archive_service import TaskArchiveService, archive_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive completed tasks periodically")
+    parser.add_argument("--interval", type=int, default=3600, help="Seconds between runs")
+    parser.add_argument("--once", action="store_true", help="Run once and exit")
+    parser.add_argument("--older-than-days", type=int, default=archive_config.ARCHIVE_AFTER_DAYS,
+                        help="Archive tasks completed and untouched for longer than this")
+    parser.add_argument("--batch-size", type=int, default=archive_config.ARCHIVE_BATCH_SIZE, help="Top-level tasks per batch")
+    parser.add_argument("--max-batches", type=int, help="Stop each run after this many batches")
+    args = parser.parse_args()
+
+    setup_logger()
+    # The archiver's scan and the archive reads rely on these indexes
+    ensure_indexes(MongoTemplate.get_mongo_client()[MONGO_DB_NAME])
+    archive_service = TaskArchiveService()
+    while True:
+        started = time.monotonic()
+        try:
+            archive_service.archive_completed_tasks(args.older_than_days, args.batch_size, args.max_batches)
+        except Exception as e:
+            logger.error(f"Task archiving failed: {e}")
+        if args.once:
+            break
+        time.sleep(max(0, args.interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+    One-off migration setting the materialized path (ancestors, depth) on tasks written before sub-tasks
+    could nest, and creating the ancestors index used for subtree reads and progress roll-up.
+
+    Usage: python -m scripts.backfill_task_ancestors
+"""
+from log import logger, setup_logger
+from constants import MONGO_DB_NAME
+from mongodb.mongo_indexes import ensure_indexes
+from mongodb.mongo_template import MongoTemplate
+from services.subtask_service import SubTaskService
+
+
+def main():
+    setup_logger()
+    updated = SubTaskService().backfill_ancestors()
+    ensure_indexes(MongoTemplate.get_mongo_client()[MONGO_DB_NAME])
+    logger.info(f"Ancestors backfill finished, {updated} tasks updated")
+
+
+if __name__ == "__main__":
+    main()
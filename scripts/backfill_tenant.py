@@ -0,0 +1,41 @@
+"""
+    One-off migration assigning the default tenant to tasks, tags and task-tag rows written before
+    tenant scoping, then replacing the old indexes with the tenant-prefixed ones. The text index is
+    swapped last: MongoDB allows one text index per collection, so the tenant-prefixed one can only
+    be built once the old one is dropped.
+
+    Usage: python -m scripts.backfill_tenant [--tenant acme]
+"""
+import argparse
+from log import logger, setup_logger
+from constants import MONGO_DB_NAME, TASK_HANDLER_COLLECTION, TAG_COLLECTION, TASK_TAG_COLLECTION
+from mongodb.mongo_indexes import ensure_indexes, drop_superseded_indexes
+from mongodb.mongo_template import MongoTemplate
+from mongodb.tenant_scope import tenant_config, TENANT_FIELD
+from services.cache_service import task_list_cache, TASK_GENERATION, TAG_GENERATION
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign a tenant to documents written before tenant scoping")
+    parser.add_argument("--tenant", default=tenant_config.DEFAULT_TENANT_ID, help="Tenant the existing documents belong to")
+    args = parser.parse_args()
+
+    setup_logger()
+    database = MongoTemplate.get_mongo_client()[MONGO_DB_NAME]
+    for collection_name in (TASK_HANDLER_COLLECTION, TAG_COLLECTION, TASK_TAG_COLLECTION):
+        result = database[collection_name].update_many(
+            {TENANT_FIELD: {"$exists": False}},
+            {"$set": {TENANT_FIELD: args.tenant}}
+        )
+        logger.info(f"Assigned tenant {args.tenant} to {result.modified_count} documents in {collection_name}")
+
+    # Build the new indexes before dropping the old ones so queries keep an index throughout
+    ensure_indexes(database)
+    drop_superseded_indexes(database)
+    ensure_indexes(database)
+    task_list_cache.invalidate(TASK_GENERATION, TAG_GENERATION)
+    logger.info("Tenant backfill finished")
+
+
+if __name__ == "__main__":
+    main()
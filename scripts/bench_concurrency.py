@@ -0,0 +1,85 @@
+"""
+    Load generator that measures how many requests a running server keeps in flight at once.
+
+    Start the server in the mode under test, e.g.
+        gunicorn -c gunicorn.conf.py --workers 1 --worker-class sync app:application
+        GUNICORN_WORKERS=1 gunicorn -c gunicorn.conf.py app:application
+        GUNICORN_WORKERS=1 GUNICORN_WORKER_CLASS=gevent gunicorn -c gunicorn.conf.py app:application
+    then run
+        python -m scripts.bench_concurrency --concurrency 200 --requests 1000
+
+    The default target is the LLM-bound task creation endpoint. Client-side concurrency is computed with
+    Little's law (sum of request latencies / wall time) and includes requests waiting in the server's
+    listen backlog. The requests the server actually works on at once is throughput times the service
+    time, estimated by the fastest request (which did not queue); divide it by the worker count to get
+    the in-flight requests per worker.
+"""
+import json
+import time
+import uuid
+import argparse
+import statistics
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+
+def send(url: str, method: str, body_template: str):
+    data = None
+    headers = {}
+    if body_template:
+        data = body_template.replace("{uuid}", str(uuid.uuid4())).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    request = urllib.request.Request(url, data=data, method=method, headers=headers)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = None
+    return time.perf_counter() - started, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure in-flight requests a server sustains")
+    parser.add_argument("--base-url", default="http://localhost:5001")
+    parser.add_argument("--path", default="/resollect/tasks/task")
+    parser.add_argument("--method", default="POST")
+    parser.add_argument("--body", default=json.dumps({
+        "title": "Renew car insurance",
+        "inputStr": "Policy expires at the end of the month",
+        "deadline": "2030-01-31T00:00:00",
+        "requestId": "{uuid}",
+    }), help="Request body, {uuid} is replaced per request. Empty for none.")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes, for the per-worker figure")
+    args = parser.parse_args()
+
+    url = args.base_url.rstrip("/") + args.path
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda _: send(url, args.method, args.body), range(args.requests)))
+    wall_time = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    client_concurrency = sum(latencies) / wall_time
+    server_concurrency = args.requests / wall_time * latencies[0]
+
+    print(f"requests={args.requests} client_concurrency={args.concurrency} wall={wall_time:.1f}s")
+    print(f"throughput={args.requests / wall_time:.1f} req/s statuses={statuses}")
+    print(f"latency p50={statistics.median(latencies) * 1000:.0f} ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms")
+    print(f"client in-flight={client_concurrency:.1f} (includes queued requests)")
+    print(f"server in-flight={server_concurrency:.1f} total, {server_concurrency / args.workers:.1f} per worker "
+          f"(throughput x fastest latency {latencies[0] * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+    Benchmark of task list response encodings: bytes on the wire and encode CPU of the current jsonify
+    output against MessagePack, each uncompressed and with every content coding this process can produce
+    (gzip always, brotli/zstd when their packages are installed).
+
+    Synthetic tasks shaped like GET /resollect/tasks/task items, no database needed.
+
+    Usage: python -m scripts.bench_response_formats [--tasks 5000] [--repeat 20]
+"""
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from flask import Flask, jsonify
+from services.compression_service import available_encoders
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+TITLES = ["Renew car insurance", "Prepare quarterly report", "Book team offsite", "Pay tax filing",
+          "Schedule dentist appointment", "Review server migration plan", "Plan birthday gift"]
+TAGS = ["work", "personal", "finance", "health", "learning", "urgent", "shopping"]
+
+
+def synthetic_tasks(total: int) -> dict:
+    now = datetime.now()
+    tasks = []
+    for i in range(total):
+        title = random.choice(TITLES)
+        tasks.append({
+            "_id": f"{random.getrandbits(128):032x}",
+            "tenant_id": "default",
+            "title": title,
+            "description": f"{title} before the deadline, as discussed with the team",
+            "deadline": (now + timedelta(days=random.randint(0, 90))).isoformat(),
+            "priority": random.choice(["Low", "Medium", "High", "Critical"]),
+            "status": random.choice(["Pending", "In Progress", "Completed"]),
+            "completed": False,
+            "overdue": False,
+            "is_subtask": False,
+            "parent_task_id": None,
+            "ancestors": [],
+            "depth": 0,
+            "progress": 0,
+            "tags": random.sample(TAGS, 2),
+            "created_at": (now - timedelta(minutes=i)).isoformat(),
+            "updated_at": (now - timedelta(minutes=i)).isoformat(),
+            "version": random.randint(1, 5),
+        })
+    return {"tasks": tasks, "total_count": total, "page": 1, "per_page": total}
+
+
+def timed(function, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark task list response encodings")
+    parser.add_argument("--tasks", type=int, default=5000, help="Tasks in the synthetic list response")
+    parser.add_argument("--repeat", type=int, default=20, help="Encodes per measurement (median reported)")
+    args = parser.parse_args()
+
+    payload = synthetic_tasks(args.tasks)
+    application = Flask(__name__)
+    formats = {"json (jsonify)": lambda: jsonify(payload).get_data()}
+    if msgpack is not None:
+        formats["msgpack"] = lambda: msgpack.packb(payload, use_bin_type=True, default=str)
+    else:
+        print("msgpack is not installed, only JSON is measured")
+
+    baseline = None
+    print(f"{'representation':<16} {'coding':<9} {'bytes':>11} {'vs jsonify':>10} {'encode ms':>10} {'total ms':>9}")
+    with application.app_context():
+        for label, encode in formats.items():
+            body, encode_ms = timed(encode, args.repeat)
+            baseline = baseline or len(body)
+            print(f"{label:<16} {'identity':<9} {len(body):>11,} {len(body) / baseline:>10.1%} {encode_ms:>10.1f} {encode_ms:>9.1f}")
+            for coding, compress in available_encoders().items():
+                compressed, compress_ms = timed(lambda: compress(body), args.repeat)
+                print(f"{label:<16} {coding:<9} {len(compressed):>11,} {len(compressed) / baseline:>10.1%} "
+                      f"{compress_ms:>10.1f} {encode_ms + compress_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+    Benchmark of GET /resollect/tasks/search (text index) against the client-side scan it replaces
+    (fetch the whole task list, then filter title/description in Python).
+
+    Seeds a scratch collection with synthetic tasks, so it never touches task_handler.
+
+    Usage: python -m scripts.bench_task_search [--tasks 100000] [--repeat 20] [--keep]
+"""
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from log import setup_logger
+from constants import TASK_HANDLER_COLLECTION
+from mongodb.mongo_template import MongoTemplate, LIST_READ, BULK_READ, BULK_WRITE
+from mongodb.mongo_operations import getTasks, searchTasks
+from mongodb.mongo_indexes import INDEXES
+from mongodb.tenant_scope import get_tenant_id, TENANT_FIELD
+
+BENCH_COLLECTION = "task_handler_search_bench"
+
+SUBJECTS = ["car insurance", "quarterly report", "team offsite", "dentist appointment", "tax filing",
+            "grocery run", "python course", "server migration", "birthday gift", "gym membership"]
+VERBS = ["renew", "prepare", "book", "cancel", "review", "plan", "pay", "schedule", "finish", "research"]
+FILLER = ["before the deadline", "with the team", "for next month", "as discussed", "if possible",
+          "and send confirmation", "after lunch", "by end of week"]
+QUERIES = ["insurance", "quarterly report", "dentist", "migration", "gift", "tax"]
+
+
+def seed(collection, total: int, batch_size: int = 5000):
+    collection.drop()
+    now = datetime.now()
+    batch = []
+    for i in range(total):
+        subject = random.choice(SUBJECTS)
+        batch.append({
+            "_id": f"bench-{i}",
+            TENANT_FIELD: get_tenant_id(),
+            "title": f"{random.choice(VERBS).title()} {subject}",
+            "description": f"{random.choice(VERBS)} {subject} {random.choice(FILLER)} {random.choice(FILLER)}",
+            "deadline": now + timedelta(days=random.randint(0, 90)),
+            "priority": random.choice(["Low", "Medium", "High", "Critical"]),
+            "completed": False,
+            "status": random.choice(["Pending", "In Progress", "Completed"]),
+            "tags": random.sample(["work", "personal", "finance", "health"], 2),
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i),
+            "version": 1,
+        })
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    for keys, options in INDEXES[TASK_HANDLER_COLLECTION]:
+        collection.create_index(keys, **options)
+
+
+def client_side_scan(collection, search_text: str, per_page: int):
+    terms = search_text.lower().split()
+    tasks = getTasks(collection)
+    matches = [
+        task for task in tasks
+        if any(term in f"{task.get('title', '')} {task.get('description', '')}".lower() for term in terms)
+    ]
+    return matches[:per_page], len(matches)
+
+
+def indexed_search(collection, search_text: str, per_page: int):
+    return searchTasks(collection, search_text, per_page=per_page)
+
+
+def measure(label: str, function, collection, repeat: int, per_page: int):
+    timings = []
+    for i in range(repeat):
+        search_text = QUERIES[i % len(QUERIES)]
+        started = time.perf_counter()
+        function(collection, search_text, per_page)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<20} p50={statistics.median(timings):9.1f} ms  p95={p95:9.1f} ms  max={timings[-1]:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark task search")
+    parser.add_argument("--tasks", type=int, default=100_000, help="Synthetic tasks to seed")
+    parser.add_argument("--repeat", type=int, default=20, help="Queries per strategy")
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collection afterwards")
+    args = parser.parse_args()
+
+    setup_logger()
+    collection = MongoTemplate.get_collection(BENCH_COLLECTION, BULK_WRITE)
+    print(f"Seeding {args.tasks} tasks into {BENCH_COLLECTION}...")
+    seed(collection, args.tasks)
+
+    try:
+        # The full scan is a bulk read: under the interactive time limit it would abort with ExecutionTimeout
+        # on a large collection instead of being measured. The search runs with the profile of its endpoint.
+        measure("client-side scan", client_side_scan, MongoTemplate.get_collection(BENCH_COLLECTION, BULK_READ), args.repeat, args.per_page)
+        measure("text index search", indexed_search, MongoTemplate.get_collection(BENCH_COLLECTION, LIST_READ), args.repeat, args.per_page)
+    finally:
+        if not args.keep:
+            collection.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+    Offline evaluation of the priority classifier across LLM providers: latency percentiles, tokens,
+    parse-failure rate and a confusion matrix against a labeled fixture set.
+
+    Provider responses are recorded to a cassette file, so later runs replay them offline and deterministically
+    (latency and tokens are the values measured when recording). Record once with API keys set, then replay:
+        python -m scripts.eval_priority --mode record
+        python -m scripts.eval_priority
+        python -m scripts.eval_priority --providers hugging_face --json report.json
+"""
+import json
+import argparse
+from log import setup_logger
+from llms.priority_eval import (
+    PROVIDERS, MODE_AUTO, MODE_RECORD, MODE_REPLAY, ResponseCassette, load_fixtures, evaluate, format_report
+)
+
+DEFAULT_FIXTURES = "llms/eval_fixtures/priority_labels.jsonl"
+DEFAULT_CASSETTE = "llms/eval_fixtures/priority_cassette.jsonl"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the priority classifier of each LLM provider")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="Labeled tasks (JSONL)")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE, help="Recorded provider responses (JSONL)")
+    parser.add_argument("--mode", choices=[MODE_REPLAY, MODE_RECORD, MODE_AUTO], default=MODE_REPLAY,
+                        help="replay: recorded responses only; record: call providers and record; auto: record what is missing")
+    parser.add_argument("--providers", nargs="+", choices=sorted(PROVIDERS), default=sorted(PROVIDERS))
+    parser.add_argument("--json", help="Also write the full report, with misclassified tasks, to this file")
+    args = parser.parse_args()
+
+    setup_logger()
+    fixtures = load_fixtures(args.fixtures)
+    cassette = ResponseCassette(args.cassette, args.mode)
+    reports = [report.to_dict() for report in evaluate(fixtures, args.providers, cassette).values()]
+    print(f"{len(fixtures)} fixtures, mode {args.mode}, cassette {args.cassette}\n")
+    print("\n\n".join(format_report(report) for report in reports))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(reports, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
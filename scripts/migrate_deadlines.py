@@ -0,0 +1,31 @@
+"""
+    One-off migration converting deadlines stored as strings into BSON dates, and creating the
+    (completed, deadline) index used by GET /resollect/tasks/due and the overdue sweeper.
+
+    Usage: python -m scripts.migrate_deadlines [--batch-size 1000] [--dry-run]
+"""
+import argparse
+from log import logger, setup_logger
+from constants import MONGO_DB_NAME
+from mongodb.mongo_indexes import ensure_indexes
+from mongodb.mongo_template import MongoTemplate
+from services.deadline_service import DeadlineService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert string deadlines to dates")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Updates per bulk_write")
+    parser.add_argument("--dry-run", action="store_true", help="Count the documents without writing")
+    args = parser.parse_args()
+
+    setup_logger()
+    converted, unparseable = DeadlineService().migrate_string_deadlines(batch_size=args.batch_size, dry_run=args.dry_run)
+    if unparseable:
+        logger.error(f"{len(unparseable)} tasks have unparseable deadlines, first ids: {unparseable[:20]}")
+    if not args.dry_run:
+        ensure_indexes(MongoTemplate.get_mongo_client()[MONGO_DB_NAME])
+    logger.info(f"Deadline migration finished, {converted} tasks {'would be ' if args.dry_run else ''}converted")
+
+
+if __name__ == "__main__":
+    main()
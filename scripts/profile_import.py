@@ -0,0 +1,63 @@
+"""
+    Import-time profile of the app, to keep cold start fast for autoscaling and CLI tools.
+
+    Runs `python -X importtime -c "import app"` in a fresh interpreter a few times, reports the wall
+    time of the import and the modules with the largest cumulative import time.
+
+    Usage: python -m scripts.profile_import [--module app] [--runs 5] [--top 25]
+"""
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+
+
+def run_once(module: str):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    return elapsed, completed.stderr
+
+
+def parse_importtime(stderr: str):
+    """
+        Parses "import time: self [us] | cumulative | imported package" lines into (cumulative_us, self_us, name)
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile import time of the app")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    timings = []
+    stderr = ""
+    for _ in range(args.runs):
+        elapsed, stderr = run_once(args.module)
+        timings.append(elapsed)
+
+    print(f"import {args.module}: median {statistics.median(timings) * 1000:.0f} ms over {args.runs} runs "
+          f"(min {min(timings) * 1000:.0f} ms, interpreter start-up included)")
+    print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(parse_importtime(stderr), reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+    Prints an X-Profile-Token header value that makes the server profile the requests carrying it.
+    Uses PROFILE_SIGNING_KEY from the environment, which must match the server's.
+
+    Usage:
+        python -m scripts.sign_profile_token [--ttl 600]
+        curl -H "X-Profile-Token: $(python -m scripts.sign_profile_token)" http://localhost:5001/resollect/tasks/task
+"""
+import sys
+import time
+import argparse
+from config import ProfilingConfig
+from services.profiling_service import sign_profile_token
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sign a request profiling token")
+    parser.add_argument("--ttl", type=int, default=600, help="Seconds the token stays valid")
+    args = parser.parse_args()
+
+    if not ProfilingConfig().PROFILE_SIGNING_KEY:
+        sys.exit("PROFILE_SIGNING_KEY is not set")
+    print(sign_profile_token(int(time.time()) + args.ttl))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+    Background sweeper that flags open tasks past their deadline (overdue=true), one update_many per
+    interval, so clients no longer compute it over the full task list.
+
+    Run a single instance per deployment, e.g. as a sidecar process:
+        python -m scripts.sweep_overdue --interval 60
+        python -m scripts.sweep_overdue --once
+"""
+import time
+import argparse
+from log import logger, setup_logger
+from services.deadline_service import DeadlineService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag overdue tasks periodically")
+    parser.add_argument("--interval", type=int, default=60, help="Seconds between sweeps")
+    parser.add_argument("--once", action="store_true", help="Run a single sweep and exit")
+    args = parser.parse_args()
+
+    setup_logger()
+    deadline_service = DeadlineService()
+    while True:
+        started = time.monotonic()
+        try:
+            deadline_service.mark_overdue_tasks()
+        except Exception as e:
+            logger.error(f"Overdue sweep failed: {e}")
+        if args.once:
+            break
+        time.sleep(max(0, args.interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+    Backfill/repair job that copies task_tags associations onto the task documents' tags list
+    and creates the multikey tag index.
+
+    Usage: python -m scripts.sync_task_tags [--batch-size 1000] [--dry-run]
+"""
+import argparse
+from log import logger, setup_logger
+from constants import MONGO_DB_NAME
+from mongodb.mongo_indexes import ensure_indexes
+from services.tag_service import TagService
+from mongodb.mongo_template import MongoTemplate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync task_tags rows into task documents")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Updates per bulk_write")
+    parser.add_argument("--dry-run", action="store_true", help="Count the documents without writing")
+    args = parser.parse_args()
+
+    setup_logger()
+    if not args.dry_run:
+        ensure_indexes(MongoTemplate.get_mongo_client()[MONGO_DB_NAME])
+    synced = TagService().sync_task_tags_to_documents(batch_size=args.batch_size, dry_run=args.dry_run)
+    logger.info(f"Tag sync finished, {synced} task documents {'would be ' if args.dry_run else ''}updated")
+
+
+if __name__ == "__main__":
+    main()
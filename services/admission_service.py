@@ -0,0 +1,186 @@
+import math
+import time
+import threading
+from typing import Callable, Dict, Optional
+from log import logger
+from config import AdmissionConfig
+
+admission_config = AdmissionConfig()
+
+# Endpoint classes. A Resource method is put in one with @admission_class; undecorated GET/HEAD methods are
+# READ_BOUND and other methods WRITE_BOUND. UNLIMITED is never queued (probes, metrics, long-lived streams).
+LLM_BOUND = "llm"
+WRITE_BOUND = "write"
+READ_BOUND = "read"
+UNLIMITED = "unlimited"
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Weight of the newest request in the moving average of request durations behind Retry-After
+DURATION_SMOOTHING = 0.2
+
+
+def admission_class(name: str) -> Callable:
+    """
+    Puts a Resource method in an endpoint class, e.g. @admission_class(LLM_BOUND) above def post
+    """
+    def decorate(method):
+        method.admission_class = name
+        return method
+    return decorate
+
+
+class AdmissionGate:
+    """
+    Concurrency limit of one endpoint class with a bounded wait queue: up to `limit` requests run,
+    up to `queue_size` more wait up to `queue_timeout` seconds for a slot, anything beyond is rejected at once.
+    """
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._queued = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._mean_duration: Optional[float] = None
+
+    def acquire(self) -> bool:
+        with self._condition:
+            if self._active < self.limit:
+                self._active += 1
+                self._admitted += 1
+                return True
+            if self._waiting >= self.queue_size:
+                self._rejected += 1
+                return False
+
+            self._waiting += 1
+            self._queued += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self._active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timed_out += 1
+                        return False
+                    self._condition.wait(remaining)
+                self._active += 1
+                self._admitted += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def release(self, duration: float):
+        with self._condition:
+            self._active -= 1
+            self._mean_duration = duration if self._mean_duration is None else (
+                DURATION_SMOOTHING * duration + (1 - DURATION_SMOOTHING) * self._mean_duration
+            )
+            self._condition.notify()
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a slot is likely free: the queue ahead drained at `limit` requests per mean duration
+        """
+        with self._condition:
+            estimate = (self._mean_duration or 0) * (self._waiting + 1) / max(self.limit, 1)
+        return min(max(math.ceil(estimate), admission_config.ADMISSION_MIN_RETRY_AFTER_SECONDS),
+                   admission_config.ADMISSION_MAX_RETRY_AFTER_SECONDS)
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "queue_size": self.queue_size,
+                "active": self._active,
+                "queue_depth": self._waiting,
+                "admitted": self._admitted,
+                "queued": self._queued,
+                "rejected_queue_full": self._rejected,
+                "rejected_timed_out": self._timed_out,
+                "mean_duration_ms": round(self._mean_duration * 1000, 2) if self._mean_duration is not None else None,
+            }
+
+
+class AdmissionController:
+    """
+    Sheds load per endpoint class, so a slow LLM provider fills the llm class's slots and queue and its excess
+    gets a fast 503 with Retry-After, instead of every worker thread blocking and the reads timing out with it.
+    Limits apply per worker process.
+    """
+    def __init__(self):
+        limits = {
+            LLM_BOUND: (admission_config.ADMISSION_LLM_CONCURRENCY, admission_config.ADMISSION_LLM_QUEUE),
+            WRITE_BOUND: (admission_config.ADMISSION_WRITE_CONCURRENCY, admission_config.ADMISSION_WRITE_QUEUE),
+            READ_BOUND: (admission_config.ADMISSION_READ_CONCURRENCY, admission_config.ADMISSION_READ_QUEUE),
+        }
+        # A class with a limit of 0 is not gated
+        self.gates: Dict[str, AdmissionGate] = {
+            name: AdmissionGate(name, limit, queue_size, admission_config.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+            for name, (limit, queue_size) in limits.items() if limit > 0
+        }
+
+    @staticmethod
+    def classify(view_function, method: str) -> str:
+        """
+        Endpoint class of a request: the @admission_class of the Resource method, else by HTTP method.
+        Views that are not Resources (Swagger UI) are UNLIMITED.
+        """
+        view_class = getattr(view_function, "view_class", None)
+        if view_class is None:
+            return UNLIMITED
+        handler = getattr(view_class, method.lower(), None)
+        declared = getattr(handler, "admission_class", None)
+        if declared:
+            return declared
+        return READ_BOUND if method in READ_METHODS else WRITE_BOUND
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": admission_config.ADMISSION_CONTROL_ENABLED,
+            "classes": {name: gate.snapshot() for name, gate in self.gates.items()},
+        }
+
+    def init_app(self, application):
+        """
+        Admits or rejects every request before any other hook runs, and frees its slot at teardown (for a
+        streamed response, once the stream has ended)
+        """
+        if not admission_config.ADMISSION_CONTROL_ENABLED:
+            return
+        from flask import g, request, make_response, jsonify, current_app
+        from config_mapping.mapping import ErrorResponse
+
+        def admit_request():
+            endpoint_class = self.classify(current_app.view_functions.get(request.endpoint), request.method)
+            gate = self.gates.get(endpoint_class)
+            if gate is None:
+                return
+            if not gate.acquire():
+                retry_after = gate.retry_after()
+                logger.error(f"Shed {request.method} {request.path}: {endpoint_class} endpoints are at capacity, retry after {retry_after}s")
+                error_response = ErrorResponse(
+                    errorCode=503,
+                    errorResponse=f"The service is at capacity for {endpoint_class} requests",
+                    errorResolution=f"Retry after {retry_after} seconds"
+                )
+                response = make_response(jsonify(error_response.to_dict()), 503)
+                response.headers["Retry-After"] = str(retry_after)
+                return response
+            g.admission = (gate, time.monotonic())
+
+        def release_request(exception=None):
+            admission = g.pop("admission", None)
+            if admission is not None:
+                gate, started = admission
+                gate.release(time.monotonic() - started)
+
+        application.before_request(admit_request)
+        application.teardown_request(release_request)
+
+
+admission_control = AdmissionController()
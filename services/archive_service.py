@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ReplaceOne, DeleteOne
+from log import logger
+from config import ArchiveConfig
+from constants import (
+    TASK_HANDLER_COLLECTION, TASK_TAG_COLLECTION, ARCHIVED_TASK_COLLECTION, ARCHIVED_TASK_TAG_COLLECTION
+)
+from mongodb.mongo_template import MongoTemplate, BULK_READ, CRITICAL_WRITE
+from mongodb.tenant_scope import tenant_filter, tenant_config, TENANT_FIELD
+from services.cache_service import task_list_cache, TASK_GENERATION, TAG_GENERATION
+
+archive_config = ArchiveConfig()
+
+
+class TaskArchiveService:
+    """
+    Moves completed tasks out of task_handler so the hot collection (and its indexes) only hold the
+    work that list queries and dashboards actually read. A top-level task completed and untouched for
+    ARCHIVE_AFTER_DAYS moves together with its whole subtree and their task_tags rows.
+
+    Each batch copies first and deletes second, so an interrupted run leaves documents in both places
+    (reads prefer the hot copy) and the next run finishes the move. Deletes are conditional on the
+    version that was copied: a task edited meanwhile stays hot and its archive copy is discarded.
+    """
+    def __init__(self):
+        # Candidates may come from a secondary, the move itself reads the primary and waits for a majority
+        # on every copy before the originals are deleted
+        self.candidate_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, BULK_READ)
+        self.task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, CRITICAL_WRITE)
+        self.task_tag_collection = MongoTemplate.get_collection(TASK_TAG_COLLECTION, CRITICAL_WRITE)
+        self.archived_task_collection = MongoTemplate.get_collection(ARCHIVED_TASK_COLLECTION, CRITICAL_WRITE)
+        self.archived_task_tag_collection = MongoTemplate.get_collection(ARCHIVED_TASK_TAG_COLLECTION, CRITICAL_WRITE)
+
+    def archive_completed_tasks(self, older_than_days: int = archive_config.ARCHIVE_AFTER_DAYS,
+                                batch_size: int = archive_config.ARCHIVE_BATCH_SIZE,
+                                max_batches: Optional[int] = None) -> int:
+        """
+        Archives batches until no eligible task is left (or max_batches ran). Returns the number of
+        documents (tasks and sub-tasks) moved.
+        """
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        moved = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            # Cross-tenant scan on the partial (completed, updated_at) index; sub-tasks move with their root
+            roots = list(self.candidate_collection.find(
+                {"completed": True, "updated_at": {"$lt": cutoff}, "is_subtask": {"$ne": True}},
+                {"_id": 1, TENANT_FIELD: 1}
+            ).sort("updated_at", 1).limit(batch_size))
+            if not roots:
+                break
+            batch_moved = 0
+            for tenant_id, root_ids in self._group_by_tenant(roots).items():
+                batch_moved += self._archive_subtrees(tenant_id, root_ids)
+            batches += 1
+            moved += batch_moved
+            logger.info(f"Archive batch {batches}: moved {batch_moved} tasks")
+            if not batch_moved:
+                # Every root of the batch was edited while being copied, they are picked up next run
+                break
+        if moved:
+            task_list_cache.invalidate(TASK_GENERATION, TAG_GENERATION)
+        logger.info(f"Archived {moved} tasks completed before {cutoff.isoformat()} in {batches} batches")
+        return moved
+
+    @staticmethod
+    def _group_by_tenant(tasks: List[dict]) -> Dict[str, List[str]]:
+        grouped = {}
+        for task in tasks:
+            grouped.setdefault(task.get(TENANT_FIELD) or tenant_config.DEFAULT_TENANT_ID, []).append(task["_id"])
+        return grouped
+
+    def _archive_subtrees(self, tenant_id: str, root_ids: List[str]) -> int:
+        tasks = list(self.task_collection.find(tenant_filter(
+            {"$or": [{"_id": {"$in": root_ids}}, {"ancestors": {"$in": root_ids}}]}, tenant_id
+        )))
+        if not tasks:
+            return 0
+        archived_at = datetime.now()
+        # Scoped like every other write, so a colliding _id of another tenant is never overwritten (the upsert
+        # fails on it instead) and each replace stays targeted at one shard
+        self.archived_task_collection.bulk_write([
+            ReplaceOne(
+                tenant_filter({"_id": task["_id"]}, tenant_id),
+                {**task, TENANT_FIELD: tenant_id, "archived_at": archived_at},
+                upsert=True
+            )
+            for task in tasks
+        ], ordered=False)
+        self.task_collection.bulk_write([
+            DeleteOne(tenant_filter({"_id": task["_id"], "version": task.get("version")}, tenant_id))
+            for task in tasks
+        ], ordered=False)
+
+        # Tasks still in the hot collection were edited after they were copied, they stay hot
+        task_ids = [task["_id"] for task in tasks]
+        kept = {task["_id"] for task in self.task_collection.find(tenant_filter({"_id": {"$in": task_ids}}, tenant_id), {"_id": 1})}
+        if kept:
+            self.archived_task_collection.delete_many(tenant_filter({"_id": {"$in": list(kept)}}, tenant_id))
+            logger.info(f"Kept {len(kept)} tasks of tenant {tenant_id} hot, they changed while being archived")
+        moved_ids = [task_id for task_id in task_ids if task_id not in kept]
+        if moved_ids:
+            self._archive_task_tags(tenant_id, moved_ids)
+        return len(moved_ids)
+
+    def _archive_task_tags(self, tenant_id: str, task_ids: List[str]):
+        task_tags = list(self.task_tag_collection.find(tenant_filter({"task_id": {"$in": task_ids}}, tenant_id)))
+        if not task_tags:
+            return
+        self.archived_task_tag_collection.bulk_write([
+            ReplaceOne(tenant_filter({"_id": task_tag["_id"]}, tenant_id), {**task_tag, TENANT_FIELD: tenant_id}, upsert=True)
+            for task_tag in task_tags
+        ], ordered=False)
+        self.task_tag_collection.delete_many(tenant_filter({"task_id": {"$in": task_ids}}, tenant_id))
+
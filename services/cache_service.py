@@ -0,0 +1,178 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from log import logger
+from config import CacheConfig
+from config_mapping.mapping import TaskListQuery
+from mongodb.tenant_scope import get_tenant_id
+
+cache_config = CacheConfig()
+
+# Namespaces whose generation counters are folded into every task list cache key.
+# A write bumps the namespaces it touches, so entries built before the write can
+# no longer be addressed and simply age out of the backend.
+TASK_GENERATION = "tasks"
+TAG_GENERATION = "tags"
+
+
+class LRUCacheBackend:
+    """
+    In-process LRU store. Generations live in the same process, so this backend is
+    only safe when a single worker serves the API (dev server, one gunicorn worker).
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_generation(self, namespace: str) -> int:
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def bump_generation(self, namespace: str):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+
+class SharedStoreBackend:
+    """
+    Host-local store backed by a sqlite file, shared by every worker process on the
+    machine. Both the entries and the generation counters live in the file, so a
+    write handled by one worker invalidates the entries of all the others.
+
+    The file is opened on first use, one connection per thread and process: importing the app touches no
+    file, and a worker forked from a preloaded master never reuses the master's connection.
+    """
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, touched REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS generations (namespace TEXT PRIMARY KEY, value INTEGER)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE entries SET touched = julianday('now') WHERE key = ?", (key,))
+        return row[0]
+
+    def set(self, key: str, value: str):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, touched) VALUES (?, ?, julianday('now'))",
+            (key, value),
+        )
+        conn.execute(
+            "DELETE FROM entries WHERE key NOT IN (SELECT key FROM entries ORDER BY touched DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def get_generation(self, namespace: str) -> int:
+        row = self._connection().execute(
+            "SELECT value FROM generations WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, namespace: str):
+        self._connection().execute(
+            "INSERT INTO generations (namespace, value) VALUES (?, 1) "
+            "ON CONFLICT(namespace) DO UPDATE SET value = value + 1",
+            (namespace,),
+        )
+
+
+class TaskListCache:
+    """
+    Read-through cache for TaskListResource.get, keyed by the normalized TaskListQuery
+    plus the current task and tag generations. Values are the rendered JSON bodies and
+    their ETags, so a hit skips the query, the tag hydration and the serialization.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def build_key(self, query: TaskListQuery) -> str:
+        """
+        Generations are read before the database is queried, so a write racing with
+        the read stores its result under a key that is already unreachable. Generations are
+        shared by all tenants, the tenant only partitions the keys.
+        """
+        generations = {
+            TASK_GENERATION: self.backend.get_generation(TASK_GENERATION),
+            TAG_GENERATION: self.backend.get_generation(TAG_GENERATION),
+        }
+        return json.dumps(
+            {"tenant": get_tenant_id(), "query": query.normalized(), "generations": generations}, sort_keys=True
+        )
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the (etag, body) pair stored for the key, or None on a miss
+        """
+        try:
+            value = self.backend.get(key)
+            if value is None:
+                return None
+            etag, body = json.loads(value)
+            return etag, body
+        except Exception as e:
+            logger.error(f"Error reading task list cache: {e}")
+            return None
+
+    def set(self, key: str, etag: str, body: str):
+        try:
+            self.backend.set(key, json.dumps([etag, body]))
+        except Exception as e:
+            logger.error(f"Error writing task list cache: {e}")
+
+    def invalidate(self, *namespaces: str):
+        """
+        Bump the given generations (tasks by default). Called by every write path.
+        """
+        for namespace in namespaces or (TASK_GENERATION,):
+            try:
+                self.backend.bump_generation(namespace)
+            except Exception as e:
+                logger.error(f"Error invalidating task list cache namespace {namespace}: {e}")
+
+
+def create_task_list_cache() -> TaskListCache:
+    if cache_config.TASK_LIST_CACHE_BACKEND == "shared":
+        backend = SharedStoreBackend(cache_config.TASK_LIST_CACHE_SHARED_PATH, cache_config.TASK_LIST_CACHE_MAX_ENTRIES)
+    else:
+        backend = LRUCacheBackend(cache_config.TASK_LIST_CACHE_MAX_ENTRIES)
+        logger.warning("Task list cache is per process (TASK_LIST_CACHE_BACKEND=lru): writes by other workers "
+                       "or CLI jobs will not invalidate it")
+    logger.info(f"Task list cache backend: {type(backend).__name__}")
+    return TaskListCache(backend)
+
+
+task_list_cache = create_task_list_cache()
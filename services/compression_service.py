@@ -0,0 +1,76 @@
+import gzip
+from typing import Callable, Dict, Optional
+from flask import Flask, request
+from log import logger
+from config import CompressionConfig
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+compression_config = CompressionConfig()
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/msgpack", "text/plain", "text/html", "text/csv")
+
+
+def available_encoders() -> Dict[str, Callable[[bytes], bytes]]:
+    """
+    Content codings this process can produce, in order of preference when the client accepts several
+    with the same weight: zstd and brotli compress JSON better than gzip, zstd at a lower CPU cost.
+    """
+    encoders = {}
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=compression_config.ZSTD_LEVEL)
+        encoders["zstd"] = compressor.compress
+    if brotli is not None:
+        encoders["br"] = lambda data: brotli.compress(data, quality=compression_config.BROTLI_QUALITY)
+    encoders["gzip"] = lambda data: gzip.compress(data, compresslevel=compression_config.GZIP_LEVEL)
+    return encoders
+
+
+class ResponseCompressor:
+    """
+    Compresses buffered responses above RESPONSE_COMPRESSION_MIN_BYTES with the best coding the client
+    accepts. Streamed responses (SSE) are left alone. The ETag of a compressed response is made weak:
+    the bytes differ per coding, the resource version does not, and If-None-Match compares weakly.
+    """
+    def __init__(self):
+        self.encoders = available_encoders()
+
+    def init_app(self, application: Flask):
+        if not compression_config.RESPONSE_COMPRESSION_ENABLED:
+            return
+        application.after_request(self.compress_response)
+        logger.info(f"Response compression enabled: {', '.join(self.encoders)}")
+
+    def choose_encoding(self) -> Optional[str]:
+        encoding = request.accept_encodings.best_match(list(self.encoders))
+        return encoding if encoding in self.encoders else None
+
+    def compress_response(self, response):
+        response.vary.add("Accept-Encoding")
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        data = response.get_data()
+        if len(data) < compression_config.RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+
+        response.set_data(self.encoders[encoding](data))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+response_compressor = ResponseCompressor()
@@ -0,0 +1,117 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from pymongo import UpdateOne
+from log import logger
+from constants import TASK_HANDLER_COLLECTION
+from mongodb.mongo_template import MongoTemplate, LIST_READ, BULK_WRITE
+from mongodb.tenant_scope import tenant_filter, TENANT_FIELD
+from services.cache_service import task_list_cache
+
+WITHIN_PATTERN = re.compile(r"^(\d+)([smhdw]?)$")
+WITHIN_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks", "": "seconds"}
+
+
+class DeadlineService:
+    """
+    Deadlines are stored as BSON dates (naive UTC) so that the (completed, deadline) index can answer range
+    queries, and are always compared against datetime.utcnow(), never the server's local clock.
+    """
+    def __init__(self):
+        self.task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, LIST_READ)
+        # The overdue sweep and the deadline migration write across all tenants
+        self.bulk_task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, BULK_WRITE)
+
+    @staticmethod
+    def parse_deadline(value) -> Optional[datetime]:
+        """
+        Normalizes a client supplied deadline (datetime or ISO-8601 string, "Z" suffix allowed).
+        Timezone-aware values are converted to naive UTC, naive ones are taken as UTC. Raises ValueError for
+        anything else.
+        """
+        if value is None or value == "":
+            return None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        if not isinstance(value, datetime):
+            raise ValueError(f"Invalid deadline: {value!r}")
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    @staticmethod
+    def parse_within(within: str) -> timedelta:
+        """
+        Parses a window such as "90m", "24h", "3d", "1w" or a number of seconds
+        """
+        match = WITHIN_PATTERN.match((within or "").strip().lower())
+        if not match:
+            raise ValueError(f"Invalid window '{within}', expected e.g. 90m, 24h, 3d or 1w")
+        amount, unit = match.groups()
+        return timedelta(**{WITHIN_UNITS[unit]: int(amount)})
+
+    def get_tasks_due_within(self, within: timedelta, include_overdue: bool = False) -> List[dict]:
+        """
+        Open tasks of the current tenant whose deadline falls in the next `within`, soonest first,
+        answered from the (tenant_id, completed, deadline) index
+        """
+        now = datetime.utcnow()
+        deadline_range = {"$lte": now + within}
+        if not include_overdue:
+            deadline_range["$gte"] = now
+        return list(self.task_collection.find(
+            tenant_filter({"completed": False, "deadline": deadline_range})
+        ).sort("deadline", 1))
+
+    def mark_overdue_tasks(self) -> int:
+        """
+        Flags every open task past its deadline, with one update_many per tenant so that each uses the
+        (tenant_id, completed, deadline) index. Returns the number of tasks flagged.
+        """
+        now = datetime.utcnow()
+        flagged = 0
+        for tenant_id in self.bulk_task_collection.distinct(TENANT_FIELD):
+            result = self.bulk_task_collection.update_many(
+                tenant_filter({"completed": False, "deadline": {"$lt": now}, "overdue": {"$ne": True}}, tenant_id),
+                {"$set": {"overdue": True, "updated_at": datetime.now()}, "$inc": {"version": 1}}
+            )
+            flagged += result.modified_count
+        if flagged:
+            task_list_cache.invalidate()
+            logger.info(f"Marked {flagged} tasks as overdue")
+        return flagged
+
+    def migrate_string_deadlines(self, batch_size: int = 1000, dry_run: bool = False) -> Tuple[int, List[str]]:
+        """
+        Converts deadlines stored as strings into BSON dates. Returns the number of documents converted
+        and the IDs whose deadline could not be parsed (left untouched).
+        """
+        converted = 0
+        unparseable = []
+        operations = []
+        cursor = self.bulk_task_collection.find({"deadline": {"$type": "string"}}, {"deadline": 1})
+        for task in cursor:
+            try:
+                deadline = self.parse_deadline(task["deadline"])
+            except ValueError:
+                unparseable.append(task["_id"])
+                continue
+            operations.append(UpdateOne(
+                {"_id": task["_id"], "deadline": task["deadline"]},
+                {"$set": {"deadline": deadline}, "$inc": {"version": 1}}
+            ))
+            if len(operations) >= batch_size:
+                converted += self._flush(operations, dry_run)
+                operations = []
+        if operations:
+            converted += self._flush(operations, dry_run)
+
+        if converted and not dry_run:
+            task_list_cache.invalidate()
+        logger.info(f"Converted {converted} string deadlines (dry_run={dry_run}), {len(unparseable)} unparseable")
+        return converted, unparseable
+
+    def _flush(self, operations: List[UpdateOne], dry_run: bool) -> int:
+        if dry_run:
+            return len(operations)
+        return self.bulk_task_collection.bulk_write(operations, ordered=False).modified_count
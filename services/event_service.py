@@ -0,0 +1,259 @@
+import json
+import uuid
+import queue
+import threading
+from collections import deque
+from typing import Iterator, List, Optional
+from log import logger
+from config import EventConfig
+from constants import TASK_HANDLER_COLLECTION, TASK_TAG_COLLECTION
+from mongodb.mongo_template import MongoTemplate, INTERACTIVE_READ
+from mongodb.tenant_scope import get_tenant_id, TENANT_FIELD
+
+event_config = EventConfig()
+
+RESYNC_EVENT = "resync"
+CHANGE_STREAM_PIPELINE = [{"$match": {"ns.coll": {"$in": [TASK_HANDLER_COLLECTION, TASK_TAG_COLLECTION]}}}]
+# How long a catch-up change stream waits for more changes before the client is considered caught up
+CATCH_UP_AWAIT_MS = 200
+
+
+class TaskEventSubscriber:
+    """
+    One SSE client. Events are queued in a bounded buffer; a client that falls behind loses its
+    backlog and receives a single "resync" event telling it to refetch instead. Only events of the
+    tenant the client connected as are delivered.
+    """
+    def __init__(self, task_id: Optional[str] = None, parent_id: Optional[str] = None):
+        self.task_id = task_id
+        self.parent_id = parent_id
+        self.tenant_id = get_tenant_id()
+        self.events = queue.Queue(maxsize=event_config.TASK_EVENTS_CLIENT_BUFFER)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        tenant_id = event.get(TENANT_FIELD)
+        if tenant_id is not None and tenant_id != self.tenant_id:
+            return False
+        if tenant_id is None and not (self.task_id or self.parent_id):
+            # Change stream deletes carry no document to tell the tenant from, only clients
+            # following that task id (which they already know) receive them
+            return False
+        if self.task_id and event.get("task_id") != self.task_id:
+            return False
+        if self.parent_id and event.get("parent_task_id") != self.parent_id and event.get("task_id") != self.parent_id:
+            return False
+        return True
+
+    def offer(self, event: dict):
+        if not self.matches(event):
+            return
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+            with self.events.mutex:
+                self.events.queue.clear()
+
+
+class TaskEventBus:
+    """
+    Fans task change events out to the SSE subscribers of this process and keeps the most recent
+    events for Last-Event-ID replay.
+
+    Events come from a MongoDB change stream on task_handler/task_tags when the deployment is a
+    replica set, so every worker sees every write. Their id is the change's resume token, the same on
+    every worker, so a client reconnecting to any worker resumes from it: from the replay buffer, or
+    else from a change stream opened with resume_after. Otherwise the write paths call publish()
+    directly, which only reaches clients connected to the same process; those ids carry a per-process
+    prefix, so an id of another worker gets a resync instead of a replay from the wrong point.
+    """
+    def __init__(self):
+        self._subscribers: List[TaskEventSubscriber] = []
+        self._recent = deque(maxlen=event_config.TASK_EVENTS_REPLAY_BUFFER)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._process_token = uuid.uuid4().hex[:12]
+        self._mode = None
+        self._watcher = None
+
+    @property
+    def mode(self) -> str:
+        if self._mode is None:
+            with self._lock:
+                if self._mode is None:
+                    self._mode = self._resolve_mode()
+        return self._mode
+
+    def _resolve_mode(self) -> str:
+        configured = event_config.TASK_EVENTS_MODE
+        if configured in ("change_stream", "local"):
+            return configured
+        try:
+            hello = MongoTemplate.get_mongo_client().admin.command("hello")
+            if hello.get("setName") or hello.get("msg") == "isdbgrid":
+                return "change_stream"
+        except Exception as e:
+            logger.error(f"Could not determine replica set status, using local task events: {e}")
+        return "local"
+
+    def publish(self, event_type: str, task_id: str, parent_task_id: Optional[str] = None, **fields):
+        """
+        Write-path hook. A no-op in change stream mode, where the stream already reports the write.
+        """
+        if self.mode != "local":
+            return
+        with self._lock:
+            self._sequence += 1
+            event_id = f"{self._process_token}-{self._sequence}"
+        self._dispatch({
+            "id": event_id, "type": event_type, "task_id": task_id, "parent_task_id": parent_task_id,
+            TENANT_FIELD: get_tenant_id(), **fields
+        })
+
+    def _dispatch(self, event: dict):
+        with self._lock:
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(event)
+
+    def subscribe(self, subscriber: TaskEventSubscriber, last_event_id: Optional[str] = None) -> List[dict]:
+        """
+        Registers the subscriber and returns the events it missed since last_event_id. If that id is
+        not in the replay buffer, change stream mode resumes from it; otherwise (or if that fails) a
+        single resync event is returned instead.
+        """
+        if self.mode == "change_stream":
+            self._ensure_watcher()
+        with self._lock:
+            self._subscribers.append(subscriber)
+            if not last_event_id:
+                return []
+            recent = list(self._recent)
+        ids = [event["id"] for event in recent]
+        if last_event_id in ids:
+            return [event for event in recent[ids.index(last_event_id) + 1:] if subscriber.matches(event)]
+        if self.mode == "change_stream":
+            return self._catch_up(subscriber, last_event_id)
+        return [{"id": last_event_id, "type": RESYNC_EVENT}]
+
+    def _catch_up(self, subscriber: TaskEventSubscriber, last_event_id: str) -> List[dict]:
+        """
+        The subscriber's events after last_event_id, read from a change stream resumed after that token: the
+        client reconnected to another worker, or to this one after its replay buffer moved on. A resync is
+        returned for a token the server cannot resume from (foreign, malformed or older than the oplog) and
+        when more than TASK_EVENTS_REPLAY_BUFFER events were missed.
+        """
+        database = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, INTERACTIVE_READ).database
+        missed = []
+        try:
+            with database.watch(CHANGE_STREAM_PIPELINE, full_document="updateLookup",
+                                resume_after={"_data": last_event_id}, max_await_time_ms=CATCH_UP_AWAIT_MS) as stream:
+                while True:
+                    change = stream.try_next()
+                    if change is None:
+                        return missed
+                    event = self._event_from_change(change)
+                    if event and subscriber.matches(event):
+                        missed.append(event)
+                        if len(missed) > event_config.TASK_EVENTS_REPLAY_BUFFER:
+                            return [{"id": last_event_id, "type": RESYNC_EVENT}]
+        except Exception as e:
+            logger.error(f"Could not resume task events after {last_event_id}, sending a resync: {e}")
+            return [{"id": last_event_id, "type": RESYNC_EVENT}]
+
+    def unsubscribe(self, subscriber: TaskEventSubscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _ensure_watcher(self):
+        with self._lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            self._watcher = threading.Thread(target=self._watch, name="task-change-stream", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        """
+        Tails the change stream of the task database, resuming after the last seen token on errors
+        """
+        database = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, INTERACTIVE_READ).database
+        resume_token = None
+        while True:
+            try:
+                with database.watch(CHANGE_STREAM_PIPELINE, full_document="updateLookup", resume_after=resume_token) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        event = self._event_from_change(change)
+                        if event:
+                            self._dispatch(event)
+            except Exception as e:
+                logger.error(f"Task change stream interrupted, resuming: {e}")
+                threading.Event().wait(1)
+
+    @staticmethod
+    def _event_from_change(change: dict) -> Optional[dict]:
+        document = change.get("fullDocument") or {}
+        collection = change.get("ns", {}).get("coll")
+        event_id = change["_id"]["_data"]
+        if collection == TASK_TAG_COLLECTION:
+            if not document.get("task_id"):
+                return None
+            return {"id": event_id, "type": "tags", "task_id": document["task_id"], "parent_task_id": None,
+                    TENANT_FIELD: document.get(TENANT_FIELD)}
+
+        document_key = change.get("documentKey", {})
+        task_id = document_key.get("_id")
+        updated_fields = list(change.get("updateDescription", {}).get("updatedFields", {}).keys())
+        event = {
+            "id": event_id,
+            "type": change.get("operationType"),
+            "task_id": str(task_id) if task_id is not None else None,
+            "parent_task_id": document.get("parent_task_id"),
+            # documentKey includes the shard key fields once the collection is sharded on tenant_id
+            TENANT_FIELD: document.get(TENANT_FIELD) or document_key.get(TENANT_FIELD),
+        }
+        if updated_fields:
+            event["fields"] = updated_fields
+        return event
+
+    def stream(self, subscriber: TaskEventSubscriber, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields the SSE wire format for the subscriber until the client disconnects
+        """
+        try:
+            yield "retry: 3000\n\n"
+            # A change caught up from the stream can also reach the subscriber's queue once it is registered
+            replayed_ids = set()
+            for event in self.subscribe(subscriber, last_event_id):
+                replayed_ids.add(event.get("id"))
+                yield self.format_event(event)
+            while True:
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    yield self.format_event({"id": None, "type": RESYNC_EVENT})
+                try:
+                    event = subscriber.events.get(timeout=event_config.TASK_EVENTS_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # comment line, keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                if event.get("id") in replayed_ids:
+                    continue
+                yield self.format_event(event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    @staticmethod
+    def format_event(event: dict) -> str:
+        lines = []
+        if event.get("id"):
+            lines.append(f"id: {event['id']}")
+        lines.append(f"event: {event['type']}")
+        lines.append(f"data: {json.dumps(event, default=str)}")
+        return "\n".join(lines) + "\n\n"
+
+
+task_events = TaskEventBus()
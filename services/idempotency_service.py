@@ -0,0 +1,139 @@
+import json
+import uuid
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from pymongo.errors import DuplicateKeyError
+from log import logger
+from config import IdempotencyConfig
+from constants import IDEMPOTENCY_COLLECTION
+from mongodb.mongo_template import MongoTemplate, CRITICAL_WRITE
+from mongodb.tenant_scope import tenant_filter
+
+idempotency_config = IdempotencyConfig()
+
+# Outcomes of IdempotencyService.acquire
+IDEMPOTENCY_CLAIMED = "claimed"
+IDEMPOTENCY_REPLAYED = "replayed"
+IDEMPOTENCY_IN_PROGRESS = "in_progress"
+IDEMPOTENCY_MISMATCH = "mismatch"
+
+
+class IdempotencyService:
+    """
+    One record per requestId in the idempotency collection, so a retried create returns the outcome of the
+    first attempt instead of calling the model again. While the create runs the record is a lease ("running"),
+    renewed by the create until it ends; a finished create stores its response ("done"), a failed one ("failed")
+    lets the next retry run it again.
+    Records expire through the TTL index on expires_at.
+    """
+    def __init__(self):
+        self.collection = MongoTemplate.get_collection(IDEMPOTENCY_COLLECTION, CRITICAL_WRITE)
+
+    @staticmethod
+    def fingerprint(task_request) -> str:
+        """
+        Digest of the create payload; reusing a requestId for a different task is rejected rather than replayed
+        """
+        deadline = task_request.deadline.isoformat() if isinstance(task_request.deadline, datetime) else task_request.deadline
+        payload = json.dumps({
+            "title": task_request.title,
+            "inputStr": task_request.inputStr,
+            "deadline": deadline,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def claim(self, request_id: str, fingerprint: str) -> Optional[str]:
+        """
+        Atomically claims the requestId: creates its record, or takes over one whose create failed or whose
+        lease expired. Returns the owner token, or None when the record is running, done or another payload's.
+        """
+        # utcnow: the TTL monitor compares expires_at against UTC
+        now = datetime.utcnow()
+        owner = str(uuid.uuid4())
+        try:
+            # No matching record makes the upsert insert one, which fails on the _id of an existing record
+            self.collection.update_one(
+                tenant_filter({
+                    "_id": request_id,
+                    "fingerprint": fingerprint,
+                    "$or": [
+                        {"status": "failed"},
+                        {"status": "running", "lease_expires_at": {"$lt": now}},
+                    ]
+                }),
+                {"$set": {
+                    "status": "running",
+                    "owner": owner,
+                    "started_at": now,
+                    "lease_expires_at": now + timedelta(seconds=idempotency_config.IDEMPOTENCY_LEASE_SECONDS),
+                    "expires_at": now + timedelta(seconds=idempotency_config.IDEMPOTENCY_TTL_SECONDS),
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return None
+        return owner
+
+    def acquire(self, request_id: str, fingerprint: str) -> Tuple[Optional[str], str, Optional[dict]]:
+        """
+        Claims the requestId or reports the state of its record. Returns (owner, outcome, response), outcome
+        being one of IDEMPOTENCY_CLAIMED, IDEMPOTENCY_REPLAYED (response holds the stored status_code and body),
+        IDEMPOTENCY_IN_PROGRESS or IDEMPOTENCY_MISMATCH. Never waits: the caller holds an admission slot, so a
+        retry of a running create is answered at once and retried by the client.
+        """
+        for _ in range(2):
+            owner = self.claim(request_id, fingerprint)
+            if owner:
+                return owner, IDEMPOTENCY_CLAIMED, None
+
+            record = self.collection.find_one(tenant_filter({"_id": request_id}))
+            if not record:
+                # Expired between the claim and the read (claimed again on the second pass), or the requestId is
+                # taken by another tenant
+                continue
+            if record.get("fingerprint") != fingerprint:
+                return None, IDEMPOTENCY_MISMATCH, None
+            if record.get("status") == "done":
+                return None, IDEMPOTENCY_REPLAYED, record.get("response")
+            return None, IDEMPOTENCY_IN_PROGRESS, None
+        return None, IDEMPOTENCY_MISMATCH, None
+
+    def renew(self, request_id: str, owner: str) -> bool:
+        """
+        Extends the lease of a running claim; False once another request has taken it over
+        """
+        result = self.collection.update_one(
+            tenant_filter({"_id": request_id, "owner": owner, "status": "running"}),
+            {"$set": {
+                "lease_expires_at": datetime.utcnow() + timedelta(seconds=idempotency_config.IDEMPOTENCY_LEASE_SECONDS)
+            }}
+        )
+        return result.matched_count == 1
+
+    def complete(self, request_id: str, owner: str, status_code: int, body: dict):
+        """
+        Stores the response of the finished create, replayed to every retry until the record expires. The task is
+        stored under the requestId by then, so a response is stored even if the claim was taken over meanwhile.
+        """
+        now = datetime.utcnow()
+        update = {"$set": {
+            "status": "done",
+            "owner": owner,
+            "response": {"status_code": status_code, "body": body},
+            "finished_at": now,
+            "expires_at": now + timedelta(seconds=idempotency_config.IDEMPOTENCY_TTL_SECONDS),
+        }}
+        result = self.collection.update_one(tenant_filter({"_id": request_id, "owner": owner}), update)
+        if result.matched_count == 0:
+            logger.error(f"Idempotency claim of {request_id} was taken over before the create finished")
+            self.collection.update_one(tenant_filter({"_id": request_id, "status": {"$ne": "done"}}), update)
+
+    def release(self, request_id: str, owner: str):
+        """
+        Ends a claim whose create failed, the next retry with the same requestId runs it again
+        """
+        self.collection.update_one(
+            tenant_filter({"_id": request_id, "owner": owner}),
+            {"$set": {"status": "failed", "finished_at": datetime.utcnow()}}
+        )
@@ -0,0 +1,230 @@
+import csv
+import json
+import uuid
+import codecs
+from datetime import datetime, timedelta
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+from marshmallow import ValidationError
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from log import logger
+from config import ImportConfig
+from config_mapping import get_schema
+from config_mapping.mapping import TaskPostCall, TaskSchema, TaskImportReport
+from constants import TASK_HANDLER_COLLECTION, INPUT_TASK_PRIORITY_FINALIZER
+from llms import hugging_face
+from llms.prompt_builder import build_prompt, PRIORITY_TEMPLATE
+from mongodb.mongo_template import MongoTemplate, BULK_WRITE
+from mongodb.tenant_scope import tenant_filter, tenant_context, get_tenant_id, TENANT_FIELD
+from services.tag_service import TagService
+from services.deadline_service import DeadlineService
+from services.similarity_service import similar_tasks
+from services.cache_service import task_list_cache, TASK_GENERATION, TAG_GENERATION
+
+import_config = ImportConfig()
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+
+
+class TaskImportService:
+    """
+    Streams CSV/NDJSON task rows, validates them with the TaskPostCall schema and writes them with
+    chunked insert_many. The LLM priority/tag enrichment is deferred: imported tasks are stored with
+    enrichment_status "pending" and picked up later by enrich_pending_tasks.
+
+    Each enrichment run claims its tasks one by one (pending -> running), so concurrent runs never enrich the same
+    task. A failed task goes back to pending with a retry time, leaving the rest of the backlog to the next batch,
+    and becomes "failed" once it ran out of attempts.
+    """
+    def __init__(self, chunk_size: int = import_config.IMPORT_CHUNK_SIZE):
+        self.task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, BULK_WRITE)
+        self.chunk_size = chunk_size
+        self.schema = get_schema(TaskPostCall)()
+
+    @staticmethod
+    def read_rows(stream: Iterable[bytes], file_format: str) -> Iterator[Tuple[int, object]]:
+        """
+        Yields (row_number, row) pairs from a binary stream without reading it fully into memory.
+        A row that cannot be decoded is yielded as an Exception so it is reported, not fatal.
+        """
+        lines = codecs.iterdecode(stream, "utf-8-sig")
+        if file_format == "csv":
+            for row_number, row in enumerate(csv.DictReader(lines), start=1):
+                yield row_number, row
+        elif file_format == "ndjson":
+            row_number = 0
+            for line in lines:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    yield row_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield row_number, e
+        else:
+            raise ValueError(f"Unsupported import format '{file_format}', expected one of {SUPPORTED_FORMATS}")
+
+    def _build_document(self, row: dict) -> dict:
+        if not row.get("requestId"):
+            # The schema default is a single import-time uuid, every row needs its own
+            row = {**row, "requestId": str(uuid.uuid4())}
+        mapping_request: TaskPostCall = self.schema.load(row)
+        task_object = TaskSchema(
+            _id=mapping_request.requestId,
+            title=mapping_request.title,
+            description=mapping_request.inputStr,
+            deadline=DeadlineService.parse_deadline(mapping_request.deadline),
+            enrichment_status="pending"
+        )
+        return asdict(task_object)
+
+    def import_tasks(self, stream: Iterable[bytes], file_format: str) -> TaskImportReport:
+        """
+        Imports every valid row and returns a per-row error report; invalid or duplicate rows never abort the batch
+        """
+        report = TaskImportReport()
+        chunk: List[Tuple[int, dict]] = []
+
+        for row_number, row in self.read_rows(stream, file_format):
+            report.total_rows += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                if not isinstance(row, dict):
+                    raise ValueError("Row is not an object")
+                chunk.append((row_number, self._build_document(row)))
+            except ValidationError as e:
+                self._record_error(report, row_number, e.messages)
+            except Exception as e:
+                self._record_error(report, row_number, str(e))
+
+            if len(chunk) >= self.chunk_size:
+                self._insert_chunk(chunk, report)
+                chunk = []
+
+        if chunk:
+            self._insert_chunk(chunk, report)
+
+        if report.inserted:
+            task_list_cache.invalidate(TASK_GENERATION)
+        logger.info(f"Imported {report.inserted}/{report.total_rows} tasks, {report.failed} failed")
+        return report
+
+    def _insert_chunk(self, chunk: List[Tuple[int, dict]], report: TaskImportReport):
+        documents = [document for _, document in chunk]
+        try:
+            result = self.task_collection.insert_many(documents, ordered=False)
+            report.inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            report.inserted += e.details.get("nInserted", 0)
+            for write_error in write_errors:
+                row_number = chunk[write_error["index"]][0]
+                self._record_error(report, row_number, write_error.get("errmsg", "Write failed"))
+
+    @staticmethod
+    def _record_error(report: TaskImportReport, row_number: int, error):
+        report.failed += 1
+        if len(report.errors) < import_config.IMPORT_MAX_REPORTED_ERRORS:
+            report.errors.append({"row": row_number, "error": error})
+
+    def enrich_pending_tasks(self, limit: int = import_config.ENRICHMENT_BATCH_SIZE) -> int:
+        """
+        Generates priority and tags for up to `limit` imported tasks, overlapping the LLM calls
+        on a small thread pool. Returns the number of tasks enriched.
+        """
+        claimed = []
+        while len(claimed) < limit:
+            task = self._claim_pending_task()
+            if task is None:
+                break
+            claimed.append(task)
+        if not claimed:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=import_config.ENRICHMENT_CONCURRENCY) as executor:
+            enriched = sum(executor.map(self._enrich_task, claimed))
+
+        task_list_cache.invalidate(TASK_GENERATION, TAG_GENERATION)
+        logger.info(f"Enriched {enriched}/{len(claimed)} claimed tasks")
+        return enriched
+
+    def _claim_pending_task(self) -> Optional[dict]:
+        """
+        Atomically moves one task that is due for enrichment to "running". Returns it, or None when none is left.
+        """
+        now = datetime.now()
+        stale_claim = now - timedelta(seconds=import_config.ENRICHMENT_CLAIM_TIMEOUT_SECONDS)
+        return self.task_collection.find_one_and_update(
+            {"$or": [
+                {"enrichment_status": "pending", "enrichment_retry_at": {"$not": {"$gt": now}}},
+                {"enrichment_status": "running", "enrichment_claimed_at": {"$lt": stale_claim}},
+            ]},
+            {"$set": {"enrichment_status": "running", "enrichment_claimed_at": now}},
+            projection={"title": 1, "description": 1, "enrichment_attempts": 1, "enrichment_claimed_at": 1, TENANT_FIELD: 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _enrich_task(self, task: dict) -> bool:
+        # Pending tasks of every tenant are enriched together, each on behalf of its own tenant
+        with tenant_context(task.get(TENANT_FIELD) or get_tenant_id()):
+            return self._enrich_tenant_task(task)
+
+    def _enrich_tenant_task(self, task: dict) -> bool:
+        try:
+            tag_service = TagService()
+            title = task.get('title', '')
+            description = task.get('description', '')
+            similar_task = similar_tasks.find_similar(title, description)
+            if similar_task:
+                priority = similar_task["priority"]
+                generated_tags = similar_task["tags"]
+            else:
+                priority = hugging_face.call_hugging_face(
+                    build_prompt(INPUT_TASK_PRIORITY_FINALIZER, PRIORITY_TEMPLATE, title, description)
+                )
+                generated_tags = tag_service.generate_tags_for_task(title, description)
+            result = self.task_collection.update_one(
+                self._claim_filter(task),
+                {
+                    "$set": {"priority": priority, "enrichment_status": "done", "updated_at": datetime.now()},
+                    "$unset": {"enrichment_claimed_at": "", "enrichment_retry_at": ""},
+                    "$inc": {"version": 1}
+                }
+            )
+            if not result.matched_count:
+                # The claim timed out and another run took the task over, its result wins
+                logger.info(f"Enrichment claim on task {task['_id']} was taken over, dropping this result")
+                return False
+            tag_service.associate_tags_with_task(task['_id'], generated_tags)
+            similar_tasks.add(task['_id'], title, description, priority, TagService.normalize_tag_names(generated_tags))
+            return True
+        except Exception as e:
+            logger.error(f"Error enriching imported task {task.get('_id')}: {e}")
+            self._record_enrichment_failure(task, e)
+            return False
+
+    @staticmethod
+    def _claim_filter(task: dict) -> dict:
+        # Matches the task only while this run's claim on it holds
+        return tenant_filter({"_id": task['_id'], "enrichment_status": "running", "enrichment_claimed_at": task['enrichment_claimed_at']})
+
+    def _record_enrichment_failure(self, task: dict, error: Exception):
+        attempts = task.get('enrichment_attempts', 0) + 1
+        if attempts >= import_config.ENRICHMENT_MAX_ATTEMPTS:
+            status = {"enrichment_status": "failed"}
+        else:
+            retry_at = datetime.now() + timedelta(seconds=import_config.ENRICHMENT_RETRY_DELAY_SECONDS)
+            status = {"enrichment_status": "pending", "enrichment_retry_at": retry_at}
+        try:
+            self.task_collection.update_one(
+                self._claim_filter(task),
+                {
+                    "$set": {**status, "enrichment_attempts": attempts, "enrichment_error": str(error)},
+                    "$unset": {"enrichment_claimed_at": ""}
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error recording the enrichment failure of task {task.get('_id')}: {e}")
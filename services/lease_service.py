@@ -0,0 +1,47 @@
+import threading
+import contextvars
+from typing import Callable
+from log import logger
+
+
+class LeaseHeartbeat:
+    """
+    Renews a lease from a daemon thread while the owner is blocked (an LLM call can outlast the lease by far),
+    so a concurrent request never takes over work that is still running. `renew` returns False once the lease
+    is lost; `lost` then stays set and renewing stops.
+
+        with LeaseHeartbeat(lambda: service.renew(...), interval) as heartbeat:
+            ...
+            if heartbeat.lost: stop
+    """
+    def __init__(self, renew: Callable[[], bool], interval: float, name: str = "lease-heartbeat"):
+        self.renew = renew
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        # The thread runs in a copy of the creator's context, so `renew` sees its tenant (and any other ContextVar)
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._run,), name=name, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.renew():
+                    self.lost = True
+                    return
+            except Exception as e:
+                # A transient error is retried on the next beat, the lease outlives a few intervals
+                logger.error(f"Failed to renew a lease: {e}")
+
+    def start(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
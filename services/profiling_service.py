@@ -0,0 +1,189 @@
+import os
+import re
+import sys
+import time
+import hmac
+import uuid
+import random
+import hashlib
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from flask import Flask, g, request
+from log import logger
+from config import ProfilingConfig
+
+profiling_config = ProfilingConfig()
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+UNSAFE_FILENAME_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def sign_profile_token(expires_at: int, key: str = profiling_config.PROFILE_SIGNING_KEY) -> str:
+    """
+    Header value that requests a profile until the unix time expires_at: "<expires_at>.<hmac-sha256>"
+    """
+    signature = hmac.new(key.encode("utf-8"), str(expires_at).encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{expires_at}.{signature}"
+
+
+def verify_profile_token(token: str) -> bool:
+    key = profiling_config.PROFILE_SIGNING_KEY
+    if not key or not token or "." not in token:
+        return False
+    expires_at, _ = token.split(".", 1)
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(token, sign_profile_token(int(expires_at), key))
+
+
+class StackSampler:
+    """
+    Pure-Python sampling profiler for one thread: a daemon thread records the target thread's stack
+    every interval and counts identical stacks, which is the folded format flamegraph tools read.
+    """
+    def __init__(self, thread_id: int, interval: float, max_seconds: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def write(self, path: str):
+        with open(path, "w") as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """
+    Profiles single requests on demand: requests carrying a valid signed X-Profile-Token header, plus
+    a random PROFILE_SAMPLE_RATE share of all requests. Profiles are written to PROFILE_OUTPUT_DIR as
+    <time>_<endpoint>_<request id>.collapsed (or .prof) and pruned to PROFILE_MAX_FILES / PROFILE_MAX_AGE_HOURS.
+    """
+    def __init__(self):
+        self.mode = profiling_config.PROFILE_MODE
+        self._prune_lock = threading.Lock()
+        self.output_dir = profiling_config.PROFILE_OUTPUT_DIR
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(profiling_config.PROFILE_SIGNING_KEY) or profiling_config.PROFILE_SAMPLE_RATE > 0
+
+    def init_app(self, application: Flask):
+        """
+        Registers the request hooks, only when profiling is configured, so a disabled profiler costs nothing
+        """
+        if not self.enabled():
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        gevent_monkey = sys.modules.get("gevent.monkey")
+        if self.mode == "sampler" and gevent_monkey and gevent_monkey.is_module_patched("threading"):
+            # Greenlets share one OS thread, the sampler cannot tell the request's stack apart
+            logger.info("gevent workers detected, profiling requests with cProfile instead of the stack sampler")
+            self.mode = "cprofile"
+        application.before_request(self.start_profile)
+        application.after_request(self.tag_response)
+        application.teardown_request(self.finish_profile)
+        logger.info(f"Request profiling enabled ({self.mode}), sample rate {profiling_config.PROFILE_SAMPLE_RATE}, output {self.output_dir}")
+
+    @staticmethod
+    def should_profile() -> bool:
+        if verify_profile_token(request.headers.get(PROFILE_TOKEN_HEADER)):
+            return True
+        return random.random() < profiling_config.PROFILE_SAMPLE_RATE
+
+    def start_profile(self):
+        if not self.should_profile():
+            return
+        g.profile_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.profile_started_at = time.perf_counter()
+        try:
+            if self.mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                profiler = StackSampler(
+                    threading.get_ident(),
+                    profiling_config.PROFILE_SAMPLE_INTERVAL_MS / 1000,
+                    profiling_config.PROFILE_MAX_SECONDS,
+                )
+                profiler.start()
+            g.profiler = profiler
+        except ValueError as e:
+            # cProfile allows one active profiler per process on recent Pythons
+            logger.error(f"Skipping profile of {request.path}: {e}")
+
+    @staticmethod
+    def tag_response(response):
+        if g.get("profiler") is not None:
+            response.headers[PROFILE_ID_HEADER] = g.profile_id
+        return response
+
+    def finish_profile(self, exception: Optional[BaseException] = None):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return
+        try:
+            elapsed_ms = (time.perf_counter() - g.profile_started_at) * 1000
+            endpoint = UNSAFE_FILENAME_CHARACTERS.sub("_", request.endpoint or request.path.strip("/") or "root")
+            request_id = UNSAFE_FILENAME_CHARACTERS.sub("_", g.profile_id)
+            name = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{endpoint}_{request_id}"
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+                path = os.path.join(self.output_dir, f"{name}.prof")
+                profiler.dump_stats(path)
+            else:
+                profiler.stop()
+                path = os.path.join(self.output_dir, f"{name}.collapsed")
+                profiler.write(path)
+            logger.info(f"Profiled {request.method} {request.path} in {elapsed_ms:.0f} ms: {path}")
+            self.prune()
+        except Exception as e:
+            logger.error(f"Failed to write request profile: {e}")
+
+    def prune(self):
+        """
+        Deletes profiles beyond PROFILE_MAX_FILES (oldest first) or older than PROFILE_MAX_AGE_HOURS
+        """
+        with self._prune_lock:
+            entries = []
+            for name in os.listdir(self.output_dir):
+                if name.endswith((".collapsed", ".prof")):
+                    path = os.path.join(self.output_dir, name)
+                    entries.append((os.path.getmtime(path), path))
+            entries.sort(reverse=True)
+            oldest_kept = time.time() - profiling_config.PROFILE_MAX_AGE_HOURS * 3600
+            for position, (modified_at, path) in enumerate(entries):
+                if position >= profiling_config.PROFILE_MAX_FILES or modified_at < oldest_kept:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,323 @@
+import re
+import time
+import zlib
+import random
+import threading
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from log import logger
+from config import SimilarityConfig
+from constants import TASK_HANDLER_COLLECTION
+from llms.hugging_face import PRIORITY_LABELS
+from mongodb.mongo_template import MongoTemplate, BULK_READ
+from mongodb.tenant_scope import get_tenant_id, tenant_config, TENANT_FIELD
+
+similarity_config = SimilarityConfig()
+
+MAX_HASH = (1 << 32) - 1
+# Fixed seed: every worker derives the same hash functions, so signatures are comparable across restarts
+PERMUTATION_SEED = 1729
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+# Indexed ids checked for deletion/archival per query during reconciliation
+RECONCILE_BATCH_SIZE = 1000
+
+# Tasks whose priority/tags came from the LLM (or were corrected by a user). Sub-tasks get a default
+# priority and imported tasks are not classified until their enrichment is done, so neither is worth reusing.
+# Only the four labels count: a failed parse ("No matches found") must never be handed to a near-duplicate.
+CLASSIFIED_TASKS_FILTER = {
+    "priority": {"$in": PRIORITY_LABELS},
+    "is_subtask": {"$ne": True},
+    "enrichment_status": {"$in": [None, "done"]},
+}
+INDEX_PROJECTION = {"title": 1, "description": 1, "priority": 1, "tags": 1, "updated_at": 1, TENANT_FIELD: 1}
+
+
+def mix32(value: int) -> int:
+    """
+    murmur3's 32-bit finalizer. Hash function i of the MinHash signature is mix32(shingle ^ seed_i).
+    """
+    value ^= value >> 16
+    value = (value * 0x85EBCA6B) & MAX_HASH
+    value ^= value >> 13
+    value = (value * 0xC2B2AE35) & MAX_HASH
+    value ^= value >> 16
+    return value
+
+
+@lru_cache(maxsize=None)
+def load_numpy():
+    """
+    numpy, or None when it is not installed. Imported on the first signature rather than with the module,
+    which would add ~60 ms to `import app`; the warm-up's background index load usually pays it.
+    """
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def mix32_array(values):
+    """
+    mix32 over a numpy uint32 array: the multiplications wrap modulo 2**32 like the masked ones above
+    """
+    uint32 = values.dtype.type
+    values = values ^ (values >> uint32(16))
+    values = values * uint32(0x85EBCA6B)
+    values = values ^ (values >> uint32(13))
+    values = values * uint32(0xC2B2AE35)
+    return values ^ (values >> uint32(16))
+
+
+class TaskSimilarityIndex:
+    """
+    In-process MinHash/LSH index over the character shingles of classified tasks' title + description,
+    used to reuse the priority and tags of a near-duplicate instead of calling the LLMs again.
+
+    Signatures of MINHASH_PERMUTATIONS values are split into LSH_BANDS bands; tasks sharing any band
+    are candidates, and a candidate is reused only if its estimated Jaccard similarity reaches
+    SIMILARITY_THRESHOLD. The index is loaded from task_handler by a background thread, updated
+    in place on insert and refreshed periodically with tasks classified by other workers.
+
+    It holds at most SIMILARITY_INDEX_MAX_TASKS tasks, evicting the least recently written. Tasks deleted
+    or archived are dropped: at once when this worker deletes them, by the periodic reconciliation otherwise.
+    Signatures are computed with numpy when it is installed, and only over the first
+    SIMILARITY_MAX_TEXT_CHARS characters, which bounds their cost.
+    """
+    def __init__(self):
+        self.threshold = similarity_config.SIMILARITY_THRESHOLD
+        self.shingle_size = similarity_config.SIMILARITY_SHINGLE_SIZE
+        self.bands = similarity_config.LSH_BANDS
+        self.rows = similarity_config.MINHASH_PERMUTATIONS // self.bands
+        self.max_tasks = similarity_config.SIMILARITY_INDEX_MAX_TASKS
+        generator = random.Random(PERMUTATION_SEED)
+        self._seeds = [generator.getrandbits(32) for _ in range(self.bands * self.rows)]
+        # Built with the first signature, see load_numpy
+        self._seed_array = None
+        self._seed_array_built = False
+        # Least recently written first, the eviction order
+        self._entries: Dict[str, dict] = OrderedDict()
+        self._buckets: List[Dict[int, Set[str]]] = [{} for _ in range(self.bands)]
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loader = None
+        self._synced_at: Optional[datetime] = None
+        self._reconciled_at = time.monotonic()
+        self._lookups = 0
+        self._hits = 0
+        self._skipped = 0
+
+    def shingles(self, title: str, description: str) -> Set[int]:
+        text = f"{title or ''} {description or ''}"[:similarity_config.SIMILARITY_MAX_TEXT_CHARS]
+        text = NON_ALPHANUMERIC.sub(" ", text.lower()).strip()
+        if len(text) <= self.shingle_size:
+            return {zlib.crc32(text.encode("utf-8"))} if text else set()
+        return {
+            zlib.crc32(text[i:i + self.shingle_size].encode("utf-8"))
+            for i in range(len(text) - self.shingle_size + 1)
+        }
+
+    def _numpy_seeds(self):
+        """
+        The seeds as a numpy uint32 array, or None without numpy. Building it twice from two threads is harmless.
+        """
+        if not self._seed_array_built:
+            numpy = load_numpy()
+            self._seed_array = numpy.array(self._seeds, dtype=numpy.uint32) if numpy is not None else None
+            self._seed_array_built = True
+        return self._seed_array
+
+    def signature(self, title: str, description: str) -> Optional[array]:
+        shingles = self.shingles(title, description)
+        if not shingles:
+            return None
+        seed_array = self._numpy_seeds()
+        if seed_array is not None:
+            # One (shingles x hash functions) matrix instead of a Python loop per pair
+            values = load_numpy().fromiter(shingles, dtype=seed_array.dtype, count=len(shingles))
+            hashed = mix32_array(values[:, None] ^ seed_array[None, :])
+            return array("I", hashed.min(axis=0).tolist())
+        return array("I", (min(mix32(shingle ^ seed) for shingle in shingles) for seed in self._seeds))
+
+    def _band_keys(self, signature: array) -> List[int]:
+        return [hash(tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    @staticmethod
+    def estimate_similarity(first: array, second: array) -> float:
+        return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+    def find_similar(self, title: str, description: str) -> Optional[dict]:
+        """
+        The most similar classified task of the current tenant at or above the threshold, as
+        {"task_id", "similarity", "priority", "tags"}, or None. Returns None while the index is still loading.
+        """
+        if not similarity_config.SIMILARITY_REUSE_ENABLED:
+            return None
+        self._ensure_loader()
+        if not self._ready.is_set():
+            with self._lock:
+                self._skipped += 1
+            return None
+
+        signature = self.signature(title, description)
+        tenant_id = get_tenant_id()
+        best = None
+        with self._lock:
+            self._lookups += 1
+            if signature is None:
+                return None
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(key, ()))
+            for task_id in candidates:
+                entry = self._entries[task_id]
+                if entry["tenant_id"] != tenant_id:
+                    # Classifications are never shared across tenants
+                    continue
+                similarity = self.estimate_similarity(signature, entry["signature"])
+                if similarity >= self.threshold and (best is None or similarity > best["similarity"]):
+                    best = {"task_id": task_id, "similarity": similarity,
+                            "priority": entry["priority"], "tags": list(entry["tags"])}
+            if best:
+                self._hits += 1
+        if best:
+            logger.info(f"Reusing classification of task {best['task_id']} (similarity {best['similarity']:.2f})")
+        return best
+
+    def add(self, task_id: str, title: str, description: str, priority: Optional[str], tags: Optional[List[str]],
+            tenant_id: Optional[str] = None):
+        """
+        Indexes (or re-indexes) a classified task of the tenant (the current one by default). Called on insert,
+        so the next duplicate is caught without a reload.
+        """
+        if not similarity_config.SIMILARITY_REUSE_ENABLED or priority not in PRIORITY_LABELS:
+            return
+        signature = self.signature(title, description)
+        if signature is None:
+            return
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            self._remove(task_id)
+            self._entries[task_id] = {
+                "signature": signature, "band_keys": band_keys, "priority": priority, "tags": list(tags or []),
+                "tenant_id": tenant_id or get_tenant_id()
+            }
+            for band, key in enumerate(band_keys):
+                self._buckets[band].setdefault(key, set()).add(task_id)
+            while len(self._entries) > self.max_tasks:
+                self._remove(next(iter(self._entries)))
+
+    def remove(self, task_id: str):
+        """
+        Drops a deleted or archived task, so it is never reused
+        """
+        with self._lock:
+            self._remove(task_id)
+
+    def _remove(self, task_id: str):
+        entry = self._entries.pop(task_id, None)
+        if entry is None:
+            return
+        for band, key in enumerate(entry["band_keys"]):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(task_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": similarity_config.SIMILARITY_REUSE_ENABLED,
+                "ready": self._ready.is_set(),
+                "indexed_tasks": len(self._entries),
+                "max_tasks": self.max_tasks,
+                "vectorized": load_numpy() is not None,
+                "threshold": self.threshold,
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "hit_rate": round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+                "skipped_while_loading": self._skipped,
+            }
+
+    def start_loading(self):
+        """
+        Starts the background load without waiting for the first lookup, used by the warm-up
+        """
+        if similarity_config.SIMILARITY_REUSE_ENABLED:
+            self._ensure_loader()
+
+    def _ensure_loader(self):
+        with self._lock:
+            if self._loader is not None and self._loader.is_alive():
+                return
+            self._loader = threading.Thread(target=self._load_and_refresh, name="task-similarity-index", daemon=True)
+            self._loader.start()
+
+    def _load_and_refresh(self):
+        """
+        Loads the most recently updated classified tasks, then keeps picking up tasks written since the last pass
+        """
+        while True:
+            try:
+                self._sync()
+                self._ready.set()
+                if time.monotonic() - self._reconciled_at >= similarity_config.SIMILARITY_RECONCILE_SECONDS:
+                    self._reconcile()
+            except Exception as e:
+                logger.error(f"Failed to refresh the task similarity index: {e}")
+            threading.Event().wait(similarity_config.SIMILARITY_REFRESH_SECONDS)
+
+    def _sync(self):
+        task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, BULK_READ)
+        query = dict(CLASSIFIED_TASKS_FILTER)
+        if self._synced_at is not None:
+            query["updated_at"] = {"$gte": self._synced_at}
+        if self._synced_at is None:
+            # The newest max_tasks, added oldest first so the eviction order matches the write order
+            tasks = list(task_collection.find(query, INDEX_PROJECTION).sort("updated_at", -1).limit(self.max_tasks))
+            tasks.reverse()
+        else:
+            tasks = task_collection.find(query, INDEX_PROJECTION).sort("updated_at", 1)
+
+        loaded = 0
+        latest = self._synced_at
+        for task in tasks:
+            self.add(str(task["_id"]), task.get("title"), task.get("description"), task.get("priority"), task.get("tags"),
+                     task.get(TENANT_FIELD) or tenant_config.DEFAULT_TENANT_ID)
+            loaded += 1
+            if isinstance(task.get("updated_at"), datetime) and (latest is None or task["updated_at"] > latest):
+                latest = task["updated_at"]
+        self._synced_at = latest or datetime.now()
+        if loaded:
+            logger.info(f"Task similarity index loaded {loaded} tasks, {len(self._entries)} indexed")
+
+    def _reconcile(self):
+        """
+        Drops indexed tasks that no longer qualify: deleted or archived (by any worker or job), or reclassified
+        without a label. One _id lookup per RECONCILE_BATCH_SIZE indexed tasks.
+        """
+        task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, BULK_READ)
+        with self._lock:
+            task_ids = list(self._entries)
+        dropped = 0
+        for start in range(0, len(task_ids), RECONCILE_BATCH_SIZE):
+            batch = task_ids[start:start + RECONCILE_BATCH_SIZE]
+            existing = {
+                str(task["_id"])
+                for task in task_collection.find({"_id": {"$in": batch}, **CLASSIFIED_TASKS_FILTER}, {"_id": 1})
+            }
+            with self._lock:
+                for task_id in batch:
+                    if task_id not in existing and task_id in self._entries:
+                        self._remove(task_id)
+                        dropped += 1
+        self._reconciled_at = time.monotonic()
+        if dropped:
+            logger.info(f"Task similarity index dropped {dropped} deleted, archived or unclassified tasks")
+
+
+similar_tasks = TaskSimilarityIndex()
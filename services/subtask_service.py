@@ -1,64 +1,211 @@
-import json
+import time
 import uuid
-from typing import List, Optional
+from dataclasses import asdict
+from typing import Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 from log import logger
+from config import SubtaskConfig
 from config_mapping.mapping import TaskSchema
 from constants import TASK_HANDLER_COLLECTION, SUBTASK_GENERATION_PROMPT, SUBTASK_SYSTEM_TEMPLATE
 from llms.GPT import GPT4O1InferEngine
-from mongodb.mongo_template import MongoTemplate
+from llms.prompt_builder import build_prompt, SUBTASK_TEMPLATE
+from llms.json_stream import JsonArrayStreamParser
+from pymongo import UpdateOne
+from mongodb.mongo_template import MongoTemplate, OperationProfile, INTERACTIVE_READ, BULK_WRITE
+from mongodb.tenant_scope import tenant_filter
 from services.tag_service import TagService
+from services.deadline_service import DeadlineService
+from services.lease_service import LeaseHeartbeat
+from services.cache_service import task_list_cache
+
+subtask_config = SubtaskConfig()
+
+# Outcomes of SubTaskService.acquire_generation
+GENERATION_CLAIMED = "claimed"
+GENERATION_SHARED = "shared"
+GENERATION_DONE = "done"
+GENERATION_IN_PROGRESS = "in_progress"
+GENERATION_MISSING = "missing"
+
+# Size of the pieces the mock response is fed to the parser in, standing in for streamed tokens
+MOCK_STREAM_CHUNK_SIZE = 16
 
-mongo_client = MongoTemplate.create_moongo_client()
 
 class SubTaskService:
-    def __init__(self):
-        self.task_collection = mongo_client['brs-db'][TASK_HANDLER_COLLECTION]
+    def __init__(self, task_collection_name: str = TASK_HANDLER_COLLECTION, profile: OperationProfile = INTERACTIVE_READ):
+        # The read methods also serve archived subtrees when given the archive collection
+        self.task_collection = MongoTemplate.get_collection(task_collection_name, profile)
         self.tag_service = TagService()
 
-    def generate_subtasks_for_task(self, parent_task_id: str, title: str, description: str) -> List[dict]:
+    def generate_subtasks_for_task(self, parent_task_id: str, title: str, description: str,
+                                   lease_owner: Optional[str] = None) -> List[dict]:
         """
         Generate sub-tasks for a parent task using AI
         """
+        return list(self.stream_subtasks_for_task(parent_task_id, title, description, lease_owner))
+
+    def claim_generation(self, parent_task_id: str, reclaim_done: bool = False) -> Optional[str]:
+        """
+        Atomically claims sub-task generation for the parent task. Succeeds when no generation has run,
+        the last one failed or the running one's lease expired. Returns the owner token, or None.
+        """
+        now = datetime.now()
+        claimable_statuses = ["running"] if reclaim_done else ["running", "done"]
+        owner = str(uuid.uuid4())
+        result = self.task_collection.update_one(
+            tenant_filter({
+                "_id": parent_task_id,
+                "$or": [
+                    {"subtask_generation.status": {"$nin": claimable_statuses}},
+                    {"subtask_generation.status": "running", "subtask_generation.lease_expires_at": {"$lt": now}},
+                ]
+            }),
+            {"$set": {"subtask_generation": {
+                "status": "running",
+                "owner": owner,
+                "started_at": now,
+                "lease_expires_at": now + timedelta(seconds=subtask_config.SUBTASK_GENERATION_LEASE_SECONDS),
+            }}}
+        )
+        return owner if result.modified_count else None
+
+    def acquire_generation(self, parent_task_id: str) -> Tuple[Optional[str], str]:
+        """
+        Claims sub-task generation or waits for the generation already running, so concurrent requests
+        make a single LLM call. Returns (owner, outcome), outcome being one of GENERATION_CLAIMED,
+        GENERATION_SHARED (waited for another request's generation), GENERATION_DONE (generated earlier),
+        GENERATION_IN_PROGRESS (still running after the wait) or GENERATION_MISSING.
+        """
+        deadline = time.monotonic() + subtask_config.SUBTASK_GENERATION_WAIT_SECONDS
+        waited = False
+        while True:
+            owner = self.claim_generation(parent_task_id)
+            if owner:
+                return owner, GENERATION_CLAIMED
+
+            parent_task = self.task_collection.find_one(tenant_filter({"_id": parent_task_id}), {"subtask_generation": 1})
+            if not parent_task:
+                return None, GENERATION_MISSING
+            if (parent_task.get("subtask_generation") or {}).get("status") == "done":
+                return None, GENERATION_SHARED if waited else GENERATION_DONE
+            if time.monotonic() >= deadline:
+                return None, GENERATION_IN_PROGRESS
+
+            waited = True
+            time.sleep(subtask_config.SUBTASK_GENERATION_POLL_SECONDS)
+
+    def renew_generation_lease(self, parent_task_id: str, owner: str) -> bool:
+        result = self.task_collection.update_one(
+            tenant_filter({"_id": parent_task_id, "subtask_generation.owner": owner, "subtask_generation.status": "running"}),
+            {"$set": {"subtask_generation.lease_expires_at": datetime.now() + timedelta(seconds=subtask_config.SUBTASK_GENERATION_LEASE_SECONDS)}}
+        )
+        return result.matched_count > 0
+
+    def release_generation(self, parent_task_id: str, owner: str, succeeded: bool):
+        """
+        Ends the claim: "done" lets waiting requests share the result, "failed" lets the next request retry
+        """
+        self.task_collection.update_one(
+            tenant_filter({"_id": parent_task_id, "subtask_generation.owner": owner}),
+            {"$set": {
+                "subtask_generation.status": "done" if succeeded else "failed",
+                "subtask_generation.finished_at": datetime.now(),
+            }}
+        )
+
+    def stream_subtasks_for_task(self, parent_task_id: str, title: str, description: str,
+                                 lease_owner: Optional[str] = None) -> Iterator[dict]:
+        """
+        Generate sub-tasks for a parent task using AI, persisting and yielding each sub-task as soon as
+        its element of the streamed JSON array closes. Sub-tasks parsed before a failure are kept.
+        With lease_owner, the generation lease is renewed in the background for as long as generation runs
+        (including while waiting on the provider), and generation stops if it was lost.
+        """
+        created = 0
+        lineage = None
+        heartbeat = None
+        if lease_owner:
+            heartbeat = LeaseHeartbeat(
+                lambda: self.renew_generation_lease(parent_task_id, lease_owner),
+                subtask_config.SUBTASK_GENERATION_LEASE_SECONDS / 3,
+                name="subtask-generation-lease",
+            ).start()
         try:
             logger.info(f"Generating sub-tasks for parent task: {parent_task_id}")
             
             # Generate sub-tasks using AI
-            formatted_prompt = SUBTASK_GENERATION_PROMPT.format(title=title, description=description)
+            formatted_prompt = build_prompt(SUBTASK_GENERATION_PROMPT, SUBTASK_TEMPLATE, title, description)
             
             # For now, use a mock response. In production, uncomment the next line:
-            # response = GPT4O1InferEngine.process_text_input(formatted_prompt, SUBTASK_SYSTEM_TEMPLATE)
+            # chunks = GPT4O1InferEngine.stream_text_input(formatted_prompt, SUBTASK_SYSTEM_TEMPLATE, SUBTASK_TEMPLATE)
             response = '["Research mountain destinations", "Check team availability", "Book accommodations", "Plan transportation", "Create itinerary"]'  # Mock response
+            chunks = (response[i:i + MOCK_STREAM_CHUNK_SIZE] for i in range(0, len(response), MOCK_STREAM_CHUNK_SIZE))
             
-            # Parse the JSON response
-            subtask_titles = json.loads(response)
-            
-            if not isinstance(subtask_titles, list):
-                logger.error(f"Invalid sub-task response format: {response}")
-                return []
-            
-            # Validate that all sub-task titles are strings
-            valid_subtask_titles = [title for title in subtask_titles if isinstance(title, str)]
-            
-            logger.info(f"Generated {len(valid_subtask_titles)} sub-tasks for task '{title}'")
-            
-            # Create sub-task objects
-            created_subtasks = []
-            for i, subtask_title in enumerate(valid_subtask_titles):
-                subtask = self._create_subtask(parent_task_id, subtask_title, i + 1)
-                if subtask:
-                    created_subtasks.append(subtask)
-            
-            return created_subtasks
+            # Looked up once, not once per sub-task
+            lineage = self._subtask_lineage(parent_task_id)
+            parser = JsonArrayStreamParser()
+            for chunk in chunks:
+                for subtask_title in parser.feed(chunk):
+                    # Validate that all sub-task titles are strings
+                    if not isinstance(subtask_title, str):
+                        logger.error(f"Skipping non-string sub-task element: {subtask_title!r}")
+                        continue
+                    subtask = self._create_subtask(parent_task_id, subtask_title, created + 1, lineage)
+                    if subtask:
+                        created += 1
+                        yield subtask
+                    if heartbeat and heartbeat.lost:
+                        logger.error(f"Lost the sub-task generation lease of {parent_task_id}, stopping after {created} sub-tasks")
+                        return
+                if parser.finished:
+                    break
+
+            if not parser.finished:
+                logger.error(f"Sub-task response for {parent_task_id} ended before the array closed, kept {created} sub-tasks")
+            logger.info(f"Generated {created} sub-tasks for task '{title}'")
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse AI sub-task response: {e}")
-            return []
         except Exception as e:
             logger.error(f"Error generating sub-tasks: {e}")
-            return []
+        finally:
+            if heartbeat:
+                heartbeat.stop()
+            if created:
+                # The detail views of the parent and its ancestors embed the subtree, so their versions (and ETags) must move
+                self.task_collection.update_many(
+                    tenant_filter({"_id": {"$in": lineage["ancestors"]}}),
+                    {"$set": {"updated_at": datetime.now()}, "$inc": {"version": 1}}
+                )
+
+    @staticmethod
+    def task_ancestors(task: dict) -> List[str]:
+        """
+        Materialized path of a task, root first. Sub-tasks written before ancestors existed were one level deep.
+        """
+        if task.get('ancestors') is not None:
+            return list(task['ancestors'])
+        return [task['parent_task_id']] if task.get('parent_task_id') else []
+
+    def _subtask_lineage(self, parent_task_id: str) -> dict:
+        """
+        What every sub-task of the parent inherits: its deadline (2 days before the parent's deadline, or
+        7 days from now when the parent has none), ancestors and depth
+        """
+        parent_task = self.task_collection.find_one(
+            tenant_filter({"_id": parent_task_id}), {"deadline": 1, "ancestors": 1, "parent_task_id": 1}
+        ) or {}
+        # Deadlines are naive UTC, see DeadlineService
+        subtask_deadline = datetime.utcnow() + timedelta(days=7)
+        if parent_task.get('deadline'):
+            try:
+                # Older documents may still hold the deadline as a string
+                subtask_deadline = DeadlineService.parse_deadline(parent_task['deadline']) - timedelta(days=2)
+            except ValueError:
+                pass
+        ancestors = self.task_ancestors(parent_task) + [parent_task_id]
+        return {"deadline": subtask_deadline, "ancestors": ancestors, "depth": len(ancestors)}
 
-    def _create_subtask(self, parent_task_id: str, title: str, order: int) -> Optional[dict]:
+    def _create_subtask(self, parent_task_id: str, title: str, order: int,
+                        lineage: Optional[dict] = None) -> Optional[dict]:
         """
         Create a sub-task and store it in the database
         """
@@ -66,34 +213,30 @@ class SubTaskService:
             # Generate sub-task ID
             subtask_id = str(uuid.uuid4())
             
-            # Set deadline to 7 days from now (or inherit from parent)
-            parent_task = self.task_collection.find_one({"_id": parent_task_id})
-            if parent_task and parent_task.get('deadline'):
-                try:
-                    parent_deadline = datetime.fromisoformat(parent_task['deadline'].replace('Z', '+00:00'))
-                    # Set sub-task deadline to 2 days before parent deadline
-                    subtask_deadline = parent_deadline - timedelta(days=2)
-                except:
-                    subtask_deadline = datetime.now() + timedelta(days=7)
-            else:
-                subtask_deadline = datetime.now() + timedelta(days=7)
+            # Deadline, ancestors and depth are inherited from the parent
+            if lineage is None:
+                lineage = self._subtask_lineage(parent_task_id)
+            subtask_deadline = lineage["deadline"]
             
             # Create sub-task object
             subtask_schema = TaskSchema(
                 _id=subtask_id,
                 title=title,
                 description=f"Sub-task {order}: {title}",
-                deadline=subtask_deadline.isoformat(),
+                deadline=subtask_deadline,
                 priority="Medium",  # Default priority for sub-tasks
                 completed=False,
                 status="Pending",
                 tags=[],
                 parent_task_id=parent_task_id,
-                is_subtask=True
+                is_subtask=True,
+                ancestors=lineage["ancestors"],
+                depth=lineage["depth"]
             )
             
             # Store in database
-            subtask_dict = subtask_schema.to_dict()
+            # asdict keeps created_at/updated_at/deadline as dates, like the parent task documents
+            subtask_dict = asdict(subtask_schema)
             self.task_collection.insert_one(subtask_dict)
             
             logger.info(f"Created sub-task: {title} with ID: {subtask_id}")
@@ -102,7 +245,12 @@ class SubTaskService:
             generated_tags = self.tag_service.generate_tags_for_task(title, subtask_schema.description)
             if generated_tags:
                 self.tag_service.associate_tags_with_task(subtask_id, generated_tags)
-                subtask_dict['tags'] = generated_tags
+                subtask_dict['tags'] = TagService.normalize_tag_names(generated_tags)
+
+            # Same ISO-8601 rendering as get_subtasks_for_task
+            for date_field in ('created_at', 'updated_at', 'deadline'):
+                if isinstance(subtask_dict.get(date_field), datetime):
+                    subtask_dict[date_field] = subtask_dict[date_field].isoformat()
             
             return subtask_dict
             
@@ -116,12 +264,12 @@ class SubTaskService:
         """
         try:
             # Find all sub-tasks for the parent
-            subtasks = list(self.task_collection.find({
+            subtasks = list(self.task_collection.find(tenant_filter({
                 "parent_task_id": parent_task_id,
                 "is_subtask": True
-            }).sort("created_at", 1))  # Sort by creation date
+            })).sort("created_at", 1))  # Sort by creation date
             
-            # Convert ObjectId to string and add tags
+            # Convert ObjectId to string
             for subtask in subtasks:
                 if '_id' in subtask:
                     subtask['_id'] = str(subtask['_id'])
@@ -129,10 +277,11 @@ class SubTaskService:
                     subtask['created_at'] = subtask['created_at'].isoformat()
                 if 'updated_at' in subtask and subtask['updated_at']:
                     subtask['updated_at'] = subtask['updated_at'].isoformat()
+                if isinstance(subtask.get('deadline'), datetime):
+                    subtask['deadline'] = subtask['deadline'].isoformat()
                 
-                # Add tags to sub-task
-                task_tags = self.tag_service.get_task_tags(subtask['_id'])
-                subtask['tags'] = task_tags
+                # Tags are denormalized onto the sub-task document
+                subtask['tags'] = subtask.get('tags') or []
             
             return subtasks
             
@@ -145,11 +294,11 @@ class SubTaskService:
         Get the parent task for a sub-task
         """
         try:
-            subtask = self.task_collection.find_one({"_id": subtask_id})
+            subtask = self.task_collection.find_one(tenant_filter({"_id": subtask_id}))
             if not subtask or not subtask.get('parent_task_id'):
                 return None
             
-            parent_task = self.task_collection.find_one({"_id": subtask['parent_task_id']})
+            parent_task = self.task_collection.find_one(tenant_filter({"_id": subtask['parent_task_id']}))
             if parent_task:
                 # Convert ObjectId to string
                 if '_id' in parent_task:
@@ -158,10 +307,11 @@ class SubTaskService:
                     parent_task['created_at'] = parent_task['created_at'].isoformat()
                 if 'updated_at' in parent_task and parent_task['updated_at']:
                     parent_task['updated_at'] = parent_task['updated_at'].isoformat()
+                if isinstance(parent_task.get('deadline'), datetime):
+                    parent_task['deadline'] = parent_task['deadline'].isoformat()
                 
-                # Add tags to parent task
-                task_tags = self.tag_service.get_task_tags(parent_task['_id'])
-                parent_task['tags'] = task_tags
+                # Tags are denormalized onto the parent task document
+                parent_task['tags'] = parent_task.get('tags') or []
                 
                 return parent_task
             
@@ -171,44 +321,113 @@ class SubTaskService:
             logger.error(f"Error getting parent task for sub-task {subtask_id}: {e}")
             return None
 
-    def update_parent_task_progress(self, parent_task_id: str) -> bool:
+    def get_subtask_tree(self, task_id: str, task_depth: int = 0, max_depth: Optional[int] = None) -> List[dict]:
+        """
+        Sub-tasks of a task nested under "subtasks", down to max_depth levels below it (all levels when None).
+        The whole subtree is read with one query on the (ancestors, depth) index.
+        """
+        query = tenant_filter({"ancestors": task_id})
+        if max_depth is not None:
+            query["depth"] = {"$lte": task_depth + max_depth}
+        descendants = list(self.task_collection.find(query).sort([("depth", 1), ("created_at", 1)]))
+
+        nodes = {}
+        tree = []
+        # Sorted by depth, so a sub-task's parent is always placed before it
+        for subtask in descendants:
+            subtask['_id'] = str(subtask['_id'])
+            for date_field in ('created_at', 'updated_at', 'deadline'):
+                if isinstance(subtask.get(date_field), datetime):
+                    subtask[date_field] = subtask[date_field].isoformat()
+            subtask['tags'] = subtask.get('tags') or []
+            subtask['subtasks'] = []
+            nodes[subtask['_id']] = subtask
+            parent = nodes.get(subtask.get('parent_task_id'))
+            if parent is not None:
+                parent['subtasks'].append(subtask)
+            elif subtask.get('parent_task_id') == task_id:
+                tree.append(subtask)
+        return tree
+
+    def get_subtree_progress(self, task_id: str) -> dict:
         """
-        Update parent task completion status based on sub-tasks
+        Number of descendants of a task and how many are completed, with one aggregation on the ancestors index
+        """
+        result = list(self.task_collection.aggregate([
+            {"$match": tenant_filter({"ancestors": task_id})},
+            {"$group": {
+                "_id": None,
+                "descendant_count": {"$sum": 1},
+                "completed_count": {"$sum": {"$cond": [{"$eq": ["$completed", True]}, 1, 0]}},
+            }},
+        ]))
+        if not result:
+            return {"descendant_count": 0, "completed_count": 0}
+        return {"descendant_count": result[0]["descendant_count"], "completed_count": result[0]["completed_count"]}
+
+    def roll_up_progress(self, task: dict) -> List[str]:
+        """
+        Updates the status of every ancestor of a changed task, deepest first, from its direct sub-tasks:
+        all completed -> Completed, some -> In Progress, none -> Pending. The root's subtree is read with
+        one indexed query and the ancestors are written with one bulk_write. Returns the updated ancestor IDs.
         """
         try:
-            # Get all sub-tasks for the parent
-            subtasks = self.get_subtasks_for_task(parent_task_id)
-            
-            if not subtasks:
-                return False
-            
-            # Calculate completion percentage
-            total_subtasks = len(subtasks)
-            completed_subtasks = sum(1 for subtask in subtasks if subtask.get('completed', False))
-            completion_percentage = (completed_subtasks / total_subtasks) * 100
-            
-            # Update parent task status
-            update_data = {
-                "updated_at": datetime.now()
-            }
-            
-            if completion_percentage == 100:
-                update_data["completed"] = True
-                update_data["status"] = "Completed"
-            elif completion_percentage > 0:
-                update_data["status"] = "In Progress"
-            else:
-                update_data["status"] = "Pending"
-            
-            # Update the parent task
-            result = self.task_collection.update_one(
-                {"_id": parent_task_id},
-                {"$set": update_data}
-            )
-            
-            logger.info(f"Updated parent task {parent_task_id} progress: {completion_percentage}% complete")
-            return result.modified_count > 0
+            ancestors = self.task_ancestors(task)
+            if not ancestors:
+                return []
+
+            children = {}
+            completed = {}
+            for subtask in self.task_collection.find(tenant_filter({"ancestors": ancestors[0]}), {"parent_task_id": 1, "completed": 1}):
+                children.setdefault(subtask.get('parent_task_id'), []).append(subtask['_id'])
+                completed[subtask['_id']] = bool(subtask.get('completed'))
+
+            now = datetime.now()
+            operations = []
+            updated = []
+            for ancestor_id in reversed(ancestors):
+                child_ids = children.get(ancestor_id)
+                if not child_ids:
+                    continue
+                # Calculate completion percentage
+                completion_percentage = sum(1 for child_id in child_ids if completed[child_id]) / len(child_ids) * 100
+                update_data = {"updated_at": now}
+                if completion_percentage == 100:
+                    update_data["completed"] = True
+                    update_data["status"] = "Completed"
+                elif completion_percentage > 0:
+                    update_data["status"] = "In Progress"
+                else:
+                    update_data["status"] = "Pending"
+                # The next ancestor up sees this one's new completion state
+                completed[ancestor_id] = completed.get(ancestor_id, False) or completion_percentage == 100
+                operations.append(UpdateOne(tenant_filter({"_id": ancestor_id}), {"$set": update_data, "$inc": {"version": 1}}))
+                updated.append(ancestor_id)
+                logger.info(f"Updated task {ancestor_id} progress: {completion_percentage}% complete")
+
+            if operations:
+                self.task_collection.bulk_write(operations, ordered=False)
+            return updated
             
         except Exception as e:
             logger.error(f"Error updating parent task progress: {e}")
-            return False 
\ No newline at end of file
+            return []
+
+    def backfill_ancestors(self) -> int:
+        """
+        Sets ancestors/depth on tasks written before the materialized path existed, when sub-tasks were
+        one level deep. Runs across all tenants. Returns the number of tasks updated.
+        """
+        missing = {"ancestors": {"$exists": False}}
+        task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, BULK_WRITE)
+        roots = task_collection.update_many(
+            {**missing, "parent_task_id": None},
+            {"$set": {"ancestors": [], "depth": 0}}
+        )
+        subtasks = task_collection.update_many(
+            {**missing, "parent_task_id": {"$ne": None}},
+            [{"$set": {"ancestors": ["$parent_task_id"], "depth": 1}}]
+        )
+        if roots.modified_count or subtasks.modified_count:
+            task_list_cache.invalidate()
+        return roots.modified_count + subtasks.modified_count
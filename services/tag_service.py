@@ -1,28 +1,78 @@
 import json
 import uuid
-from typing import List, Optional
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from pymongo import UpdateOne
 from log import logger
 from config_mapping.mapping import TagSchema, TaskTagSchema
-from constants import TAG_COLLECTION, TASK_TAG_COLLECTION, TASK_TAG_GENERATION_PROMPT, TASK_TAG_SYSTEM_TEMPLATE
+from constants import TAG_COLLECTION, TASK_TAG_COLLECTION, TASK_HANDLER_COLLECTION, TASK_TAG_GENERATION_PROMPT, TASK_TAG_SYSTEM_TEMPLATE
 from llms.GPT import GPT4O1InferEngine
-from mongodb.mongo_template import MongoTemplate
+from llms.prompt_builder import build_prompt, TAG_TEMPLATE
+from mongodb.mongo_template import MongoTemplate, INTERACTIVE_READ, BULK_READ, BULK_WRITE
+from mongodb.tenant_scope import tenant_filter, get_tenant_id, TENANT_FIELD, tenant_config
+from services.cache_service import task_list_cache, TASK_GENERATION, TAG_GENERATION
+
+
+class TagDictionary:
+    """
+    Process-wide map of (tenant_id, tag name) to tag id. Tags are only ever created, never renamed or
+    deleted, so an id once resolved stays valid; the warm-up preloads every tenant's tags.
+    """
+    def __init__(self):
+        self._ids: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[str]:
+        return self._ids.get((get_tenant_id(), name))
+
+    def put(self, name: str, tag_id: str, tenant_id: Optional[str] = None):
+        with self._lock:
+            self._ids[(tenant_id or get_tenant_id(), name)] = tag_id
+
+    def preload(self) -> int:
+        """
+        Loads the tags of every tenant, returns the number of entries held
+        """
+        tag_collection = MongoTemplate.get_collection(TAG_COLLECTION, BULK_READ)
+        for tag in tag_collection.find({}, {"name": 1, TENANT_FIELD: 1}):
+            self.put(tag["name"], str(tag["_id"]), tag.get(TENANT_FIELD) or tenant_config.DEFAULT_TENANT_ID)
+        return len(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+tag_dictionary = TagDictionary()
 
-mongo_client = MongoTemplate.create_moongo_client()
 
 class TagService:
     def __init__(self):
-        self.tag_collection = mongo_client['brs-db'][TAG_COLLECTION]
-        self.task_tag_collection = mongo_client['brs-db'][TASK_TAG_COLLECTION]
+        self.tag_collection = MongoTemplate.get_collection(TAG_COLLECTION, INTERACTIVE_READ)
+        self.task_tag_collection = MongoTemplate.get_collection(TASK_TAG_COLLECTION, INTERACTIVE_READ)
+        self.task_collection = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, INTERACTIVE_READ)
+
+    @staticmethod
+    def normalize_tag_names(tag_names: List[str]) -> List[str]:
+        """
+        Lowercased, de-duplicated tag names in their original order, as stored on tags and task documents
+        """
+        normalized = []
+        for tag_name in tag_names:
+            name = tag_name.strip().lower()
+            if name and name not in normalized:
+                normalized.append(name)
+        return normalized
 
     def generate_tags_for_task(self, title: str, description: str) -> List[str]:
         """
         Generate tags for a task using AI
         """
         try:
-            formatted_prompt = TASK_TAG_GENERATION_PROMPT.format(title=title, description=description)
+            formatted_prompt = build_prompt(TASK_TAG_GENERATION_PROMPT, TAG_TEMPLATE, title, description)
             
             # For now, use a mock response. In production, uncomment the next line:
-            # response = GPT4O1InferEngine.process_text_input(formatted_prompt, TASK_TAG_SYSTEM_TEMPLATE)
+            # response = GPT4O1InferEngine.process_text_input(formatted_prompt, TASK_TAG_SYSTEM_TEMPLATE, TAG_TEMPLATE)
             response = '["Work", "Urgent"]'  # Mock response
             
             # Parse the JSON response
@@ -52,11 +102,16 @@ class TagService:
         try:
             # Normalize tag name (lowercase for consistency)
             normalized_name = tag_name.lower()
+
+            tag_id = tag_dictionary.get(normalized_name)
+            if tag_id:
+                return tag_id
             
             # Check if tag exists
-            existing_tag = self.tag_collection.find_one({"name": normalized_name})
+            existing_tag = self.tag_collection.find_one(tenant_filter({"name": normalized_name}))
             
             if existing_tag:
+                tag_dictionary.put(normalized_name, str(existing_tag['_id']))
                 return str(existing_tag['_id'])
             
             # Create new tag
@@ -67,6 +122,7 @@ class TagService:
             )
             
             self.tag_collection.insert_one(tag_schema.to_dict())
+            tag_dictionary.put(normalized_name, tag_id)
             logger.info(f"Created new tag: {normalized_name}")
             
             return tag_id
@@ -93,6 +149,19 @@ class TagService:
                     
                     self.task_tag_collection.insert_one(task_tag_schema.to_dict())
                     logger.info(f"Associated tag '{tag_name}' with task '{task_id}'")
+
+            # Keep the denormalized copy on the task document in sync for indexed tag filtering. Only a task
+            # missing one of the tags is written, and then its version moves so ETags and If-Match see the change.
+            normalized_names = self.normalize_tag_names(tag_names)
+            if normalized_names:
+                self.task_collection.update_one(
+                    tenant_filter({"_id": task_id, "tags": {"$not": {"$all": normalized_names}}}),
+                    {
+                        "$addToSet": {"tags": {"$each": normalized_names}},
+                        "$set": {"updated_at": datetime.now()},
+                        "$inc": {"version": 1}
+                    }
+                )
             
             return True
             
@@ -100,13 +169,36 @@ class TagService:
             logger.error(f"Error associating tags with task: {e}")
             return False
 
+    def replace_task_tag_rows(self, task_id: str, tag_names: List[str]) -> bool:
+        """
+        Makes the task_tags rows of a task name exactly these (normalized) tags. The caller writes the
+        denormalized copy on the task document, in the same update as the rest of its change.
+        """
+        try:
+            tag_ids = [tag_id for tag_id in (self.get_or_create_tag(tag_name) for tag_name in tag_names) if tag_id]
+            self.task_tag_collection.delete_many(tenant_filter({"task_id": task_id, "tag_id": {"$nin": tag_ids}}))
+            existing_ids = {
+                task_tag['tag_id']
+                for task_tag in self.task_tag_collection.find(tenant_filter({"task_id": task_id}), {"tag_id": 1})
+            }
+            for tag_id in tag_ids:
+                if tag_id not in existing_ids:
+                    task_tag_schema = TaskTagSchema(_id=str(uuid.uuid4()), task_id=task_id, tag_id=tag_id)
+                    self.task_tag_collection.insert_one(task_tag_schema.to_dict())
+            logger.info(f"Replaced the tags of task '{task_id}' with {tag_names}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error replacing task tags: {e}")
+            return False
+
     def get_task_tags(self, task_id: str) -> List[str]:
         """
         Get all tags for a specific task
         """
         try:
             # Get task-tag associations
-            task_tags = list(self.task_tag_collection.find({"task_id": task_id}))
+            task_tags = list(self.task_tag_collection.find(tenant_filter({"task_id": task_id})))
             
             if not task_tags:
                 return []
@@ -115,7 +207,7 @@ class TagService:
             tag_ids = [task_tag['tag_id'] for task_tag in task_tags]
             
             # Get tag names
-            tags = list(self.tag_collection.find({"_id": {"$in": tag_ids}}))
+            tags = list(self.tag_collection.find(tenant_filter({"_id": {"$in": tag_ids}})))
             
             return [tag['name'] for tag in tags]
             
@@ -132,12 +224,12 @@ class TagService:
             normalized_name = tag_name.lower()
             
             # Find the tag
-            tag = self.tag_collection.find_one({"name": normalized_name})
+            tag = self.tag_collection.find_one(tenant_filter({"name": normalized_name}))
             if not tag:
                 return []
             
             # Get task-tag associations for this tag
-            task_tags = list(self.task_tag_collection.find({"tag_id": tag['_id']}))
+            task_tags = list(self.task_tag_collection.find(tenant_filter({"tag_id": tag['_id']})))
             
             # Extract task IDs
             task_ids = [task_tag['task_id'] for task_tag in task_tags]
@@ -153,7 +245,7 @@ class TagService:
         Get all available tags
         """
         try:
-            tags = list(self.tag_collection.find({}))
+            tags = list(self.tag_collection.find(tenant_filter()))
             
             # Convert ObjectId to string
             for tag in tags:
@@ -166,4 +258,53 @@ class TagService:
             
         except Exception as e:
             logger.error(f"Error getting all tags: {e}")
-            return [] 
\ No newline at end of file
+            return []
+
+    def sync_task_tags_to_documents(self, batch_size: int = 1000, dry_run: bool = False) -> int:
+        """
+        Backfill/repair job: rewrites the denormalized tags list of every task from its task_tags rows.
+        Runs across all tenants. Returns the number of task documents that were updated (with dry_run, the number
+        of tasks that have task_tags rows).
+        """
+        pipeline = [
+            {"$lookup": {
+                "from": TAG_COLLECTION,
+                "localField": "tag_id",
+                "foreignField": "_id",
+                "as": "tag"
+            }},
+            {"$unwind": "$tag"},
+            {"$group": {"_id": {"task_id": "$task_id", "tenant_id": "$tenant_id"}, "tags": {"$addToSet": "$tag.name"}}},
+        ]
+
+        synced = 0
+        operations = []
+        for row in MongoTemplate.get_collection(TASK_TAG_COLLECTION, BULK_READ).aggregate(pipeline, allowDiskUse=True):
+            tags = self.normalize_tag_names(sorted(row["tags"]))
+            # The tenant keeps each update targeted at one shard. Tasks store their tags in insertion order, so they
+            # are compared as sets: tasks holding the same tags are left alone, the others get a new version like any
+            # other write to the task
+            in_sync = {"$setEquals": [{"$ifNull": ["$tags", []]}, tags]}
+            operations.append(UpdateOne(
+                tenant_filter({"_id": row["_id"]["task_id"], "$expr": {"$not": [in_sync]}}, row["_id"]["tenant_id"]),
+                {"$set": {"tags": tags, "updated_at": datetime.now()}, "$inc": {"version": 1}}
+            ))
+            if len(operations) >= batch_size:
+                synced += self._flush_tag_sync(operations, dry_run)
+                operations = []
+        if operations:
+            synced += self._flush_tag_sync(operations, dry_run)
+
+        # Tasks without any task_tags rows still need the field for the multikey index to cover them
+        if not dry_run:
+            MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, BULK_WRITE).update_many({"tags": {"$exists": False}}, {"$set": {"tags": []}})
+            task_list_cache.invalidate(TASK_GENERATION, TAG_GENERATION)
+
+        logger.info(f"Synced tags onto {synced} task documents (dry_run={dry_run})")
+        return synced
+
+    def _flush_tag_sync(self, operations: List[UpdateOne], dry_run: bool) -> int:
+        if dry_run:
+            return len(operations)
+        result = MongoTemplate.get_collection(TASK_HANDLER_COLLECTION, BULK_WRITE).bulk_write(operations, ordered=False)
+        return result.matched_count
@@ -0,0 +1,198 @@
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional
+import pymongo
+from log import logger
+from config import WarmupConfig
+from constants import MONGO_DB_NAME
+from mongodb.mongo_template import MongoTemplate, OPERATION_PROFILES
+
+warmup_config = WarmupConfig()
+
+# States of WorkerWarmup
+WARMUP_PENDING = "pending"
+WARMUP_RUNNING = "running"
+WARMUP_DONE = "done"
+WARMUP_SKIPPED = "skipped"
+
+
+class WorkerWarmup:
+    """
+    Post-fork warm-up of one worker: pings Mongo on every read preference the operation profiles use (server
+    selection, TLS handshake and the first pooled connections, the rest of MONGO_MIN_POOL_SIZE follows in the
+    background), ensures the indexes (a fresh database gets its TTL and text indexes without running a script;
+    existing ones are a no-op), preloads the tag dictionary, starts the similarity index load and opens the LLM provider
+    connections. Each step records its outcome and latency. The required steps (Mongo, indexes, tags) are retried
+    until they pass and the worker is ready only then; a failed LLM connection is reported but does not hold it back.
+    """
+    def __init__(self):
+        self.state = WARMUP_PENDING
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.steps: Dict[str, dict] = {}
+        self._process_started = time.monotonic()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, required_timeout: Optional[float] = None):
+        """
+        Warms the worker up, once per process. With required_timeout (gunicorn's post_worker_init) the required
+        steps run on the calling thread for up to that many seconds, so the worker takes no request before they
+        pass; the optional steps, and required ones still failing after the bound, continue on a background thread.
+        Without it (the dev server) everything runs in the background.
+        """
+        with self._lock:
+            if self.state != WARMUP_PENDING:
+                return
+            if not warmup_config.WARMUP_ENABLED:
+                self.state = WARMUP_SKIPPED
+                return
+            self.state = WARMUP_RUNNING
+            self.started_at = datetime.now()
+
+        required_done = False
+        if required_timeout is not None:
+            required_done = self.run_required(time.monotonic() + required_timeout)
+            if not required_done:
+                logger.error(f"Worker {os.getpid()} failed its required warm-up steps within {required_timeout}s, "
+                             f"retrying them in the background while not ready")
+        self._thread = threading.Thread(target=self.run, args=(required_done,), name="worker-warmup", daemon=True)
+        self._thread.start()
+
+    def run(self, required_done: bool = False):
+        if not required_done:
+            # The worker stays out of rotation until Mongo answers, however long that takes
+            self.run_required()
+        self._step("similarity_index", self.warm_similarity_index)
+        if warmup_config.WARMUP_LLM_CONNECTIONS:
+            self._step("hugging_face", self.warm_hugging_face)
+            self._step("azure_gpt", self.warm_azure_gpt)
+        failed = [name for name, step in self.steps.items() if not step["ok"]]
+        logger.info(f"Worker {os.getpid()} finished its warm-up, failed steps: {failed or 'none'}")
+
+    def run_required(self, deadline: Optional[float] = None) -> bool:
+        """
+        Runs the required steps, retrying the failed ones every WARMUP_RETRY_SECONDS until all pass (the worker is
+        ready from then on) or the monotonic deadline is reached
+        """
+        required_steps = {
+            "mongo": self.warm_mongo, "indexes": self.warm_indexes, "tag_dictionary": self.warm_tag_dictionary
+        }
+        while True:
+            for name, step in required_steps.items():
+                if not self.steps.get(name, {}).get("ok"):
+                    self._step(name, step, required=True)
+            if all(self.steps[name]["ok"] for name in required_steps):
+                break
+            if deadline is not None and time.monotonic() + warmup_config.WARMUP_RETRY_SECONDS >= deadline:
+                return False
+            time.sleep(warmup_config.WARMUP_RETRY_SECONDS)
+
+        self.finished_at = datetime.now()
+        self.state = WARMUP_DONE
+        logger.info(f"Worker {os.getpid()} ready in {(self.finished_at - self.started_at).total_seconds():.2f}s")
+        return True
+
+    def _step(self, name: str, step: Callable[[], Optional[str]], required: bool = False):
+        started = time.perf_counter()
+        try:
+            detail = step()
+            self.steps[name] = {"ok": True, "required": required, "detail": detail}
+        except Exception as e:
+            logger.error(f"Warm-up step {name} failed: {e}")
+            self.steps[name] = {"ok": False, "required": required, "detail": str(e)}
+        self.steps[name]["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    @staticmethod
+    def warm_mongo() -> str:
+        database = MongoTemplate.get_mongo_client()[MONGO_DB_NAME]
+        read_preferences = {profile.read_preference.mode: profile.read_preference for profile in OPERATION_PROFILES}
+        for read_preference in read_preferences.values():
+            database.command("ping", read_preference=read_preference)
+        return f"pinged {len(read_preferences)} read preferences"
+
+    @staticmethod
+    def warm_indexes() -> str:
+        from mongodb.mongo_indexes import INDEXES, ensure_indexes
+
+        ensure_indexes(MongoTemplate.get_mongo_client()[MONGO_DB_NAME])
+        return f"{sum(len(indexes) for indexes in INDEXES.values())} indexes ensured"
+
+    @staticmethod
+    def warm_tag_dictionary() -> str:
+        from services.tag_service import tag_dictionary
+
+        return f"{tag_dictionary.preload()} tags"
+
+    @staticmethod
+    def warm_similarity_index() -> str:
+        from services.similarity_service import similar_tasks
+
+        similar_tasks.start_loading()
+        return "loading in the background"
+
+    @staticmethod
+    def warm_hugging_face() -> str:
+        from llms import hugging_face
+
+        hugging_face.get_client()
+        # Any answer means the connection is open and pooled; the status code does not matter
+        response = hugging_face.get_http_session().head(
+            warmup_config.HUGGING_FACE_WARMUP_URL, timeout=warmup_config.WARMUP_HTTP_TIMEOUT_SECONDS
+        )
+        return f"HTTP {response.status_code}"
+
+    @staticmethod
+    def warm_azure_gpt() -> str:
+        from llms.GPT import GPT4O1InferEngine
+
+        if not GPT4O1InferEngine._current_url:
+            return "no endpoint configured"
+        response = GPT4O1InferEngine.get_session().head(
+            GPT4O1InferEngine._current_url, timeout=warmup_config.WARMUP_HTTP_TIMEOUT_SECONDS
+        )
+        return f"HTTP {response.status_code}"
+
+    def is_warm(self) -> bool:
+        return self.state in (WARMUP_DONE, WARMUP_SKIPPED)
+
+    def liveness(self) -> dict:
+        return {
+            "status": "alive",
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.monotonic() - self._process_started, 1),
+        }
+
+    def readiness(self) -> dict:
+        """
+        Warm-up state and a live Mongo ping. "ready" is False while warming up or when the ping fails or exceeds READINESS_MONGO_TIMEOUT_MS; a failed LLM step only marks it "degraded".
+        """
+        mongo = {"ok": False}
+        started = time.perf_counter()
+        try:
+            with pymongo.timeout(warmup_config.READINESS_MONGO_TIMEOUT_MS / 1000):
+                MongoTemplate.get_mongo_client()[MONGO_DB_NAME].command("ping")
+            mongo["ok"] = True
+        except Exception as e:
+            mongo["error"] = str(e)
+        mongo["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        ready = self.is_warm() and mongo["ok"]
+        degraded = any(not step["ok"] for step in self.steps.values())
+        return {
+            "status": ("degraded" if degraded else "ready") if ready else "not_ready",
+            "ready": ready,
+            "pid": os.getpid(),
+            "warmup": {
+                "state": self.state,
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "steps": self.steps,
+            },
+            "dependencies": {"mongo": mongo},
+        }
+
+
+worker_warmup = WorkerWarmup()
@@ -0,0 +1,28 @@
+import threading
+from mongodb.tenant_scope import tenant_context, tenant_filter, TENANT_FIELD
+from services.lease_service import LeaseHeartbeat
+
+
+def test_heartbeat_renews_under_the_creators_tenant():
+    renewed = threading.Event()
+    tenants = []
+
+    def renew():
+        tenants.append(tenant_filter({"_id": "task-1"})[TENANT_FIELD])
+        renewed.set()
+        return True
+
+    with tenant_context("acme"):
+        heartbeat = LeaseHeartbeat(renew, 0.01).start()
+    try:
+        assert renewed.wait(2)
+    finally:
+        heartbeat.stop()
+    assert tenants[0] == "acme"
+    assert not heartbeat.lost
+
+
+def test_heartbeat_reports_a_lost_lease():
+    with LeaseHeartbeat(lambda: False, 0.01) as heartbeat:
+        heartbeat._thread.join(2)
+    assert heartbeat.lost